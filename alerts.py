@@ -0,0 +1,472 @@
+import bisect
+import decimal
+import logging
+import math
+import queue
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+
+from ratelimit import RateLimiter
+
+
+logger = logging.getLogger(__name__)
+
+# Alert fires once, when rate of cur_from in cur_to rises to threshold if
+# above is True or falls to it if above is False
+Alert = namedtuple('Alert', 'id chat_id cur_from cur_to threshold above')
+
+# Stops thread of AlertService
+_STOP = object()
+
+
+def describe(alert):
+    """
+    Returns:
+        (str): e.g. 'USD/EUR above 0.95'
+    """
+    side = 'above' if alert.above else 'below'
+    return f'{alert.cur_from}/{alert.cur_to} {side} {alert.threshold}'
+
+
+class AlertIndex:
+    """Alerts of every currency pair in lists sorted by threshold.
+
+    Alerts waiting for rate to rise and to fall are kept apart, so alerts
+    crossed by new rate are a prefix of one list and a suffix of the other,
+    both found by binary search. Checking new rate of pair costs
+    O(log n + k) for k fired alerts of n, however many alerts are waiting.
+    Not thread safe, see AlertService.
+    """
+
+    def __init__(self):
+        # Id: Alert
+        self.alerts = {}
+        # Pair: ([(threshold, id)] of rising alerts, [...] of falling ones)
+        self.pairs = {}
+        # Chat id: set of alert ids
+        self.chats = {}
+
+    def __len__(self):
+        return len(self.alerts)
+
+    def add(self, alert):
+        above, below = self.pairs.setdefault(
+            (alert.cur_from, alert.cur_to), ([], []))
+        bisect.insort(above if alert.above else below,
+                      (alert.threshold, alert.id))
+        self.alerts[alert.id] = alert
+        self.chats.setdefault(alert.chat_id, set()).add(alert.id)
+
+    def remove(self, alert_id):
+        """
+        Args:
+            param1 (obj): self
+            param2 (int): id of alert
+
+        Returns:
+            (Alert): removed alert, None if there is no such alert
+        """
+        alert = self.alerts.get(alert_id)
+        if alert is None:
+            return None
+
+        pair = (alert.cur_from, alert.cur_to)
+        above, below = self.pairs[pair]
+        entries = above if alert.above else below
+        del entries[bisect.bisect_left(entries, (alert.threshold, alert.id))]
+        if not above and not below:
+            del self.pairs[pair]
+        self._forget(alert)
+        return alert
+
+    def _forget(self, alert):
+        del self.alerts[alert.id]
+        chat = self.chats[alert.chat_id]
+        chat.discard(alert.id)
+        if not chat:
+            del self.chats[alert.chat_id]
+
+    def chat_alerts(self, chat_id):
+        """
+        Returns:
+            (list): alerts of chat sorted by id
+        """
+        return sorted((self.alerts[i] for i in self.chats.get(chat_id, ())),
+                      key=lambda alert: alert.id)
+
+    def count(self, chat_id):
+        return len(self.chats.get(chat_id, ()))
+
+    def fire(self, rate):
+        """Remove alerts crossed by new rates.
+
+        Args:
+            param1 (obj): self
+            param2 (function): rate of cur_from in cur_to, None if unknown
+
+        Returns:
+            (list): (Alert, rate) of every fired alert
+        """
+        fired = []
+        for pair in list(self.pairs):
+            value = rate(*pair)
+            if value is None:
+                continue
+
+            above, below = self.pairs[pair]
+            # Ids are ints, so infinities sort around every equal threshold
+            end = bisect.bisect_right(above, (value, math.inf))
+            start = bisect.bisect_left(below, (value, -math.inf))
+            ids = [i for _, i in above[:end]] + [i for _, i in below[start:]]
+            del above[:end]
+            del below[start:]
+            if not above and not below:
+                del self.pairs[pair]
+
+            for alert_id in ids:
+                alert = self.alerts[alert_id]
+                self._forget(alert)
+                fired.append((alert, value))
+        return fired
+
+
+class AlertStore:
+    """Alerts kept in SQLite so they survive restarts.
+
+    Store is the only record of alerts which is shared by bot processes
+    using the same database file.
+    """
+
+    SCHEMA = (
+        'CREATE TABLE IF NOT EXISTS alerts ('
+        ' id INTEGER PRIMARY KEY AUTOINCREMENT,'
+        ' chat_id INTEGER NOT NULL,'
+        ' cur_from TEXT NOT NULL,'
+        ' cur_to TEXT NOT NULL,'
+        ' threshold TEXT NOT NULL,'
+        ' above INTEGER NOT NULL)',
+        'CREATE INDEX IF NOT EXISTS alerts_chat ON alerts (chat_id)',
+    )
+
+    def __init__(self, path='alerts.sqlite3'):
+        """
+        Args:
+            param1 (obj): self
+            param2 (str): database file, ':memory:' to keep it in memory
+        """
+        self.lock = threading.Lock()
+        self.path = path
+        self.conn = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        with self.lock, self.conn:
+            self.conn.execute('PRAGMA journal_mode=WAL')
+            for statement in self.SCHEMA:
+                self.conn.execute(statement)
+
+    def add(self, chat_id, cur_from, cur_to, threshold, above, max_per_chat):
+        """
+        Returns:
+            (Alert): stored alert with new id, None if chat already has
+                max_per_chat alerts
+        """
+        with self.lock, self.conn:
+            # Counted in the same statement so processes can't both pass
+            cursor = self.conn.execute(
+                'INSERT INTO alerts (chat_id, cur_from, cur_to, threshold, '
+                'above) SELECT ?, ?, ?, ?, ? WHERE '
+                '(SELECT count(*) FROM alerts WHERE chat_id = ?) < ?',
+                (chat_id, cur_from, cur_to, str(threshold), int(above),
+                 chat_id, max_per_chat))
+        if cursor.rowcount == 0:
+            return None
+        return Alert(cursor.lastrowid, chat_id, cur_from, cur_to, threshold,
+                     above)
+
+    def delete(self, chat_id, alert_id):
+        """
+        Returns:
+            (bool): False if chat has no alert with this id
+        """
+        with self.lock, self.conn:
+            cursor = self.conn.execute(
+                'DELETE FROM alerts WHERE id = ? AND chat_id = ?',
+                (alert_id, chat_id))
+        return cursor.rowcount > 0
+
+    def claim(self, alert_ids):
+        """Delete alerts which are still stored.
+
+        Args:
+            param1 (obj): self
+            param2 (list): ids of alerts
+
+        Returns:
+            (set): ids which were deleted by this call
+        """
+        claimed = set()
+        with self.lock, self.conn:
+            # Deleted one by one, DELETE ... RETURNING needs SQLite 3.35
+            for alert_id in alert_ids:
+                cursor = self.conn.execute(
+                    'DELETE FROM alerts WHERE id = ?', (alert_id,))
+                if cursor.rowcount > 0:
+                    claimed.add(alert_id)
+        return claimed
+
+    def load(self, after_id=0, chat_id=None):
+        """
+        Args:
+            param1 (obj): self
+            param2 (int): load only alerts with greater id
+            param3 (int): load only alerts of chat, all if None
+
+        Returns:
+            (list): stored alerts sorted by id
+        """
+        query = ('SELECT id, chat_id, cur_from, cur_to, threshold, above '
+                 'FROM alerts WHERE id > ?')
+        params = [after_id]
+        if chat_id is not None:
+            query += ' AND chat_id = ?'
+            params.append(chat_id)
+        query += ' ORDER BY id'
+
+        with self.lock:
+            rows = self.conn.execute(query, params).fetchall()
+        return [Alert(i, chat, cur_from, cur_to, decimal.Decimal(threshold),
+                      bool(above))
+                for i, chat, cur_from, cur_to, threshold, above in rows]
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+class Notifier:
+    """Bounded queue of messages sent by one thread at limited rate.
+
+    Telegram refuses bots which send more than about 30 messages per
+    second, so alerts fired at once are spread over time instead.
+    """
+
+    def __init__(self, send, rate=25, max_size=100000):
+        """
+        Args:
+            param1 (obj): self
+            param2 (function): send(chat_id, text), e.g. bot.send_message
+            param3 (float): max messages per second
+            param4 (int): max messages waiting in queue
+        """
+        self.send = send
+        self.rate = rate
+        self.limiter = RateLimiter(rate=rate, burst=max(1, rate), max_keys=1)
+        self.queue = queue.Queue(max_size)
+        self.dropped = 0
+        self.thread = threading.Thread(
+            target=self._work, daemon=True, name='notifier')
+
+    def start(self):
+        self.thread.start()
+
+    def submit(self, chat_id, text):
+        """
+        Returns:
+            (bool): False if queue is full and message is dropped
+        """
+        try:
+            self.queue.put_nowait((chat_id, text))
+            return True
+        except queue.Full:
+            self.dropped += 1
+            logger.warning('Notification to chat %s dropped', chat_id)
+            return False
+
+    def _work(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                self.queue.task_done()
+                return
+
+            while not self.limiter.allow(None):
+                time.sleep(1 / self.rate)
+            try:
+                self.send(*item)
+            except Exception:
+                logger.exception('Notification to chat %s failed', item[0])
+            self.queue.task_done()
+
+    def stop(self):
+        self.queue.put(None)
+        self.thread.join()
+
+
+class AlertService:
+    """Rate alerts of chats checked against every new rates snapshot.
+
+    Alerts are created, listed and cancelled in store, so processes
+    sharing its file see the same alerts. Every process keeps index of
+    alerts added to store since it started, checks it in thread of its
+    own and notifies only alerts it managed to delete from store, so
+    alert fired by several processes is sent once.
+
+    Example:
+        alerts = AlertService('alerts.sqlite3')
+        alerts.start(bot.send_message)
+        api.snapshot_listeners.append(alerts.check)
+    """
+
+    def __init__(self, path='alerts.sqlite3', max_per_chat=20):
+        """
+        Args:
+            param1 (obj): self
+            param2 (str): database file of alerts
+            param3 (int): max alerts of one chat
+        """
+        self.lock = threading.Lock()
+        self.store = AlertStore(path)
+        self.index = AlertIndex()
+        # Greatest id of alerts in index
+        self.last_id = 0
+        self.max_per_chat = max_per_chat
+        self.notifier = None
+        # Newest snapshot waiting to be checked
+        self.pending = None
+        self.pending_changed = threading.Condition()
+        self.thread = None
+        with self.lock:
+            self._sync()
+
+    def start(self, send, rate=25):
+        """
+        Args:
+            param1 (obj): self
+            param2 (function): send(chat_id, text) of notifications
+            param3 (float): max notifications per second
+        """
+        self.notifier = Notifier(send, rate)
+        self.notifier.start()
+        self.thread = threading.Thread(
+            target=self._work, daemon=True, name='alerts')
+        self.thread.start()
+
+    def _sync(self):
+        for alert in self.store.load(self.last_id):
+            self.index.add(alert)
+            self.last_id = alert.id
+
+    def subscribe(self, chat_id, cur_from, cur_to, threshold, rate):
+        """
+        Args:
+            param1 (obj): self
+            param2 (int): id of chat to notify
+            param3 (str): from what currency
+            param4 (str): to what currency
+            param5 (decimal.Decimal): rate to notify at
+            param6 (decimal.Decimal): current rate, alert fires when rate
+                crosses threshold coming from this side
+
+        Returns:
+            (Alert): new alert, None if chat already has max_per_chat
+        """
+        return self.store.add(chat_id, cur_from, cur_to, threshold,
+                              threshold > rate, self.max_per_chat)
+
+    def unsubscribe(self, chat_id, alert_id):
+        """
+        Returns:
+            (bool): False if chat has no alert with this id
+        """
+        if not self.store.delete(chat_id, alert_id):
+            return False
+        # Other processes drop it when it fires and can't be claimed
+        with self.lock:
+            self.index.remove(alert_id)
+        return True
+
+    def chat_alerts(self, chat_id):
+        return self.store.load(chat_id=chat_id)
+
+    def check(self, matrix):
+        """Check alerts against snapshot in thread of service.
+
+        Returns at once, so fetching snapshot does not wait for alerts.
+        Snapshots coming faster than they are checked are skipped, only
+        the newest one is checked.
+
+        Args:
+            param1 (obj): self
+            param2 (RateMatrix): new rates
+        """
+        if self.thread is None:
+            # Fired alerts would be removed without anyone notified
+            return
+        with self.pending_changed:
+            self.pending = matrix
+            self.pending_changed.notify()
+
+    def _work(self):
+        while True:
+            with self.pending_changed:
+                while self.pending is None:
+                    self.pending_changed.wait()
+                matrix, self.pending = self.pending, None
+            if matrix is _STOP:
+                return
+            try:
+                self._check(matrix)
+            except Exception:
+                logger.exception('Checking alerts failed')
+
+    def _check(self, matrix):
+        """Fire alerts crossed by rates of snapshot and queue notifications.
+
+        Every chat gets one message with all of its fired alerts.
+
+        Args:
+            param1 (obj): self
+            param2 (RateMatrix): new rates
+
+        Returns:
+            (list): (Alert, rate) of every alert notified by this process
+        """
+        def rate(cur_from, cur_to):
+            if cur_from in matrix and cur_to in matrix:
+                return matrix.rate(cur_from, cur_to)
+            return None
+
+        with self.lock:
+            self._sync()
+            fired = self.index.fire(rate)
+        if not fired:
+            return []
+
+        try:
+            claimed = self.store.claim([alert.id for alert, _ in fired])
+        except sqlite3.Error:
+            # Still stored, so they fire again with next snapshot
+            with self.lock:
+                for alert, _ in fired:
+                    self.index.add(alert)
+            raise
+        fired = [(alert, value) for alert, value in fired
+                 if alert.id in claimed]
+
+        messages = {}
+        for alert, value in fired:
+            messages.setdefault(alert.chat_id, []).append(
+                f'Alert {alert.id}: {alert.cur_from}/{alert.cur_to} is '
+                f'{round(value, 4)}, crossed {alert.threshold}')
+        for chat_id, lines in messages.items():
+            self.notifier.submit(chat_id, '\n'.join(lines))
+        return fired
+
+    def close(self):
+        if self.thread is not None:
+            with self.pending_changed:
+                self.pending = _STOP
+                self.pending_changed.notify()
+            self.thread.join()
+            self.notifier.stop()
+        self.store.close()
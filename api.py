@@ -1,30 +1,166 @@
 import requests
-import json
 import decimal
-from datetime import datetime, timedelta
+import json
+import logging
+import os
+import random
+import threading
+import time
+from datetime import date, datetime, timedelta
 
 from plotter import Plotter
-from cache import Cache
+from cache import Cache, SQLiteBackend, next_daily_update
+from history_store import HistoryStore, date_chunks
+from metrics import UPSTREAM_ERRORS, UPSTREAM_SECONDS
+from rates import RateMatrix
+from singleflight import SingleFlight
+
+
+logger = logging.getLogger(__name__)
+
+
+class HistoryUnavailable(Exception):
+    """Rates of streamed history could not be fetched from API."""
 
 
 class ExchangeRatesAPI:
     BASE_URL = 'https://api.exchangeratesapi.io'
-    currencies = None
-
-    def __init__(self, base='USD'):
+    SNAPSHOT_BASE = 'EUR'
+    # Days of history read into memory at once by iter_history
+    HISTORY_CHUNK_DAYS = 366
+    RETRY_STATUSES = (429, 500, 502, 503, 504)
+    CURRENCIES_PATH = os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), 'currencies.json')
+    _currencies = None
+    currency_set = frozenset()
+
+    def __init__(self, base='USD', history_path='history.sqlite3',
+                 plot_workers=0, base_url=None, pool_size=10,
+                 timeout=(3.05, 10), retries=2, backoff=0.5, stale_time=0,
+                 lazy=False, cache_path=None):
         """Set base and supported currencies list.
         
         Args:
             param1 (obj): self
             param2 (str): currency code
+            param3 (str): file of local history store
+            param4 (int): number of chart render processes
+            param5 (str): URL of API, BASE_URL if None
+            param6 (int): max kept-alive connections to API
+            param7 (tuple): connect and read timeouts in seconds
+            param8 (int): max retries of failed request
+            param9 (float): seconds to wait before first retry, doubled
+                for every next one
+            param10 (int): seconds stale rates are served while they are
+                refreshed in background, 0 to disable background refresh
+            param11 (bool): take currencies from stored or bundled list
+                and fetch rates in background instead of waiting for them
+            param12 (str): database file of rates cache shared with other
+                bot processes, None to keep cache in memory of this one
         """
-        self.cache = Cache()
-        self.plotter = Plotter()
+        self._setup(base, history_path, plot_workers, base_url,
+                    timeout, retries, backoff, stale_time, cache_path)
+
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.flights = SingleFlight()
+
+        if lazy:
+            self.currencies = self._stored_currencies()
+            threading.Thread(target=self._snapshot, daemon=True).start()
+        else:
+            self.currencies = self._snapshot_currencies(self._snapshot())
+
+        if stale_time > 0:
+            # Keeps APScheduler out of startup of API used without the bot
+            from refresher import RatesRefresher
+
+            self.refresher = RatesRefresher(self)
+            self.refresher.start()
+
+    def _setup(self, base, history_path, plot_workers, base_url,
+               timeout, retries, backoff, stale_time, cache_path):
+        backend = None
+        if cache_path is not None:
+            backend = SQLiteBackend(
+                cache_path, RateMatrix.to_bytes, RateMatrix.from_bytes)
+        self.cache = Cache(stale_time=stale_time, backend=backend)
+        self.refresher = None
+        # Called with every fetched snapshot, e.g. to check rate alerts
+        self.snapshot_listeners = []
+        # Last day whose rates HistoryIngester fetched
+        self.history_ingested = None
+        # First day whose rates can still be published and unix time
+        # until which it and later days count as fetched, next daily
+        # update or next run of HistoryIngester
+        self.open_history = None
+        self.history_store = HistoryStore(history_path)
+        self.plotter = Plotter(workers=plot_workers)
 
         self.base = base
+        if base_url is not None:
+            self.BASE_URL = base_url
+
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+
+    @property
+    def currencies(self):
+        return self._currencies
+
+    @currencies.setter
+    def currencies(self, currencies):
+        # Set is what validation looks currencies up in
+        self._currencies = currencies
+        self.currency_set = frozenset(currencies)
+
+    def _currency(self, currency):
+        """
+        Args:
+            param1 (obj): self
+            param2 (str): currency code in any case
+
+        Returns:
+            (str): upper case code, None if currency is not supported
+        """
+        if not isinstance(currency, str):
+            return None
+        if currency in self.currency_set:
+            return currency
+        currency = currency.upper()
+        return currency if currency in self.currency_set else None
+
+    def _snapshot_currencies(self, matrix):
+        """
+        Args:
+            param1 (obj): self
+            param2 (RateMatrix): first snapshot, or response with error
+
+        Returns:
+            (list): currencies of snapshot, stored ones if fetching failed
+        """
+        if isinstance(matrix, RateMatrix):
+            return matrix.currencies
+        logger.warning('Fetching rates failed, using stored currencies: %s',
+                       matrix.get('error'))
+        return self._stored_currencies()
 
-        rates = self.latest()['rates']
-        self.currencies = [cur for cur in rates]
+    def _stored_currencies(self):
+        """
+        Returns:
+            (list): currencies of latest snapshot in history store, or
+                bundled list if store is empty
+        """
+        _, rates = self.history_store.latest_rates()
+        if rates:
+            rates.setdefault(self.SNAPSHOT_BASE, 1)
+            return list(rates)
+        with open(self.CURRENCIES_PATH) as f:
+            return json.load(f)
 
     def _datetime_to_valid_str(self, date1):
         """
@@ -47,8 +183,219 @@ class ExchangeRatesAPI:
             (obj): response from API
         """
         url = '{}/{}?{}'.format(self.BASE_URL, path, query)
-        resp = requests.get(url)
-        return json.loads(resp.text)
+
+        for attempt in range(self.retries + 1):
+            if attempt > 0:
+                time.sleep(self._retry_delay(attempt))
+            try:
+                with UPSTREAM_SECONDS.time(path):
+                    resp = self.session.get(url, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                UPSTREAM_ERRORS.inc(path)
+                error = str(e)
+                continue
+
+            if resp.status_code in self.RETRY_STATUSES:
+                UPSTREAM_ERRORS.inc(path)
+                error = 'API responded with status {}'.format(resp.status_code)
+                continue
+            try:
+                return resp.json(parse_float=decimal.Decimal)
+            except ValueError:
+                UPSTREAM_ERRORS.inc(path)
+                return {'error': 'Invalid response from API'}
+
+        return {'error': error}
+
+    def _retry_delay(self, attempt):
+        """Exponential backoff with full jitter.
+
+        Args:
+            param1 (obj): self
+            param2 (int): number of retry starting from 1
+
+        Returns:
+            (float): seconds to wait before retry
+        """
+        return random.uniform(0, self.backoff * 2 ** (attempt - 1))
+
+    def _snapshot(self):
+        """Get rate matrix of latest rates, all bases share one snapshot.
+
+        Args:
+            param1 (obj): self
+
+        Returns:
+            (RateMatrix): cached or freshly fetched rates
+            (dict): response with error if fetching failed
+        """
+        matrix, is_stale = self.cache.lookup(self.SNAPSHOT_BASE)
+        if matrix is not None:
+            if is_stale and self.refresher is not None:
+                self.refresher.refresh_soon()
+            return matrix
+
+        return self.flights.do(
+            ('latest', self.SNAPSHOT_BASE), self._fetch_snapshot)
+
+    def _fetch_snapshot(self):
+        # Snapshot could be saved by other call which just finished
+        matrix = self.cache.rates(self.SNAPSHOT_BASE)
+        if matrix is not None:
+            return matrix
+
+        return self._request_snapshot()
+
+    def _request_snapshot(self):
+        data = self._request('latest', self._snapshot_query())
+        return self._save_snapshot(data)
+
+    def refresh(self, max_age=None):
+        """Fetch new rates snapshot even if cached one is still fresh.
+
+        Cached snapshot is kept if fetching failed.
+
+        Args:
+            param1 (obj): self
+            param2 (int): keep cached snapshot younger than this many
+                seconds, e.g. just saved by other process sharing cache
+
+        Returns:
+            (RateMatrix): fetched or recent rates
+            (dict): response with error if fetching failed
+        """
+        matrix = self._recent_snapshot(max_age)
+        if matrix is not None:
+            # Fetched by other process sharing the cache
+            self._notify_snapshot(matrix)
+            return matrix
+        return self.flights.do(
+            ('latest', self.SNAPSHOT_BASE), self._request_snapshot)
+
+    def _recent_snapshot(self, max_age):
+        if max_age is None:
+            return None
+        age = self.cache.age(self.SNAPSHOT_BASE)
+        if age is None or age >= max_age:
+            return None
+        return self.cache.rates(self.SNAPSHOT_BASE)
+
+    def _snapshot_query(self):
+        return 'base={}'.format(self.SNAPSHOT_BASE)
+
+    def _save_snapshot(self, data):
+        """
+        Args:
+            param1 (obj): self
+            param2 (dict): response of 'latest' API path
+
+        Returns:
+            (RateMatrix): rates saved to cache
+            (dict): response with error
+        """
+        if 'error' in data:
+            return data
+
+        # Tables of every base are built before snapshot is cached, so
+        # its size is measured with them and they don't grow it later
+        matrix = RateMatrix(data).build()
+        self.cache.save_rates(matrix, self.SNAPSHOT_BASE)
+        self.currencies = matrix.currencies
+
+        # Latest rates are also rates of their date, and let next start
+        # know currencies without waiting for API
+        if matrix.date is not None:
+            self.history_store.save({matrix.date: data['rates']})
+        self._notify_snapshot(matrix)
+        return matrix
+
+    def _notify_snapshot(self, matrix):
+        # Failing listener must not fail request which fetched snapshot
+        for listener in self.snapshot_listeners:
+            try:
+                listener(matrix)
+            except Exception:
+                logger.exception('Snapshot listener failed')
+
+    def _fill_history(self, start, end):
+        """Fetch from API only days which are missing in history store.
+
+        Args:
+            param1 (obj): self
+            param2 (str): first date of range
+            param3 (str): last date of range
+
+        Returns:
+            (dict): response with error if fetching failed, else None
+        """
+        for miss_start, miss_end in self._missing_history(start, end):
+            error = self.flights.do(('history', miss_start, miss_end),
+                                    self._fetch_history, miss_start, miss_end)
+            if error is not None:
+                return error
+        return None
+
+    def _missing_history(self, start, end):
+        """
+        Args:
+            param1 (obj): self
+            param2 (str): first date of range
+            param3 (str): last date of range
+
+        Returns:
+            (list): (start, end) ranges missing in store, without days
+                fetched since rates were last published or HistoryIngester
+                last ran
+        """
+        missing = self.history_store.missing(start, end)
+        if self.open_history is not None:
+            open_start, fetched_until = self.open_history
+            if time.time() < fetched_until:
+                last = (date.fromisoformat(open_start) -
+                        timedelta(days=1)).isoformat()
+                missing = [(miss_start, min(miss_end, last))
+                           for miss_start, miss_end in missing
+                           if miss_start <= last]
+        return missing
+
+    def _fetch_history(self, start, end):
+        # Part of range could be saved by other call which just finished
+        for miss_start, miss_end in self.history_store.missing(start, end):
+            res = self._request(
+                'history', self._history_query(miss_start, miss_end))
+            error = self._save_history(res, miss_start, miss_end)
+            if error is not None:
+                return error
+        return None
+
+    def _history_query(self, start, end):
+        return 'start_at={}&end_at={}&base={}'.format(
+            start, end, self.SNAPSHOT_BASE)
+
+    def _save_history(self, res, start, end):
+        """
+        Args:
+            param1 (obj): self
+            param2 (dict): response of 'history' API path
+            param3 (str): first date of fetched range
+            param4 (str): last date of fetched range
+
+        Returns:
+            (dict): response with error if there is one, else None
+        """
+        if 'error' in res:
+            return res
+
+        # Rates of today can still be published, so they are not marked
+        # as fetched in store, only until next daily update
+        today = self._datetime_to_valid_str(datetime.now())
+        last_final = self._datetime_to_valid_str(
+            datetime.now() - timedelta(days=1))
+        self.history_store.save(
+            res.get('rates', {}), start, min(end, last_final))
+        if start <= today <= end:
+            self.open_history = (today, next_daily_update())
+        return None
 
     def _validate_base(self, base):
         """
@@ -61,12 +408,7 @@ class ExchangeRatesAPI:
         """
         if base is None:
             return self.base
-        elif not isinstance(base, str):
-            return None
-        elif base.upper() not in self.currencies:
-            return None
-
-        return base.upper()
+        return self._currency(base)
     
     def _validate_timestamps(self, start, end):
         """
@@ -84,6 +426,11 @@ class ExchangeRatesAPI:
             end = self._datetime_to_valid_str(end)
         if not (isinstance(start, str) and isinstance(end, str)):
             return None, None
+        try:
+            datetime.strptime(start, '%Y-%m-%d')
+            datetime.strptime(end, '%Y-%m-%d')
+        except ValueError:
+            return None, None
         return start, end
 
     def _validate_targets(self, target=None, targets=[]):
@@ -99,29 +446,26 @@ class ExchangeRatesAPI:
         if (target is None) and isinstance(targets, list):
             if len(targets) == 0:
                 return None
-            targets = ','.join([self._validate_targets(t)for t in targets])
+            targets = [self._validate_targets(t) for t in targets]
             
             if any(t is None for t in targets):
                 return None
-            targets = ','.join(targets)
+            targets = ','.join(dict.fromkeys(targets))
         else:
-            if ((not isinstance(target, str)) and
-                    (target.upper() not in self.currencies)):
-                return None
-            targets = target.upper()
+            targets = self._currency(target)
         return targets
 
     def _validate_exchange(self, amount, cur_from, cur_to):
-        if not isinstance(cur_from, str) or not isinstance(cur_to, str):
-            return None, None, None
-        elif cur_from.upper() not in self.currencies:
+        cur_from, cur_to = self._currency(cur_from), self._currency(cur_to)
+        if cur_from is None or cur_to is None:
             return None, None, None
-        elif cur_to.upper() not in self.currencies:
-            return None, None, None
-        
+
+        # Parsed commands already come with Decimal amounts
+        if isinstance(amount, decimal.Decimal):
+            return amount, cur_from, cur_to
         try:
             amount = decimal.Decimal(amount)
-            return amount, cur_from.upper(), cur_to.upper()
+            return amount, cur_from, cur_to
         except:
             return None, None, None
 
@@ -132,28 +476,19 @@ class ExchangeRatesAPI:
             param2 (str): base currency
 
         Returns:
-            (dict): response
+            (MappingProxyType): read-only response shared by all callers
+            (dict): response with error
         """
-        api_path='latest'
-
         base = self._validate_base(base)
         if base is None:
             return {'error': 'Invalid base currency'}
-        
-        query = 'base={}'.format(base)
 
-        cached_data = self.cache.rates(base)
-        if cached_data is None:
-            data = self._request(api_path, query)
-            self.cache.save_rates(data, base)
-        else:
-            data = cached_data
+        return self._latest_response(self._snapshot(), base)
 
-        if 'error' not in data:
-          for rate in data['rates']:
-            data['rates'][rate] = round(
-                decimal.Decimal(data['rates'][rate]), 2)
-        return data
+    def _latest_response(self, matrix, base):
+        if not isinstance(matrix, RateMatrix):
+            return matrix
+        return matrix.response(base)
     
     def history(self, start, end, base=None, target=None, targets=[]):
         """
@@ -168,41 +503,145 @@ class ExchangeRatesAPI:
         Returns:
             (dict): response
         """
-        api_path = 'history'
+        args = self._validate_history(start, end, base, target, targets)
+        if 'error' in args:
+            return args
+
+        error = self._fill_history(args['start'], args['end'])
+        if error is not None:
+            return error
 
+        return self._history_response(**args)
+
+    def _validate_history(self, start, end, base, target, targets):
+        """
+        Returns:
+            (dict): validated arguments of history or error
+        """
         base =        self._validate_base(base)
         start, end =  self._validate_timestamps(start, end)
         targets =     self._validate_targets(target, targets)
 
         if any(arg is None for arg in [base, start, end, targets]):
             return {'error': 'Invalid parameters'}
+        if start > end:
+            return {'error': 'start_at must be before end_at'}
 
-        query = 'start_at={}&end_at={}&base={}&symbols={}'
-        query = query.format(start, end, base, targets)
+        return {'start': start, 'end': end, 'base': base, 'targets': targets}
 
-        res = self._request(api_path, query)
-        if 'error' in res:
-            return res
-        
-        if ('rates' in res) and (len(res['rates']) == 0):
+    def _history_response(self, start, end, base, targets):
+        """Build history response from rates in history store.
+
+        Args:
+            param1 (obj): self
+            param2 (str): first date of range
+            param3 (str): last date of range
+            param4 (str): validated base currency
+            param5 (str): validated comma separated targets
+
+        Returns:
+            (dict): response
+        """
+        targets = targets.split(',')
+        currencies = set(targets + [base]) - {self.SNAPSHOT_BASE}
+        stored = self.history_store.rates(start, end, currencies)
+        rates = dict(self._history_rates(stored, base, targets))
+
+        if len(rates) == 0:
             return {'error': 'No exchange rate is available this period.'}
-        
-        return res
+
+        return {'base': base, 'start_at': start, 'end_at': end, 'rates': rates}
+
+    def _history_rates(self, stored, base, targets):
+        """
+        Args:
+            param1 (obj): self
+            param2 (dict): rates of history store by date then by currency
+            param3 (str): base currency
+            param4 (list): target currencies
+
+        Returns:
+            (generator): (date, rates of targets against base by target)
+                of days which have rates of all currencies
+        """
+        for day, day_rates in stored.items():
+            matrix = RateMatrix(
+                {'base': self.SNAPSHOT_BASE, 'date': day, 'rates': day_rates})
+            if all(cur in matrix for cur in targets + [base]):
+                yield day, {cur: matrix.rate(base, cur) for cur in targets}
+
+    def iter_history(self, start, end, base=None, target=None, targets=[]):
+        """Stream history day by day instead of building one response.
+
+        Range is read from history store in chunks of HISTORY_CHUNK_DAYS,
+        days of chunk missing in store are fetched just before it is read,
+        so memory used does not grow with range.
+
+        Args:
+            param1 (obj): self
+            param2 (datetime.datetime): start timestamps
+            param3 (datetime.datetime): end timestamps
+            param4 (str): base currency
+            param5 (str): target currency
+            param6 (list): list of multiple targets
+
+        Returns:
+            (generator): (date, rates by target) in date order, raises
+                HistoryUnavailable if rates of chunk can't be fetched
+            (dict): response with error if parameters are invalid
+        """
+        args = self._validate_history(start, end, base, target, targets)
+        if 'error' in args:
+            return args
+        return self._iter_history(**args)
+
+    def _iter_history(self, start, end, base, targets):
+        targets = targets.split(',')
+        currencies = set(targets + [base]) - {self.SNAPSHOT_BASE}
+        for chunk_start, chunk_end in date_chunks(
+                start, end, self.HISTORY_CHUNK_DAYS):
+            error = self._fill_history(chunk_start, chunk_end)
+            if error is not None:
+                raise HistoryUnavailable(error['error'])
+            stored = self.history_store.rates(chunk_start, chunk_end, currencies)
+            yield from self._history_rates(stored, base, targets)
 
     def plot_history(self, cur_from, cur_to, days):
         """
         Args:
             param1 (obj): self
             param2 (str): base currency 
-            param3 (str): target currency
+            param3 (str): target currency, list of them or comma
+                separated targets to plot all of them on one chart
             param4 (int): number of days
 
         Returns:
             (bytes): image
+
+        Raises:
+            PlotterBusy: too many charts are rendering
         """
 
+        args = self._validate_plot(cur_from, cur_to, days)
+        if args is None:
+            return None
+
+        if self._fill_history(args['start'], args['end']) is not None:
+            return None
+
+        return self.plotter.plot_cached(
+            self._plot_key(**args), lambda: self._plot_args(**args))
+
+    def _validate_plot(self, cur_from, cur_to, days):
+        """
+        Returns:
+            (dict): arguments of history to plot, None if invalid
+        """
+        if isinstance(cur_to, str):
+            cur_to = cur_to.split(',')
+
         cur_from = self._validate_targets(cur_from)
-        cur_to = self._validate_targets(cur_to)
+        cur_to = self._validate_targets(targets=cur_to)
         
         if any(arg is None for arg in [cur_from, cur_to]):
             return None
@@ -212,25 +651,50 @@ class ExchangeRatesAPI:
         
         end = datetime.now()
         start = end - timedelta(days=days)
+        start, end = self._validate_timestamps(start, end)
 
-        history_data = self.history(start, end, base=cur_from, target=cur_to)
-        if 'error' in history_data:
-            print(history_data['error'])
-            return None
+        return {'start': start, 'end': end, 'base': cur_from,
+                'targets': cur_to.split(',')}
+
+    def _plot_key(self, start, end, base, targets):
+        """
+        Returns:
+            (tuple): cache key of chart, changes when rates of it are stored
+        """
+        currencies = set(targets + [base]) - {self.SNAPSHOT_BASE}
+        return (base, ', '.join(targets), start, end) + \
+            self.history_store.version(start, end, currencies)
+
+    def _plot_args(self, start, end, base, targets):
+        """Read history to plot from store as arrays.
 
-        rates = history_data['rates']
-        if len(rates) < 2:
+        Args:
+            param1 (obj): self
+            param2 (str): first date of range
+            param3 (str): last date of range
+            param4 (str): base currency
+            param5 (list): target currencies
+
+        Returns:
+            (tuple): datetime64 dates, float64 rates (dict of them by
+                target if there are several targets) and title of chart,
+                None if there is nothing to plot
+        """
+        # NumPy is needed only for charts, keep it out of startup
+        from series import history_arrays
+
+        currencies = set(targets + [base]) - {self.SNAPSHOT_BASE}
+        dates, series = history_arrays(
+            self.history_store.rows(start, end, currencies),
+            base, targets, self.SNAPSHOT_BASE)
+        if len(dates) < 2:
             return None
 
-        rates = dict(sorted(rates.items()))
-        
-        date, rate = [], []
-        for r in rates:
-            date.append(datetime.strptime(r, '%Y-%m-%d'))
-            rate.append(rates[r][cur_to])
-        
-        y_label = '{} to {} rates'.format(cur_from, cur_to)
-        return self.plotter.plot_rates(date, rate, y_label)
+        cur_to = ', '.join(targets)
+        rate = series[targets[0]] if len(targets) == 1 else series
+
+        y_label = '{} to {} rates'.format(base, cur_to)
+        return dates, rate, y_label
 
     def exchange(self, amount, cur_from, cur_to):
         """
@@ -248,11 +712,75 @@ class ExchangeRatesAPI:
         if any(arg is None for arg in [amount, cur_from, cur_to]):
             return None
 
-        resp = self.latest(base=cur_from)
-        if 'error' in resp:
+        return self._exchange_response(
+            amount, cur_from, cur_to, self._snapshot())
+
+    def _exchange_response(self, amount, cur_from, cur_to, matrix):
+        if not isinstance(matrix, RateMatrix):
             return None
-        
-        rates = resp['rates']
-        rate = decimal.Decimal(rates[cur_to])
 
-        return f'{round(amount * rate, 2)} {cur_to}'
+        return self._converted(amount, matrix.rate(cur_from, cur_to), cur_to)
+
+    def _converted(self, amount, rate, cur_to):
+        """
+        Returns:
+            (str): result of converting, None if it does not fit in
+                decimal context, e.g. for amount 1e30
+        """
+        try:
+            return f'{round(amount * rate, 2)} {cur_to}'
+        except decimal.InvalidOperation:
+            return None
+
+    def rate(self, cur_from, cur_to):
+        """
+        Args:
+            param1 (obj): self
+            param2 (str): from what currency you convert
+            param3 (str): for what currency you convert
+
+        Returns:
+            (decimal.Decimal): full precision cross rate of latest rates,
+                None if currencies are not valid or rates are not available
+        """
+        cur_from, cur_to = self._currency(cur_from), self._currency(cur_to)
+        if cur_from is None or cur_to is None:
+            return None
+        return self._rate_response(cur_from, cur_to, self._snapshot())
+
+    def _rate_response(self, cur_from, cur_to, matrix):
+        if not isinstance(matrix, RateMatrix):
+            return None
+        return matrix.rate(cur_from, cur_to)
+
+    def exchange_many(self, items):
+        """Convert many amounts with rates of one snapshot.
+
+        Args:
+            param1 (obj): self
+            param2 (list): (amount, cur_from, cur_to) tuples
+
+        Returns:
+            (list): result of converting for every item, None for items
+                which are not valid
+        """
+        return self._exchange_many_response(items, self._snapshot())
+
+    def _exchange_many_response(self, items, matrix):
+        if not isinstance(matrix, RateMatrix):
+            return [None] * len(items)
+
+        # Cross rate is computed once per pair, not once per item
+        rates = {}
+        res = []
+        for item in items:
+            amount, cur_from, cur_to = self._validate_exchange(*item)
+            if any(arg is None for arg in [amount, cur_from, cur_to]):
+                res.append(None)
+                continue
+
+            pair = (cur_from, cur_to)
+            if pair not in rates:
+                rates[pair] = matrix.rate(cur_from, cur_to)
+            res.append(self._converted(amount, rates[pair], cur_to))
+        return res
@@ -1,8 +1,26 @@
+import asyncio
+import csv
+import decimal
+import functools
+import io
 import logging
 import os
-from telegram.ext import Updater, CommandHandler
-
-from api import ExchangeRatesAPI
+import tempfile
+import threading
+from datetime import datetime, timedelta
+from telegram import Bot, InlineQueryResultArticle, InputTextMessageContent
+from telegram.ext import Updater, CommandHandler, InlineQueryHandler
+from telegram.utils.request import Request
+
+from alerts import AlertService, describe
+from api import ExchangeRatesAPI, HistoryUnavailable
+from cache import LRUCache
+from ingest import HistoryIngester
+from metrics import MetricsServer, register_cache, timed
+from parsing import CommandParser
+from plotter import PlotterBusy
+from ratelimit import RateLimiter
+from singleflight import SingleFlight, AsyncSingleFlight
 
 
 logging.basicConfig(level=logging.DEBUG,
@@ -10,6 +28,9 @@ logging.basicConfig(level=logging.DEBUG,
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
+CHEAP_LANE = 'cheap'
+EXPENSIVE_LANE = 'expensive'
+
 
 class App:
     CURRENCY_MAP = {
@@ -22,8 +43,97 @@ class App:
         "USD": "$",
     }
 
-    def __init__(self):
-        self.api = ExchangeRatesAPI()
+    LATEST_USAGE = ('Usage: /list\nor\n/list <valid currency>'
+                    'Example:\n/list\nor\n/list  EUR')
+    EXCHANGE_USAGE = ('Usage:\n/exchange <number> <currency> to <currency>\n'
+                      'or\n/exchange <number with symbol> to <currency>\n\n'
+                      'Example:\n/exchange 10 EUR to USD\nor\n'
+                      '/exchange 10$ to EUR')
+    HISTORY_USAGE = ('Usage: /history <currency>/<currency> for <number> days'
+                     '(recommended to use 7 or more days), or compare up to '
+                     '5 currencies with /history <currency>/<currency>,'
+                     '<currency>,... for <number> days\n\n'
+                     'Example:\n/history USD/EUR for 7 days\nor\n'
+                     '/history USD/EUR,GBP,JPY for 30 days')
+    MAX_HISTORY_TARGETS = 5
+    BATCH_USAGE = ('Usage:\n/batch <exchange>, <exchange>, ...\n'
+                   'where <exchange> is any argument of /exchange, up to '
+                   '50 at once\n\n'
+                   'Example:\n/batch 10 EUR to USD, 5$ to GBP, 100 PLN to JPY')
+    MAX_BATCH = 50
+    PLOTTER_BUSY = ('Too many charts are being drawn right now, '
+                    'please try again later')
+    RATE_LIMITED = ('You are sending commands too fast, '
+                    'please wait a minute and try again')
+    ALERT_USAGE = ('Usage: /alert <currency>/<currency> <rate>\n'
+                   'You are notified once when rate crosses it, see your '
+                   'alerts with /alerts and cancel one with /unalert <id>\n\n'
+                   'Example:\n/alert USD/EUR 0.95')
+    UNALERT_USAGE = ('Usage: /unalert <id of alert from /alerts>\n\n'
+                     'Example:\n/unalert 12')
+    ALERTS_FULL = ('You have too many alerts, cancel some of them '
+                   'with /unalert <id>')
+    NO_ALERTS = 'You have no alerts, create one with /alert'
+    EXPORT_USAGE = ('Usage: /export <currency>/<currency> for <number> days'
+                    ', or export up to 5 currencies with /export '
+                    '<currency>/<currency>,<currency>,... for <number> days'
+                    '\n\nExample:\n/export USD/EUR for 365 days\nor\n'
+                    '/export USD/EUR,GBP for 3650 days')
+    EXPORT_FAILED = ('Rates are not available right now, '
+                     'please try again later')
+    # Rates are published since 1999
+    MAX_HISTORY_DAYS = 366 * 30
+    MAX_EXPORT_DAYS = MAX_HISTORY_DAYS
+    # Bytes of CSV kept in memory before it is spilled to disk
+    EXPORT_MEMORY = 1 << 20
+    # Tokens of chat's rate limit bucket taken by command
+    COSTS = {'list': 1, 'exchange': 1, 'batch': 2, 'history': 5,
+             'export': 5, 'alert': 1, 'alerts': 1, 'unalert': 1}
+    # Conversions answered to empty inline query
+    INLINE_COMMON = [('USD', 'EUR'), ('EUR', 'USD'), ('GBP', 'USD'),
+                     ('USD', 'JPY'), ('USD', 'CNY'), ('EUR', 'PLN'),
+                     ('USD', 'RUB')]
+    MAX_INLINE_REPLIES = 1024
+
+    def __init__(self, plot_workers=0, api=None, limiter=None,
+                 inline_cache_time=300, alerts=None):
+        """
+        Args:
+            param1 (obj): self
+            param2 (int): number of chart render processes of new api
+            param3 (ExchangeRatesAPI): api, new one if None
+            param4 (RateLimiter): limit of commands per chat, no limit
+                if None
+            param5 (int): seconds Telegram may reuse answer of inline query
+            param6 (AlertService): rate alerts of chats, alert commands
+                must not be used if None
+        """
+        if api is None:
+            api = ExchangeRatesAPI(plot_workers=plot_workers)
+        self.api = api
+        self.limiter = limiter
+        self.alerts = alerts
+        # First currency wins for symbols shared by several, like ¥
+        self.parser = CommandParser(
+            {symbol: cur for cur, symbol in reversed(self.CURRENCY_MAP.items())},
+            self.MAX_HISTORY_TARGETS)
+        # Identical charts requested at the same time are drawn once
+        self.flights = SingleFlight()
+        # Rendered /list replies by base with response they are made of
+        self.list_replies = {}
+        self.inline_cache_time = inline_cache_time
+        # Inline results by conversions with response of snapshot they
+        # are made of
+        self.inline_replies = LRUCache(self.MAX_INLINE_REPLIES)
+
+    def _allowed(self, update, command):
+        """
+        Returns:
+            (bool): False if chat used up its rate limit
+        """
+        if self.limiter is None:
+            return True
+        return self.limiter.allow(update.message.chat_id, self.COSTS[command])
 
     def _parse_latest(self, args):
         if len(args) == 1:
@@ -31,118 +141,608 @@ class App:
         else:
             return "USD"
 
-    def _parse_money(self, str1):
+    def _parse_exchange(self, args):
+        return self.parser.exchange(args)
+
+    def _parse_batch(self, args):
         """
         Args:
             param1 (obj): self
-            param2 (str): string to parse
+            param2 (list): words of command separated by commas
 
         Returns:
-            (str): parsed number
-            (str): parsed currency
+            (list): text of every conversion
+            (list): (amount, cur_from, cur_to) of every conversion, with
+                None values if it can not be parsed
         """
-        for cur in self.CURRENCY_MAP:
-            if self.CURRENCY_MAP[cur] in str1:
-                parsed = str1.replace(self.CURRENCY_MAP[cur], '')
-                return parsed, cur
-        return None, None
+        chunks = [c.strip() for c in ' '.join(args).split(',') if c.strip()]
+        items = [self._parse_exchange(c.split()) for c in chunks]
+        return chunks, items
 
-    def _parse_exchange(self, args):
-        if len(args) == 3 and args[1].lower() == 'to':
-            money_str = args[0]
-            for cur in self.CURRENCY_MAP:
-                if self.CURRENCY_MAP[cur] in money_str:
-                    parsed = money_str.replace(self.CURRENCY_MAP[cur], '')
-                    return parsed, cur, args[2]
+    def _parse_history(self, args):
+        cur_from, cur_to, days = self.parser.history(args)
+        if days is not None and not 0 < days <= self.MAX_HISTORY_DAYS:
+            return None, None, None
+        return cur_from, cur_to, days
 
-        elif len(args) == 4 and args[2].lower() == 'to':
-            if args[2].lower() == 'to':
-                return args[0], args[1], args[3]
+    def _parse_export(self, args):
+        cur_from, cur_to, days = self.parser.history(args)
+        if days is not None and not 0 < days <= self.MAX_EXPORT_DAYS:
+            return None, None, None
+        return cur_from, cur_to, days
 
-        return None, None, None
+    def _parse_alert(self, args):
+        return self.parser.alert(args)
 
-    def _parse_history(self, args):
-        if len(args) == 4 and args[1].lower() == 'for':
-            currencies = args[0].split('/')
-            if len(currencies) == 2 and args[2].isdigit() and args[3].lower() == 'days':
-                [cur_from, cur_to] = currencies
-                days = int(args[2])
-
-                return cur_from, cur_to, days
+    def _parse_inline(self, query):
+        """
+        Args:
+            param1 (obj): self
+            param2 (str): text of inline query, e.g. '100 USD EUR'
 
-        return None, None, None
+        Returns:
+            (tuple): (amount, cur_from, cur_to) of every conversion
+                answered to query, empty if query can't be parsed
+        """
+        if not query.strip():
+            return tuple((decimal.Decimal(1), cur_from, cur_to)
+                         for cur_from, cur_to in self.INLINE_COMMON)
+
+        amount, cur_from, cur_to = self.parser.inline(query.split())
+        if amount is None:
+            return ()
+        if cur_to is not None:
+            return ((amount, cur_from, cur_to),)
+        return tuple((amount, cur_from, target)
+                     for target in self.CURRENCY_MAP if target != cur_from)
 
     def start(self, update, context):
         usage = ('Use /list to get list of latest exchange rates '
                  'or specify custom currency with /list <valid currency>\n\n'
-                 'Also you can use /history and /exchange '
-                 'command and specifying arguments, click on command to know '
-                 'how to use them')
+                 'Also you can use /history, /export, /exchange, /batch and '
+                 '/alert command and specifying arguments, click on command '
+                 'to know how to use them')
         update.message.reply_text(usage)
 
     def latest(self, update, context):
         """Get list of all available exchange rates."""
-        usage = ('Usage: /list\nor\n/list <valid currency>'
-                 'Example:\n/list\nor\n/list  EUR')
+        if not self._allowed(update, 'list'):
+            update.message.reply_text(self.RATE_LIMITED)
+            return
+
         try:
             base = self._parse_latest(context.args)
 
             rates = self.api.latest(base=base)
-            if (rates is None) or ('error' in rates) or (rates['rates'] is None):
-                update.message.reply_text(usage)
-                return
-
-            rates = rates['rates']
+            res = self._format_latest(base, rates)
+            update.message.reply_text(res or self.LATEST_USAGE)
 
-            res = f'List of all available rates for {base}:\n'
-            for currency in rates:
-                res += f'{currency}: {rates[currency]}\n'
-            res += f'\nSourse:\n{self.api.BASE_URL}/latest?base={base}'
+        except (IndexError, ValueError):
+            update.message.reply_text(self.LATEST_USAGE)
 
-            update.message.reply_text(res)
+    def _format_latest(self, base, rates):
+        """
+        Args:
+            param1 (obj): self
+            param2 (str): base currency
+            param3 (dict): response of api.latest
 
-        except (IndexError, ValueError):
-            update.message.reply_text(usage)
+        Returns:
+            (str): reply message, None if rates are not available
+        """
+        if (rates is None) or ('error' in rates) or (rates['rates'] is None):
+            return None
+
+        # Responses are shared per snapshot, new snapshot means new object
+        cached = self.list_replies.get(base)
+        if cached is not None and cached[0] is rates:
+            return cached[1]
+
+        res = ''.join([
+            f'List of all available rates for {base}:\n',
+            *(f'{currency}: {rate}\n'
+              for currency, rate in rates['rates'].items()),
+            f'\nSourse:\n{self.api.BASE_URL}/latest?base={base}',
+        ])
+        self.list_replies[base] = (rates, res)
+        return res
 
     def exchange(self, update, context):
         """Get list of all available exchange rates."""
-        usage = ('Usage:\n/exchange <number> <currency> to <currency>\nor\n'
-                 '/exchange <number with symbol> to <currency>\n\n'
-                 'Example:\n/exchange 10 EUR to USD\nor\n/exchange 10$ to EUR')
+        if not self._allowed(update, 'exchange'):
+            update.message.reply_text(self.RATE_LIMITED)
+            return
+
         try:
             amount, cur_from, cur_to = self._parse_exchange(context.args)
             if any(arg is None for arg in [amount, cur_from, cur_to]):
-                update.message.reply_text(usage)
+                update.message.reply_text(self.EXCHANGE_USAGE)
                 return
 
             resp = self.api.exchange(amount, cur_from, cur_to)
-            if resp is None:
-                update.message.reply_text(usage)
+            update.message.reply_text(resp or self.EXCHANGE_USAGE)
+
+        except (IndexError, ValueError):
+            update.message.reply_text(self.EXCHANGE_USAGE)
+
+    def batch(self, update, context):
+        """Convert many amounts with one command."""
+        if not self._allowed(update, 'batch'):
+            update.message.reply_text(self.RATE_LIMITED)
+            return
+
+        try:
+            chunks, items = self._parse_batch(context.args)
+            if not 0 < len(items) <= self.MAX_BATCH:
+                update.message.reply_text(self.BATCH_USAGE)
                 return
 
-            update.message.reply_text(resp)
+            results = self.api.exchange_many(items)
+            update.message.reply_text(self._format_batch(chunks, results))
 
         except (IndexError, ValueError):
-            update.message.reply_text(usage)
+            update.message.reply_text(self.BATCH_USAGE)
+
+    def _format_batch(self, chunks, results):
+        return '\n'.join(
+            f'{chunk} = {res}' if res is not None else f'{chunk}: invalid'
+            for chunk, res in zip(chunks, results))
+
+    def inline(self, update, context):
+        """Answer inline query like '@bot 100 USD EUR' with conversions."""
+        query = update.inline_query
+        items = self._parse_inline(query.query)
+        if not items:
+            query.answer([], cache_time=self.inline_cache_time)
+            return
+
+        # Same response object is returned until snapshot is refreshed
+        rates = self.api.latest()
+        if 'error' in rates:
+            query.answer([], cache_time=0)
+            return
+
+        results = self._cached_inline(items, rates)
+        if results is None:
+            results = self._inline_results(
+                items, rates, self.api.exchange_many(items))
+        query.answer(results, cache_time=self.inline_cache_time)
+
+    @staticmethod
+    def _inline_key(items):
+        # Equal amounts like 1e1 and 10.00 are written differently
+        return tuple((f'{amount:f}', cur_from, cur_to)
+                     for amount, cur_from, cur_to in items)
+
+    def _cached_inline(self, items, rates):
+        cached = self.inline_replies.get(self._inline_key(items))
+        if cached is not None and cached[0] is rates:
+            return cached[1]
+        return None
+
+    def _inline_results(self, items, rates, converted):
+        """
+        Args:
+            param1 (obj): self
+            param2 (tuple): (amount, cur_from, cur_to) of every conversion
+            param3 (MappingProxyType): response of snapshot items are
+                converted with
+            param4 (list): result of api.exchange_many for items
+
+        Returns:
+            (list): InlineQueryResultArticle of every valid conversion
+        """
+        results = []
+        for (amount, cur_from, cur_to), res in zip(items, converted):
+            if res is None:
+                continue
+            text = f'{amount:f} {cur_from} = {res}'
+            results.append(InlineQueryResultArticle(
+                id=f'{cur_from}{cur_to}', title=text,
+                input_message_content=InputTextMessageContent(text)))
+        self.inline_replies.set(self._inline_key(items), (rates, results))
+        return results
 
     def history(self, update, context):
         """Get list of all available exchange rates."""
-        usage = ('Usage: /history <currency>/<currency> for <number> days'
-                 '(recommended to use 7 or more days)\n\n'
-                 'Example:\n/history USD/EUR for 7 days')
+        if not self._allowed(update, 'history'):
+            update.message.reply_text(self.RATE_LIMITED)
+            return
+
         try:
             cur_from, cur_to, days = self._parse_history(context.args)
             if any(arg is None for arg in [cur_from, cur_to, days]):
-                update.message.reply_text(usage)
+                update.message.reply_text(self.HISTORY_USAGE)
                 return
 
-            graph = self.api.plot_history(cur_from, cur_to, days)
+            graph = self.flights.do(
+                ('history', cur_from, tuple(cur_to), days),
+                self.api.plot_history, cur_from, cur_to, days)
             if graph is None:
-                update.message.reply_text(usage)
+                update.message.reply_text(self.HISTORY_USAGE)
                 return
             update.message.reply_photo(graph)
+        except PlotterBusy:
+            update.message.reply_text(self.PLOTTER_BUSY)
+        except (IndexError, ValueError):
+            update.message.reply_text(self.HISTORY_USAGE)
+
+    def export(self, update, context):
+        """Send history as CSV document streamed from history store."""
+        if not self._allowed(update, 'export'):
+            update.message.reply_text(self.RATE_LIMITED)
+            return
+
+        try:
+            cur_from, cur_to, days = self._parse_export(context.args)
+            if any(arg is None for arg in [cur_from, cur_to, days]):
+                update.message.reply_text(self.EXPORT_USAGE)
+                return
+
+            end = datetime.now()
+            rows = self.api.iter_history(
+                end - timedelta(days=days), end, cur_from, targets=cur_to)
+            if isinstance(rows, dict):
+                update.message.reply_text(self.EXPORT_USAGE)
+                return
+
+            with tempfile.SpooledTemporaryFile(self.EXPORT_MEMORY) as file:
+                text, writer = self._open_export(file, cur_to)
+                for day, rates in rows:
+                    writer.writerow(self._export_row(day, rates, cur_to))
+                update.message.reply_document(
+                    self._close_export(text),
+                    filename=self._export_name(cur_from, cur_to, days))
+
+        except HistoryUnavailable:
+            update.message.reply_text(self.EXPORT_FAILED)
+        except (IndexError, ValueError):
+            update.message.reply_text(self.EXPORT_USAGE)
+
+    def _open_export(self, file, targets):
+        """
+        Args:
+            param1 (obj): self
+            param2 (file): binary file to write CSV to
+            param3 (list): target currencies
+
+        Returns:
+            (io.TextIOWrapper): text wrapper of file
+            (csv.writer): writer of rows, header is already written
+        """
+        text = io.TextIOWrapper(file, encoding='utf-8', newline='')
+        writer = csv.writer(text)
+        writer.writerow(['date'] + targets)
+        return text, writer
+
+    def _export_row(self, day, rates, targets):
+        return [day] + [round(rates[cur], 6) for cur in targets]
+
+    def _close_export(self, text):
+        """
+        Returns:
+            (file): binary file with CSV, rewound to be sent
+        """
+        text.flush()
+        file = text.detach()
+        file.seek(0)
+        return file
+
+    def _export_name(self, cur_from, cur_to, days):
+        return '{}-{}-{}d.csv'.format(cur_from, '-'.join(cur_to), days)
+
+    def alert(self, update, context):
+        """Notify chat once when rate crosses given one."""
+        if not self._allowed(update, 'alert'):
+            update.message.reply_text(self.RATE_LIMITED)
+            return
+
+        try:
+            cur_from, cur_to, threshold = self._parse_alert(context.args)
+            if any(arg is None for arg in [cur_from, cur_to, threshold]):
+                update.message.reply_text(self.ALERT_USAGE)
+                return
+
+            rate = self.api.rate(cur_from, cur_to)
+            if rate is None:
+                update.message.reply_text(self.ALERT_USAGE)
+                return
+            update.message.reply_text(self._subscribe(
+                update, cur_from, cur_to, threshold, rate))
+
+        except (IndexError, ValueError):
+            update.message.reply_text(self.ALERT_USAGE)
+
+    def _subscribe(self, update, cur_from, cur_to, threshold, rate):
+        alert = self.alerts.subscribe(
+            update.message.chat_id, cur_from, cur_to, threshold, rate)
+        if alert is None:
+            return self.ALERTS_FULL
+        return f'Alert {alert.id}: {describe(alert)}, now {round(rate, 4)}'
+
+    def list_alerts(self, update, context):
+        """List alerts of chat which have not fired yet."""
+        if not self._allowed(update, 'alerts'):
+            update.message.reply_text(self.RATE_LIMITED)
+            return
+
+        alerts = self.alerts.chat_alerts(update.message.chat_id)
+        update.message.reply_text('\n'.join(
+            f'{alert.id}: {describe(alert)}' for alert in alerts)
+            or self.NO_ALERTS)
+
+    def unalert(self, update, context):
+        """Cancel alert of chat."""
+        if not self._allowed(update, 'unalert'):
+            update.message.reply_text(self.RATE_LIMITED)
+            return
+
+        try:
+            if len(context.args) != 1:
+                update.message.reply_text(self.UNALERT_USAGE)
+                return
+
+            alert_id = int(context.args[0])
+            if not self.alerts.unsubscribe(update.message.chat_id, alert_id):
+                update.message.reply_text(self.UNALERT_USAGE)
+                return
+            update.message.reply_text(f'Alert {alert_id} cancelled')
+
+        except ValueError:
+            update.message.reply_text(self.UNALERT_USAGE)
+
+
+class AsyncApp(App):
+    """App with coroutine handlers which share one event loop.
+
+    Handlers wait for API without occupying a dispatcher thread, only
+    replies to Telegram are sent from executor of the loop.
+    """
+
+    def __init__(self, api, loop, limiter=None, inline_cache_time=300,
+                 alerts=None):
+        """
+        Args:
+            param1 (obj): self
+            param2 (AsyncExchangeRatesAPI): api created in loop
+            param3 (asyncio.AbstractEventLoop): running event loop
+            param4 (RateLimiter): limit of commands per chat, no limit
+                if None
+            param5 (int): seconds Telegram may reuse answer of inline query
+            param6 (AlertService): rate alerts of chats, alert commands
+                must not be used if None
+        """
+        super().__init__(api=api, limiter=limiter,
+                         inline_cache_time=inline_cache_time, alerts=alerts)
+        self.loop = loop
+        self.flights = AsyncSingleFlight()
+
+    def handler(self, callback, wait=False):
+        """Wrap coroutine handler to be used by synchronous dispatcher.
+
+        Args:
+            param1 (obj): self
+            param2 (function): coroutine function handler
+            param3 (bool): block until handler finishes, so bounded
+                webhook lanes also bound handlers running in loop
+
+        Returns:
+            (function): synchronous handler
+        """
+        def run(update, context):
+            future = asyncio.run_coroutine_threadsafe(
+                callback(update, context), self.loop)
+            future.add_done_callback(self._log_failure)
+            if wait:
+                try:
+                    future.result()
+                except Exception:
+                    # Already logged by _log_failure
+                    pass
+        return run
+
+    def _log_failure(self, future):
+        if not future.cancelled() and future.exception() is not None:
+            logger.error('Handler failed', exc_info=future.exception())
+
+    async def _reply(self, send, *args):
+        await self.loop.run_in_executor(None, send, *args)
+
+    async def latest(self, update, context):
+        if not self._allowed(update, 'list'):
+            await self._reply(update.message.reply_text, self.RATE_LIMITED)
+            return
+
+        try:
+            base = self._parse_latest(context.args)
+
+            rates = await self.api.latest(base=base)
+            res = self._format_latest(base, rates)
+            await self._reply(update.message.reply_text,
+                              res or self.LATEST_USAGE)
+
+        except (IndexError, ValueError):
+            await self._reply(update.message.reply_text, self.LATEST_USAGE)
+
+    async def exchange(self, update, context):
+        if not self._allowed(update, 'exchange'):
+            await self._reply(update.message.reply_text, self.RATE_LIMITED)
+            return
+
+        try:
+            amount, cur_from, cur_to = self._parse_exchange(context.args)
+            if any(arg is None for arg in [amount, cur_from, cur_to]):
+                await self._reply(update.message.reply_text,
+                                  self.EXCHANGE_USAGE)
+                return
+
+            resp = await self.api.exchange(amount, cur_from, cur_to)
+            await self._reply(update.message.reply_text,
+                              resp or self.EXCHANGE_USAGE)
+
         except (IndexError, ValueError):
-            update.message.reply_text(usage)
+            await self._reply(update.message.reply_text, self.EXCHANGE_USAGE)
+
+    async def batch(self, update, context):
+        if not self._allowed(update, 'batch'):
+            await self._reply(update.message.reply_text, self.RATE_LIMITED)
+            return
+
+        try:
+            chunks, items = self._parse_batch(context.args)
+            if not 0 < len(items) <= self.MAX_BATCH:
+                await self._reply(update.message.reply_text, self.BATCH_USAGE)
+                return
+
+            results = await self.api.exchange_many(items)
+            await self._reply(update.message.reply_text,
+                              self._format_batch(chunks, results))
+
+        except (IndexError, ValueError):
+            await self._reply(update.message.reply_text, self.BATCH_USAGE)
+
+    async def inline(self, update, context):
+        query = update.inline_query
+        items = self._parse_inline(query.query)
+        if not items:
+            await self._reply(functools.partial(
+                query.answer, cache_time=self.inline_cache_time), [])
+            return
+
+        rates = await self.api.latest()
+        if 'error' in rates:
+            await self._reply(functools.partial(query.answer, cache_time=0), [])
+            return
+
+        results = self._cached_inline(items, rates)
+        if results is None:
+            results = self._inline_results(
+                items, rates, await self.api.exchange_many(items))
+        await self._reply(functools.partial(
+            query.answer, cache_time=self.inline_cache_time), results)
+
+    async def history(self, update, context):
+        if not self._allowed(update, 'history'):
+            await self._reply(update.message.reply_text, self.RATE_LIMITED)
+            return
+
+        try:
+            cur_from, cur_to, days = self._parse_history(context.args)
+            if any(arg is None for arg in [cur_from, cur_to, days]):
+                await self._reply(update.message.reply_text,
+                                  self.HISTORY_USAGE)
+                return
+
+            graph = await self.flights.do(
+                ('history', cur_from, tuple(cur_to), days),
+                self.api.plot_history, cur_from, cur_to, days)
+            if graph is None:
+                await self._reply(update.message.reply_text,
+                                  self.HISTORY_USAGE)
+                return
+            await self._reply(update.message.reply_photo, graph)
+        except PlotterBusy:
+            await self._reply(update.message.reply_text, self.PLOTTER_BUSY)
+        except (IndexError, ValueError):
+            await self._reply(update.message.reply_text, self.HISTORY_USAGE)
+
+    async def export(self, update, context):
+        if not self._allowed(update, 'export'):
+            await self._reply(update.message.reply_text, self.RATE_LIMITED)
+            return
+
+        try:
+            cur_from, cur_to, days = self._parse_export(context.args)
+            if any(arg is None for arg in [cur_from, cur_to, days]):
+                await self._reply(update.message.reply_text,
+                                  self.EXPORT_USAGE)
+                return
+
+            end = datetime.now()
+            rows = self.api.iter_history(
+                end - timedelta(days=days), end, cur_from, targets=cur_to)
+            if isinstance(rows, dict):
+                await self._reply(update.message.reply_text,
+                                  self.EXPORT_USAGE)
+                return
+
+            with tempfile.SpooledTemporaryFile(self.EXPORT_MEMORY) as file:
+                text, writer = self._open_export(file, cur_to)
+                async for day, rates in rows:
+                    writer.writerow(self._export_row(day, rates, cur_to))
+                await self._reply(functools.partial(
+                    update.message.reply_document,
+                    filename=self._export_name(cur_from, cur_to, days)),
+                    self._close_export(text))
+
+        except HistoryUnavailable:
+            await self._reply(update.message.reply_text, self.EXPORT_FAILED)
+        except (IndexError, ValueError):
+            await self._reply(update.message.reply_text, self.EXPORT_USAGE)
+
+    async def alert(self, update, context):
+        if not self._allowed(update, 'alert'):
+            await self._reply(update.message.reply_text, self.RATE_LIMITED)
+            return
+
+        try:
+            cur_from, cur_to, threshold = self._parse_alert(context.args)
+            if any(arg is None for arg in [cur_from, cur_to, threshold]):
+                await self._reply(update.message.reply_text, self.ALERT_USAGE)
+                return
+
+            rate = await self.api.rate(cur_from, cur_to)
+            if rate is None:
+                await self._reply(update.message.reply_text, self.ALERT_USAGE)
+                return
+            await self._reply(update.message.reply_text, self._subscribe(
+                update, cur_from, cur_to, threshold, rate))
+
+        except (IndexError, ValueError):
+            await self._reply(update.message.reply_text, self.ALERT_USAGE)
+
+
+def _start_loop():
+    """Run new event loop in daemon thread and return it."""
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    return loop
+
+
+def _start_ingester(app, years):
+    """Keep years of history in store of app's api, updated daily."""
+    if isinstance(app, AsyncApp):
+        import pytz
+        from apscheduler.schedulers.asyncio import AsyncIOScheduler
+
+        scheduler = AsyncIOScheduler(event_loop=app.loop, timezone=pytz.utc)
+        ingester = HistoryIngester(app.api, scheduler, years=years)
+        app.loop.call_soon_threadsafe(ingester.start)
+    else:
+        HistoryIngester(app.api, years=years).start()
+
+
+def _start_alerts(app, bot, rate):
+    """Check alerts of app against every new snapshot, notify with bot."""
+    app.alerts.start(bot.send_message, rate)
+    app.api.snapshot_listeners.append(app.alerts.check)
+    if app.api.refresher is not None:
+        return
+
+    # Without refresher snapshot is fetched only when users ask for rates
+    from refresher import RatesRefresher
+
+    if isinstance(app, AsyncApp):
+        import pytz
+        from apscheduler.schedulers.asyncio import AsyncIOScheduler
+
+        scheduler = AsyncIOScheduler(event_loop=app.loop, timezone=pytz.utc)
+        app.api.refresher = RatesRefresher(app.api, scheduler)
+        app.loop.call_soon_threadsafe(app.api.refresher.start)
+    else:
+        app.api.refresher = RatesRefresher(app.api)
+        app.api.refresher.start()
 
 
 def main():
@@ -152,19 +752,117 @@ def main():
               'a bot with BotFather in Telegram App.\n')
         return
 
-    app = App()
+    api_options = {
+        'plot_workers': int(os.environ.get('EXCHANGE_BOT_PLOT_WORKERS', 0)),
+        'stale_time': int(os.environ.get('EXCHANGE_BOT_STALE_TIME', 0)),
+        'cache_path': os.environ.get('EXCHANGE_BOT_CACHE_PATH'),
+    }
+    webhook_url = os.environ.get('EXCHANGE_BOT_WEBHOOK_URL')
+    inline_cache_time = int(os.environ.get('EXCHANGE_BOT_INLINE_CACHE_TIME', 300))
+    # Empty path disables alerts
+    alerts_path = os.environ.get('EXCHANGE_BOT_ALERTS_PATH', 'alerts.sqlite3')
+    alerts = AlertService(alerts_path) if alerts_path else None
+    limiter = RateLimiter(
+        rate=float(os.environ.get('EXCHANGE_BOT_RATE_LIMIT', 30)) / 60,
+        burst=float(os.environ.get('EXCHANGE_BOT_RATE_BURST', 20)))
+    if os.environ.get('EXCHANGE_BOT_ASYNC'):
+        from async_api import AsyncExchangeRatesAPI
+
+        loop = _start_loop()
+        api = asyncio.run_coroutine_threadsafe(
+            AsyncExchangeRatesAPI.create(**api_options), loop).result()
+        app = AsyncApp(api, loop, limiter, inline_cache_time, alerts)
+        # Lanes of webhook bound handlers only if they wait for them
+        wrap = functools.partial(app.handler, wait=bool(webhook_url))
+    else:
+        api_options['lazy'] = bool(os.environ.get('EXCHANGE_BOT_LAZY_START'))
+        app = App(api=ExchangeRatesAPI(**api_options), limiter=limiter,
+                  inline_cache_time=inline_cache_time, alerts=alerts)
+
+        def wrap(callback):
+            return callback
+
     token = os.environ['EXCHANGE_TELEGRAM_BOT']
+
+    history_years = int(os.environ.get('EXCHANGE_BOT_HISTORY_YEARS', 10))
+    if history_years > 0:
+        _start_ingester(app, history_years)
+
+    metrics_port = os.environ.get('EXCHANGE_BOT_METRICS_PORT')
+    if metrics_port:
+        register_cache('rates', app.api.cache)
+        register_cache('charts', app.api.plotter.charts)
+        MetricsServer(port=int(metrics_port)).start()
+
+    # Command: (lane of webhook mode, handler)
+    commands = {
+        'start': (CHEAP_LANE, timed('start', app.start)),
+        'list': (CHEAP_LANE, wrap(timed('list', app.latest))),
+        'history': (EXPENSIVE_LANE, wrap(timed('history', app.history))),
+        'exchange': (CHEAP_LANE, wrap(timed('exchange', app.exchange))),
+        'batch': (CHEAP_LANE, wrap(timed('batch', app.batch))),
+        'export': (EXPENSIVE_LANE, wrap(timed('export', app.export))),
+    }
+    inline = (CHEAP_LANE, wrap(timed('inline', app.inline)))
+
+    if alerts is not None:
+        # Notifications get a bot of their own, sent from one thread
+        _start_alerts(app, Bot(token), float(
+            os.environ.get('EXCHANGE_BOT_ALERTS_RATE', 25)))
+        commands.update({
+            'alert': (CHEAP_LANE, wrap(timed('alert', app.alert))),
+            'alerts': (CHEAP_LANE, timed('alerts', app.list_alerts)),
+            'unalert': (CHEAP_LANE, timed('unalert', app.unalert)),
+        })
+
+    if webhook_url:
+        run_webhook(token, webhook_url, commands, inline)
+        return
+
     updater = Updater(token)
 
     dispatcher = updater.dispatcher
-    dispatcher.add_handler(CommandHandler('start', app.start))
-    dispatcher.add_handler(CommandHandler('list', app.latest))
-    dispatcher.add_handler(CommandHandler('history', app.history))
-    dispatcher.add_handler(CommandHandler('exchange', app.exchange))
+    for command, (_, callback) in commands.items():
+        dispatcher.add_handler(CommandHandler(command, callback))
+    dispatcher.add_handler(InlineQueryHandler(inline[1]))
 
     updater.start_polling()
     updater.idle()
 
 
+def run_webhook(token, webhook_url, commands, inline=None):
+    """Serve updates from webhook until interrupted.
+
+    Args:
+        param1 (str): bot token
+        param2 (str): public URL of server, token is appended to it
+        param3 (dict): (lane, handler) by command
+        param4 (tuple): (lane, handler) of inline queries, ignored if None
+    """
+    # Tornado server is needed only in webhook mode
+    from webhook import Lane, WebhookServer
+
+    workers = int(os.environ.get('EXCHANGE_BOT_WORKERS', 8))
+    chart_workers = int(os.environ.get('EXCHANGE_BOT_CHART_WORKERS', 2))
+    queue_size = int(os.environ.get('EXCHANGE_BOT_QUEUE_SIZE', 100))
+
+    bot = Bot(token, request=Request(con_pool_size=workers + chart_workers + 1))
+    lanes = {
+        CHEAP_LANE: Lane(CHEAP_LANE, workers, queue_size),
+        EXPENSIVE_LANE: Lane(EXPENSIVE_LANE, chart_workers, queue_size),
+    }
+    server = WebhookServer(
+        bot, lanes, commands, inline=inline, listen='0.0.0.0',
+        port=int(os.environ.get('EXCHANGE_BOT_PORT', 8443)), url_path=token)
+    server.start()
+    bot.set_webhook('{}/{}'.format(webhook_url.rstrip('/'), token))
+
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        bot.delete_webhook()
+        server.stop()
+
+
 if __name__ == '__main__':
     main()
@@ -0,0 +1,222 @@
+import asyncio
+import json
+import decimal
+
+import pytz
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from tornado.httpclient import AsyncHTTPClient, HTTPClientError
+
+from api import ExchangeRatesAPI, HistoryUnavailable
+from metrics import UPSTREAM_ERRORS, UPSTREAM_SECONDS
+from singleflight import AsyncSingleFlight
+from history_store import date_chunks
+from refresher import RatesRefresher
+
+try:
+    import pycurl  # noqa: F401
+    AsyncHTTPClient.configure('tornado.curl_httpclient.CurlAsyncHTTPClient')
+except ImportError:
+    pass
+
+
+class AsyncExchangeRatesAPI(ExchangeRatesAPI):
+    """ExchangeRatesAPI with coroutines instead of blocking requests.
+
+    Use ``await AsyncExchangeRatesAPI.create()`` instead of constructor,
+    all public methods are coroutines with the same arguments and results
+    as in ExchangeRatesAPI, except iter_history which returns async
+    generator.
+    """
+
+    def __init__(self, base='USD', history_path='history.sqlite3',
+                 plot_workers=0, base_url=None, max_clients=100,
+                 timeout=(3.05, 10), retries=2, backoff=0.5, stale_time=0,
+                 cache_path=None):
+        """Set base without fetching supported currencies list.
+
+        Args:
+            param1 (obj): self
+            param2 (str): currency code
+            param3 (str): file of local history store
+            param4 (int): number of chart render processes
+            param5 (str): URL of API, BASE_URL if None
+            param6 (int): max simultaneous requests to API
+            param7 (tuple): connect and read timeouts in seconds
+            param8 (int): max retries of failed request
+            param9 (float): seconds to wait before first retry, doubled
+                for every next one
+            param10 (int): seconds stale rates are served while they are
+                refreshed in background, 0 to disable background refresh
+            param11 (str): database file of rates cache shared with other
+                bot processes, None to keep cache in memory of this one
+        """
+        self._setup(base, history_path, plot_workers, base_url,
+                    timeout, retries, backoff, stale_time, cache_path)
+        self.max_clients = max_clients
+        self.flights = AsyncSingleFlight()
+
+    @classmethod
+    async def create(cls, *args, **kwargs):
+        self = cls(*args, **kwargs)
+        self.currencies = self._snapshot_currencies(await self._snapshot())
+
+        if self.cache.stale_time > 0:
+            scheduler = AsyncIOScheduler(
+                event_loop=asyncio.get_running_loop(), timezone=pytz.utc)
+            self.refresher = RatesRefresher(self, scheduler)
+            self.refresher.start()
+        return self
+
+    @property
+    def client(self):
+        # Tornado keeps one shared client per event loop
+        return AsyncHTTPClient(max_clients=self.max_clients)
+
+    async def _request(self, path, query=''):
+        """
+        Args:
+            param1 (obj): self
+            param2 (str): URL path
+            param3 (str): URL query parameters
+
+        Returns:
+            (obj): response from API
+        """
+        url = '{}/{}?{}'.format(self.BASE_URL, path, query)
+        connect_timeout, read_timeout = self.timeout
+
+        for attempt in range(self.retries + 1):
+            if attempt > 0:
+                await asyncio.sleep(self._retry_delay(attempt))
+            try:
+                with UPSTREAM_SECONDS.time(path):
+                    resp = await self.client.fetch(
+                        url, raise_error=False,
+                        connect_timeout=connect_timeout,
+                        request_timeout=connect_timeout + read_timeout)
+            # raise_error=False covers only HTTP status errors, connection
+            # errors and timeouts are still raised
+            except (OSError, HTTPClientError) as e:
+                UPSTREAM_ERRORS.inc(path)
+                error = str(e)
+                continue
+
+            if resp.code == 599 or resp.code in self.RETRY_STATUSES:
+                UPSTREAM_ERRORS.inc(path)
+                error = str(resp.error)
+                continue
+            try:
+                return json.loads(resp.body, parse_float=decimal.Decimal)
+            except ValueError:
+                UPSTREAM_ERRORS.inc(path)
+                return {'error': 'Invalid response from API'}
+
+        return {'error': error}
+
+    async def _snapshot(self):
+        matrix, is_stale = self.cache.lookup(self.SNAPSHOT_BASE)
+        if matrix is not None:
+            if is_stale and self.refresher is not None:
+                self.refresher.refresh_soon()
+            return matrix
+
+        return await self.flights.do(
+            ('latest', self.SNAPSHOT_BASE), self._request_snapshot)
+
+    async def _request_snapshot(self):
+        data = await self._request('latest', self._snapshot_query())
+        return self._save_snapshot(data)
+
+    async def refresh(self, max_age=None):
+        matrix = self._recent_snapshot(max_age)
+        if matrix is not None:
+            self._notify_snapshot(matrix)
+            return matrix
+        return await self.flights.do(
+            ('latest', self.SNAPSHOT_BASE), self._request_snapshot)
+
+    async def _fill_history(self, start, end):
+        errors = await asyncio.gather(*[
+            self.flights.do(('history', s, e), self._fetch_history, s, e)
+            for s, e in self._missing_history(start, end)
+        ])
+        return next((e for e in errors if e is not None), None)
+
+    async def _fetch_history(self, start, end):
+        res = await self._request('history', self._history_query(start, end))
+        return self._save_history(res, start, end)
+
+    async def latest(self, base=None):
+        base = self._validate_base(base)
+        if base is None:
+            return {'error': 'Invalid base currency'}
+
+        return self._latest_response(await self._snapshot(), base)
+
+    async def history(self, start, end, base=None, target=None, targets=[]):
+        args = self._validate_history(start, end, base, target, targets)
+        if 'error' in args:
+            return args
+
+        error = await self._fill_history(args['start'], args['end'])
+        if error is not None:
+            return error
+
+        return self._history_response(**args)
+
+    def iter_history(self, start, end, base=None, target=None, targets=[]):
+        """Same as ExchangeRatesAPI.iter_history with async generator."""
+        args = self._validate_history(start, end, base, target, targets)
+        if 'error' in args:
+            return args
+        return self._iter_history(**args)
+
+    async def _iter_history(self, start, end, base, targets):
+        targets = targets.split(',')
+        currencies = set(targets + [base]) - {self.SNAPSHOT_BASE}
+        for chunk_start, chunk_end in date_chunks(
+                start, end, self.HISTORY_CHUNK_DAYS):
+            error = await self._fill_history(chunk_start, chunk_end)
+            if error is not None:
+                raise HistoryUnavailable(error['error'])
+            stored = self.history_store.rates(chunk_start, chunk_end, currencies)
+            for day, rates in self._history_rates(stored, base, targets):
+                yield day, rates
+
+    async def plot_history(self, cur_from, cur_to, days):
+        args = self._validate_plot(cur_from, cur_to, days)
+        if args is None:
+            return None
+
+        if await self._fill_history(args['start'], args['end']) is not None:
+            return None
+
+        key = self._plot_key(**args)
+        image = self.plotter.cached(key)
+        if image is not None:
+            return image
+
+        # Reading series and rendering are CPU bound, keep them away from
+        # event loop
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            None, self.plotter.plot_cached, key,
+            lambda: self._plot_args(**args))
+
+    async def exchange(self, amount, cur_from, cur_to):
+        amount, cur_from, cur_to = self._validate_exchange(
+            amount, cur_from, cur_to)
+        if any(arg is None for arg in [amount, cur_from, cur_to]):
+            return None
+
+        return self._exchange_response(
+            amount, cur_from, cur_to, await self._snapshot())
+
+    async def rate(self, cur_from, cur_to):
+        cur_from, cur_to = self._currency(cur_from), self._currency(cur_to)
+        if cur_from is None or cur_to is None:
+            return None
+        return self._rate_response(cur_from, cur_to, await self._snapshot())
+
+    async def exchange_many(self, items):
+        return self._exchange_many_response(items, await self._snapshot())
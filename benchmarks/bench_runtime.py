@@ -0,0 +1,85 @@
+"""Compare commands per second of synchronous and asyncio runtime.
+
+Every command exports one day more of history than the one before, so
+it misses the history store and waits on its own request to the fake
+upstream, requests can't be shared like misses of the rates cache are.
+Synchronous runtime waits on them in a pool of worker threads like the
+bot's, asyncio runtime keeps every command in flight without a thread.
+
+Usage:
+    python -m benchmarks.bench_runtime --commands 1000 --concurrency 200
+"""
+import argparse
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from api import ExchangeRatesAPI
+from async_api import AsyncExchangeRatesAPI
+from app import App, AsyncApp
+
+from benchmarks.fake_upstream import FakeUpstream
+from benchmarks.fakes import command
+
+
+COMMAND = '/export USD/EUR for {} days'
+
+
+def bench_sync(url, commands, concurrency, workers):
+    app = App(api=ExchangeRatesAPI(base_url=url, history_path=':memory:'))
+
+    def run(i):
+        update, context = command(COMMAND.format(i + 1))
+        app.export(update, context)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(min(workers, concurrency)) as executor:
+        list(executor.map(run, range(commands)))
+    return commands / (time.perf_counter() - started)
+
+
+async def _bench_async(url, commands, concurrency, workers):
+    api = await AsyncExchangeRatesAPI.create(
+        base_url=url, history_path=':memory:', max_clients=concurrency)
+    app = AsyncApp(api, asyncio.get_running_loop())
+    limit = asyncio.Semaphore(concurrency)
+
+    async def run(i):
+        async with limit:
+            update, context = command(COMMAND.format(i + 1))
+            await app.export(update, context)
+
+    started = time.perf_counter()
+    await asyncio.gather(*[run(i) for i in range(commands)])
+    return commands / (time.perf_counter() - started)
+
+
+def bench_async(url, commands, concurrency, workers):
+    return asyncio.run(_bench_async(url, commands, concurrency, workers))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--commands', type=int, default=500)
+    parser.add_argument('--concurrency', type=int, default=100)
+    parser.add_argument('--workers', type=int, default=8,
+                        help='threads of synchronous runtime, like '
+                             'EXCHANGE_BOT_WORKERS')
+    parser.add_argument('--latency', type=float, default=0.2,
+                        help='seconds fake upstream waits per request')
+    args = parser.parse_args()
+
+    upstream = FakeUpstream(latency=args.latency)
+    url = upstream.start()
+    try:
+        for name, bench in (('sync', bench_sync), ('async', bench_async)):
+            requests = upstream.requests
+            rate = bench(url, args.commands, args.concurrency, args.workers)
+            print('{:>5}: {:8.1f} commands/sec, {} upstream requests'.format(
+                name, rate, upstream.requests - requests))
+    finally:
+        upstream.stop()
+
+
+if __name__ == '__main__':
+    main()
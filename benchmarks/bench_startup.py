@@ -0,0 +1,56 @@
+"""Measure how long it takes to start App, with and without lazy start.
+
+Every measurement runs in a new interpreter so imports are not cached.
+
+Usage:
+    python -m benchmarks.bench_startup --latency 0.5 --runs 5
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+import tempfile
+
+from benchmarks.fake_upstream import FakeUpstream
+
+
+SCRIPT = '''
+import time
+started = time.perf_counter()
+from api import ExchangeRatesAPI
+from app import App
+App(api=ExchangeRatesAPI(base_url={url!r}, history_path={path!r}, lazy={lazy}))
+print(time.perf_counter() - started)
+'''
+
+
+def startup_time(url, path, lazy):
+    script = SCRIPT.format(url=url, path=path, lazy=lazy)
+    out = subprocess.run([sys.executable, '-c', script], check=True,
+                         stdout=subprocess.PIPE, universal_newlines=True)
+    return float(out.stdout.split()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--latency', type=float, default=0.3,
+                        help='seconds fake upstream waits per request')
+    args = parser.parse_args()
+
+    upstream = FakeUpstream(latency=args.latency)
+    url = upstream.start()
+    try:
+        with tempfile.NamedTemporaryFile(suffix='.sqlite3') as db:
+            for lazy in (False, True):
+                times = [startup_time(url, db.name, lazy)
+                         for _ in range(args.runs)]
+                print('{:>5}: median {:.3f}s, max {:.3f}s'.format(
+                    'lazy' if lazy else 'eager',
+                    statistics.median(times), max(times)))
+    finally:
+        upstream.stop()
+
+
+if __name__ == '__main__':
+    main()
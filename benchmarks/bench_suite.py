@@ -0,0 +1,168 @@
+"""Measure latency of API methods and App handlers, cold and warm.
+
+Cold runs start every call with empty rates cache, chart cache and history
+store, so they include requests to the fake upstream and rendering. Warm
+runs repeat a call which was already answered once.
+
+Usage:
+    python -m benchmarks.bench_suite --repeat 50 --latency 0.02
+    python -m benchmarks.bench_suite --save baseline.json
+    python -m benchmarks.bench_suite --baseline baseline.json --tolerance 0.2
+"""
+import argparse
+import json
+import math
+import sys
+import time
+
+from api import ExchangeRatesAPI
+from app import App
+from cache import Cache, LRUCache
+from history_store import HistoryStore
+
+from benchmarks.fake_upstream import FakeUpstream
+from benchmarks.fakes import command
+
+
+def _api_cases(api):
+    return {
+        'api.latest': lambda: api.latest('USD'),
+        'api.exchange': lambda: api.exchange(10, 'USD', 'EUR'),
+        'api.history': lambda: api.history(
+            '2021-01-01', '2021-03-31', 'USD', 'EUR'),
+        'api.plot_history': lambda: api.plot_history('USD', 'EUR', 365),
+    }
+
+
+def _app_cases(app):
+    def handle(handler, text):
+        update, context = command(text)
+        return lambda: handler(update, context)
+
+    return {
+        'app /list': handle(app.latest, '/list USD'),
+        'app /exchange': handle(app.exchange, '/exchange 10 USD to EUR'),
+        'app /batch': handle(
+            app.batch, '/batch 10 USD to EUR, 5 GBP to JPY, 1 EUR to PLN'),
+        'app /history': handle(app.history, '/history USD/EUR for 30 days'),
+    }
+
+
+def make_cold(app):
+    """Forget everything App and its API have cached or stored."""
+    api = app.api
+    api.cache = Cache(max_time=api.cache.max_time)
+    charts = api.plotter.charts
+    api.plotter.charts = LRUCache(charts.max_entries, charts.max_bytes)
+    api.history_store.close()
+    api.history_store = HistoryStore(':memory:')
+    app.list_replies.clear()
+
+
+def percentile(samples, part):
+    """
+    Args:
+        param1 (list): sorted samples
+        param2 (float): part from 0 to 1
+
+    Returns:
+        (float): nearest-rank percentile
+    """
+    return samples[max(0, math.ceil(part * len(samples)) - 1)]
+
+
+def measure(call, repeat, before=None):
+    """
+    Args:
+        param1 (function): measured call
+        param2 (int): number of calls
+        param3 (function): called before every call, not measured
+
+    Returns:
+        (dict): calls per second and latency percentiles in milliseconds
+    """
+    samples = []
+    for _ in range(repeat):
+        if before is not None:
+            before()
+        started = time.perf_counter()
+        call()
+        samples.append(time.perf_counter() - started)
+
+    samples.sort()
+    return {
+        'ops': len(samples) / sum(samples),
+        'p50': percentile(samples, 0.5) * 1000,
+        'p99': percentile(samples, 0.99) * 1000,
+    }
+
+
+def run(url, repeat):
+    """
+    Returns:
+        (dict): results of measure by 'case (cold|warm)'
+    """
+    api = ExchangeRatesAPI(base_url=url, history_path=':memory:')
+    app = App(api=api)
+    cases = dict(_api_cases(api), **_app_cases(app))
+
+    results = {}
+    for name, call in cases.items():
+        results[name + ' (cold)'] = measure(
+            call, repeat, before=lambda: make_cold(app))
+        call()
+        results[name + ' (warm)'] = measure(call, repeat)
+    api.plotter.close()
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """
+    Returns:
+        (list): names of cases whose p50 grew more than tolerance
+    """
+    return [name for name, res in results.items()
+            if name in baseline and
+            res['p50'] > baseline[name]['p50'] * (1 + tolerance)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--repeat', type=int, default=30)
+    parser.add_argument('--latency', type=float, default=0.02,
+                        help='seconds fake upstream waits per request')
+    parser.add_argument('--payloads',
+                        help='directory of recorded payloads to serve')
+    parser.add_argument('--save', help='write results to JSON file')
+    parser.add_argument('--baseline', help='JSON file of earlier results')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='allowed p50 growth over baseline')
+    args = parser.parse_args()
+
+    upstream = FakeUpstream(latency=args.latency, payloads=args.payloads)
+    url = upstream.start()
+    try:
+        results = run(url, args.repeat)
+    finally:
+        upstream.stop()
+
+    print('{:<28} {:>10} {:>10} {:>10}'.format('case', 'ops/sec', 'p50 ms',
+                                               'p99 ms'))
+    for name, res in results.items():
+        print('{:<28} {ops:10.1f} {p50:10.3f} {p99:10.3f}'.format(name, **res))
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            slower = compare(results, json.load(f), args.tolerance)
+        for name in slower:
+            print('Regression: {}'.format(name))
+        if slower:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
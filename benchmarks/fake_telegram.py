@@ -0,0 +1,153 @@
+import asyncio
+import itertools
+import json
+import logging
+import threading
+import time
+
+import tornado.httpserver
+import tornado.ioloop
+import tornado.netutil
+import tornado.web
+
+
+logging.getLogger('tornado.access').setLevel(logging.WARNING)
+
+_update_ids = itertools.count(1)
+
+
+def command_update(text, chat_id=1):
+    """
+    Args:
+        param1 (str): text of message, e.g. '/list EUR'
+        param2 (int): id of chat which sent message
+
+    Returns:
+        (dict): update as Telegram sends it to webhook
+    """
+    update_id = next(_update_ids)
+    return {
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id,
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private'},
+            'from': {'id': chat_id, 'is_bot': False, 'first_name': 'User'},
+            'text': text,
+            'entities': [{'type': 'bot_command', 'offset': 0,
+                          'length': len(text.split()[0])}],
+        },
+    }
+
+
+def inline_update(query, user_id=1):
+    """
+    Args:
+        param1 (str): text of inline query, e.g. '100 USD EUR'
+        param2 (int): id of user who typed query
+
+    Returns:
+        (dict): update as Telegram sends it to webhook
+    """
+    update_id = next(_update_ids)
+    return {
+        'update_id': update_id,
+        'inline_query': {
+            'id': str(update_id),
+            'from': {'id': user_id, 'is_bot': False, 'first_name': 'User'},
+            'query': query,
+            'offset': '',
+        },
+    }
+
+
+class _MethodHandler(tornado.web.RequestHandler):
+    def initialize(self, telegram):
+        self.telegram = telegram
+
+    def post(self, token, method):
+        if self.request.headers.get('Content-Type', '').startswith(
+                'application/json'):
+            params = json.loads(self.request.body or b'{}')
+        else:
+            params = {k: v[0].decode() for k, v in
+                      self.request.body_arguments.items()}
+            params.update({k: v[0]['body'] for k, v in
+                           self.request.files.items()})
+
+        with self.telegram.lock:
+            self.telegram.calls.append((method, params))
+
+        if method == 'getMe':
+            result = {'id': 1, 'is_bot': True, 'first_name': 'Bot',
+                      'username': 'bot'}
+        elif method.startswith('send'):
+            result = {
+                'message_id': len(self.telegram.calls),
+                'date': int(time.time()),
+                'chat': {'id': int(params.get('chat_id', 0)),
+                         'type': 'private'},
+            }
+            if 'text' in params:
+                result['text'] = params['text']
+        else:
+            result = True
+        self.write({'ok': True, 'result': result})
+
+
+class FakeTelegram:
+    """Local stand-in for Telegram Bot API running in a thread.
+
+    Example:
+        telegram = FakeTelegram()
+        bot = Bot(token, base_url=telegram.start())
+        ...
+        telegram.stop()
+    """
+
+    def __init__(self):
+        self.calls = []
+        self.lock = threading.Lock()
+        self.url = None
+        self._loop = None
+        self._thread = None
+
+    def sent(self, method='sendMessage'):
+        """
+        Returns:
+            (list): parameters of every call of method
+        """
+        with self.lock:
+            return [params for name, params in self.calls if name == method]
+
+    def start(self):
+        """
+        Returns:
+            (str): base URL of bot API to pass to telegram.Bot
+        """
+        started = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, args=(started,), daemon=True)
+        self._thread.start()
+        started.wait()
+        return self.url
+
+    def _run(self, started):
+        asyncio.set_event_loop(asyncio.new_event_loop())
+        app = tornado.web.Application([
+            (r'/bot([^/]+)/(\w+)', _MethodHandler, {'telegram': self}),
+        ])
+        server = tornado.httpserver.HTTPServer(app)
+        sockets = tornado.netutil.bind_sockets(0, '127.0.0.1')
+        server.add_sockets(sockets)
+
+        self.url = 'http://127.0.0.1:{}/bot'.format(
+            sockets[0].getsockname()[1])
+        self._loop = tornado.ioloop.IOLoop.current()
+        started.set()
+        self._loop.start()
+        server.stop()
+
+    def stop(self):
+        self._loop.add_callback(self._loop.stop)
+        self._thread.join()
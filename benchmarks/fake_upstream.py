@@ -0,0 +1,207 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+from datetime import date, timedelta
+
+import tornado.httpserver
+import tornado.ioloop
+import tornado.netutil
+import tornado.web
+
+
+logging.getLogger('tornado.access').setLevel(logging.WARNING)
+
+RATES = {
+    'CAD': 1.5128, 'HKD': 9.2611, 'ISK': 154.0, 'PHP': 57.996,
+    'DKK': 7.4361, 'HUF': 366.58, 'CZK': 26.226, 'AUD': 1.5479,
+    'RON': 4.8878, 'SEK': 10.1863, 'IDR': 17184.75, 'INR': 87.305,
+    'BRL': 6.8348, 'RUB': 88.3, 'HRK': 7.5795, 'JPY': 129.21,
+    'THB': 36.545, 'CHF': 1.1076, 'SGD': 1.6008, 'PLN': 4.5654,
+    'BGN': 1.9558, 'TRY': 8.9924, 'CNY': 7.7316, 'NOK': 10.1893,
+    'NZD': 1.6704, 'ZAR': 18.3041, 'USD': 1.1933, 'MXN': 25.1823,
+    'ILS': 3.9552, 'GBP': 0.8618, 'KRW': 1349.25, 'MYR': 4.8653,
+}
+
+
+def _rates(base, day=None):
+    """Rates against base, slightly different for every day."""
+    if base != 'EUR' and base not in RATES:
+        return None
+    scale = 1 if day is None else 1 + (day.toordinal() % 11 - 5) / 1000
+    base_rate = 1 if base == 'EUR' else RATES[base]
+    rates = {cur: round(rate * scale / base_rate, 6)
+             for cur, rate in RATES.items()}
+    rates['EUR'] = round(1 / base_rate, 6)
+    return rates
+
+
+class _Handler(tornado.web.RequestHandler):
+    def initialize(self, upstream):
+        self.upstream = upstream
+
+    async def prepare(self):
+        self.upstream.requests += 1
+        if self.upstream.latency:
+            await asyncio.sleep(self.upstream.latency)
+        if self.upstream.failures > 0:
+            self.upstream.failures -= 1
+            self.set_status(503)
+            self.finish()
+
+
+def _rebase(rates, base):
+    """Rates against EUR turned into rates against base."""
+    if base == 'EUR':
+        return rates
+    if base not in rates:
+        return None
+    base_rate = rates[base]
+    rates = {cur: round(rate / base_rate, 6) for cur, rate in rates.items()}
+    rates['EUR'] = round(1 / base_rate, 6)
+    return rates
+
+
+class _LatestHandler(_Handler):
+    def get(self):
+        base = self.get_argument('base', 'EUR')
+        latest = self.upstream.latest(base)
+        if latest is None:
+            self.set_status(400)
+            self.write({'error': "Base '{}' is not supported.".format(base)})
+            return
+        self.write(latest)
+
+
+class _HistoryHandler(_Handler):
+    def get(self):
+        base = self.get_argument('base', 'EUR')
+        try:
+            start = date.fromisoformat(self.get_argument('start_at'))
+            end = date.fromisoformat(self.get_argument('end_at'))
+        except (tornado.web.MissingArgumentError, ValueError):
+            self.set_status(400)
+            self.write({'error': 'start_at and end_at are required'})
+            return
+        rates = self.upstream.history(base, start, end)
+        if start > end or rates is None:
+            self.set_status(400)
+            self.write({'error': 'Invalid parameters'})
+            return
+
+        self.write({'rates': rates, 'start_at': start.isoformat(),
+                    'end_at': end.isoformat(), 'base': base})
+
+
+class FakeUpstream:
+    """Local stand-in for api.exchangeratesapi.io running in a thread.
+
+    Example:
+        upstream = FakeUpstream(latency=0.05)
+        api = ExchangeRatesAPI(base_url=upstream.start())
+        ...
+        upstream.stop()
+    """
+
+    def __init__(self, latency=0.0, payloads=None):
+        """
+        Args:
+            param1 (obj): self
+            param2 (float): seconds to wait before every response
+            param3 (str): directory with latest.json and history.json
+                recorded by benchmarks.record_payloads, rates are made up
+                if None, recorded history is repeated to cover any dates
+        """
+        self.latency = latency
+        self.requests = 0
+        # Next requests answered with 503
+        self.failures = 0
+        self.recorded = None
+        if payloads is not None:
+            self.recorded = {}
+            for name in ['latest', 'history']:
+                with open(os.path.join(payloads, name + '.json')) as f:
+                    self.recorded[name] = json.load(f)
+        self.url = None
+        self._loop = None
+        self._thread = None
+
+    def latest(self, base):
+        """
+        Returns:
+            (dict): 'latest' response of base, None if base is unknown
+        """
+        if self.recorded is None:
+            rates, day = _rates(base), '2021-03-05'
+        else:
+            latest = self.recorded['latest']
+            rates, day = _rebase(latest['rates'], base), latest['date']
+        if rates is None:
+            return None
+        return {'rates': rates, 'base': base, 'date': day}
+
+    def history(self, base, start, end):
+        """
+        Returns:
+            (dict): rates of base by date from start to end, None if base
+                is unknown
+        """
+        if self.recorded is None:
+            if _rates(base) is None:
+                return None
+            rates = {}
+            day = start
+            while day <= end:
+                if day.weekday() < 5:
+                    rates[day.isoformat()] = _rates(base, day)
+                day += timedelta(days=1)
+            return rates
+
+        # Recorded days are replayed in a loop so any range has rates
+        recorded = self.recorded['history']['rates']
+        first = date.fromisoformat(min(recorded))
+        span = (date.fromisoformat(max(recorded)) - first).days + 1
+        rates = {}
+        day = start
+        while day <= end:
+            replayed = first + timedelta(days=day.toordinal() % span)
+            day_rates = recorded.get(replayed.isoformat())
+            if day_rates is not None:
+                rates[day.isoformat()] = _rebase(day_rates, base)
+                if rates[day.isoformat()] is None:
+                    return None
+            day += timedelta(days=1)
+        return rates
+
+    def start(self):
+        """
+        Returns:
+            (str): base URL of server
+        """
+        started = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, args=(started,), daemon=True)
+        self._thread.start()
+        started.wait()
+        return self.url
+
+    def _run(self, started):
+        asyncio.set_event_loop(asyncio.new_event_loop())
+        app = tornado.web.Application([
+            (r'/latest', _LatestHandler, {'upstream': self}),
+            (r'/history', _HistoryHandler, {'upstream': self}),
+        ])
+        server = tornado.httpserver.HTTPServer(app)
+        sockets = tornado.netutil.bind_sockets(0, '127.0.0.1')
+        server.add_sockets(sockets)
+
+        self.url = 'http://127.0.0.1:{}'.format(sockets[0].getsockname()[1])
+        self._loop = tornado.ioloop.IOLoop.current()
+        started.set()
+        self._loop.start()
+        server.stop()
+
+    def stop(self):
+        self._loop.add_callback(self._loop.stop)
+        self._thread.join()
@@ -0,0 +1,67 @@
+class FakeMessage:
+    """Stores replies instead of sending them to Telegram."""
+
+    def __init__(self, text='', chat_id=1):
+        self.text = text
+        self.chat_id = chat_id
+        self.replies = []
+
+    def reply_text(self, text, **kwargs):
+        self.replies.append(text)
+
+    def reply_photo(self, photo, **kwargs):
+        self.replies.append(photo)
+
+    def reply_document(self, document, filename=None, **kwargs):
+        self.replies.append((filename, document.read()))
+
+
+class FakeUpdate:
+    def __init__(self, text='', chat_id=1):
+        self.message = FakeMessage(text, chat_id)
+
+
+class FakeContext:
+    def __init__(self, args):
+        self.args = args
+
+
+def command(text, chat_id=1):
+    """
+    Args:
+        param1 (str): command with arguments, e.g. '/list EUR'
+        param2 (int): id of chat which sent command
+
+    Returns:
+        (FakeUpdate): update of handler
+        (FakeContext): context of handler
+    """
+    return FakeUpdate(text, chat_id), FakeContext(text.split()[1:])
+
+
+class FakeInlineQuery:
+    """Stores answers instead of sending them to Telegram."""
+
+    def __init__(self, query=''):
+        self.query = query
+        self.answers = []
+
+    def answer(self, results, cache_time=300, **kwargs):
+        self.answers.append((results, cache_time))
+
+
+class FakeInlineUpdate:
+    def __init__(self, query=''):
+        self.inline_query = FakeInlineQuery(query)
+
+
+def inline_query(text):
+    """
+    Args:
+        param1 (str): text of inline query, e.g. '100 USD EUR'
+
+    Returns:
+        (FakeInlineUpdate): update of handler
+        (FakeContext): context of handler
+    """
+    return FakeInlineUpdate(text), FakeContext([])
@@ -0,0 +1,39 @@
+"""Record latest and history responses of rates API for FakeUpstream.
+
+Usage:
+    python -m benchmarks.record_payloads --out benchmarks/payloads \\
+        --start 2020-01-01 --end 2020-12-31
+"""
+import argparse
+import json
+import os
+
+import requests
+
+from api import ExchangeRatesAPI
+
+
+def record(url, path, query, out):
+    resp = requests.get('{}/{}'.format(url, path), params=query, timeout=30)
+    resp.raise_for_status()
+    with open(os.path.join(out, path + '.json'), 'w') as f:
+        json.dump(resp.json(), f, sort_keys=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--url', default=ExchangeRatesAPI.BASE_URL)
+    parser.add_argument('--out', default='benchmarks/payloads')
+    parser.add_argument('--start', required=True, help='first day, YYYY-MM-DD')
+    parser.add_argument('--end', required=True, help='last day, YYYY-MM-DD')
+    args = parser.parse_args()
+
+    os.makedirs(args.out, exist_ok=True)
+    base = ExchangeRatesAPI.SNAPSHOT_BASE
+    record(args.url, 'latest', {'base': base}, args.out)
+    record(args.url, 'history', {'base': base, 'start_at': args.start,
+                                 'end_at': args.end}, args.out)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,29 +1,405 @@
+import sqlite3
+import sys
 import threading
 import time
+from collections import OrderedDict
+from collections.abc import Mapping
+from datetime import datetime, timedelta, timezone
+
+
+def sizeof(value):
+    """Approximate memory taken by value and everything it refers to.
+
+    Args:
+        param1 (obj): value
+
+    Returns:
+        (int): size in bytes
+    """
+    seen = set()
+    size = 0
+    stack = [value]
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        size += sys.getsizeof(obj)
+
+        if isinstance(obj, Mapping):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset)):
+            stack.extend(obj)
+        elif hasattr(obj, '__dict__'):
+            stack.append(vars(obj))
+    return size
+
+
+class MemoryBackend:
+    """Cache entries kept in memory of current process, bounded by LRU."""
+
+    def __init__(self, max_entries=64, max_bytes=16 * 2**20):
+        """
+        Args:
+            param1 (obj): self
+            param2 (int): max number of entries
+            param3 (int): max total size of entries in bytes, measured
+                with sizeof when they are saved, None for no limit
+        """
+        self.entries = LRUCache(max_entries=max_entries, max_bytes=max_bytes)
+
+    def get(self, key):
+        """
+        Returns:
+            (tuple): value and unix time it was saved, None if missing
+        """
+        return self.entries.get(key)
+
+    def set(self, key, value, updated, expire_at=None):
+        """
+        Args:
+            param1 (obj): self
+            param2 (str): key
+            param3 (obj): value
+            param4 (int): unix time value is saved at
+            param5 (float): unix time when entry expires, None for never
+        """
+        self.entries.set(key, (value, updated), size=sizeof(value),
+                         expire_at=expire_at)
+
+    def delete(self, key, updated):
+        """Delete entry unless it was saved again after updated."""
+        self.entries.delete(key, check=lambda entry: entry[1] == updated)
+
+    def sweep(self):
+        return self.entries.sweep()
+
+    def stats(self):
+        return self.entries.stats()
+
+
+class SQLiteBackend:
+    """Cache entries shared by processes through SQLite database file.
+
+    Values are stored serialized and decoded again only when other
+    process saved a different value, so repeated reads return the same
+    object like MemoryBackend does.
+    """
+
+    SCHEMA = (
+        'CREATE TABLE IF NOT EXISTS cache ('
+        ' key TEXT PRIMARY KEY,'
+        ' updated INTEGER NOT NULL,'
+        ' expire_at REAL,'
+        ' value BLOB NOT NULL)'
+    )
+
+    def __init__(self, path, dumps, loads):
+        """
+        Args:
+            param1 (obj): self
+            param2 (str): database file shared by processes
+            param3 (function): serializes value to bytes
+            param4 (function): deserializes value from bytes
+        """
+        self.lock = threading.Lock()
+        self.dumps = dumps
+        self.loads = loads
+        # Decoded values by key as (serialized, value)
+        self.decoded = {}
+        self.conn = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        with self.lock, self.conn:
+            self.conn.execute('PRAGMA journal_mode=WAL')
+            self.conn.execute(self.SCHEMA)
+
+    def get(self, key):
+        with self.lock:
+            row = self.conn.execute(
+                'SELECT updated, value FROM cache WHERE key = ?'
+                ' AND (expire_at IS NULL OR expire_at > ?)',
+                (key, time.time())).fetchone()
+            if row is None:
+                self.decoded.pop(key, None)
+                return None
+
+            updated, data = row
+            data = bytes(data)
+            if key not in self.decoded or self.decoded[key][0] != data:
+                self.decoded[key] = (data, self.loads(data))
+            return self.decoded[key][1], updated
+
+    def set(self, key, value, updated, expire_at=None):
+        data = self.dumps(value)
+        with self.lock, self.conn:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?)',
+                (key, updated, expire_at, data))
+            self.decoded[key] = (data, value)
+
+    def delete(self, key, updated):
+        with self.lock, self.conn:
+            self.conn.execute(
+                'DELETE FROM cache WHERE key = ? AND updated = ?',
+                (key, updated))
+
+    def sweep(self):
+        """
+        Returns:
+            (int): number of deleted expired entries
+        """
+        with self.lock, self.conn:
+            deleted = self.conn.execute(
+                'DELETE FROM cache WHERE expire_at <= ?',
+                (time.time(),)).rowcount
+            keys = {key for key, in self.conn.execute('SELECT key FROM cache')}
+            for key in set(self.decoded) - keys:
+                del self.decoded[key]
+        return deleted
+
+    def stats(self):
+        with self.lock:
+            entries, size = self.conn.execute(
+                'SELECT count(*), coalesce(sum(length(value)), 0)'
+                ' FROM cache').fetchone()
+        return {'entries': entries, 'bytes': size, 'evictions': 0}
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
 
 class Cache:
-    def __init__(self, max_time=600):
+    def __init__(self, max_time=600, stale_time=0, backend=None,
+                 sweep_interval=60):
+        """
+        Args:
+            param1 (obj): self
+            param2 (int): seconds entry is fresh
+            param3 (int): seconds entry can be served stale after it is
+                not fresh anymore, while it is being refreshed
+            param4 (obj): where entries are kept, MemoryBackend if None,
+                SQLiteBackend to share them with other processes
+            param5 (int): seconds between removals of expired entries
+        """
         self.lock = threading.Lock()
         self.max_time = max_time
-        self.data = {}
+        self.stale_time = stale_time
+        if backend is None:
+            backend = MemoryBackend()
+        self.backend = backend
+        self.sweep_interval = sweep_interval
+        self.next_sweep = time.time() + sweep_interval
+        self.hits = 0
+        self.misses = 0
 
     def save_rates(self, rates, base):
         time_now = int(time.time())
-        res = {'rates': rates, 'last_updated': time_now}
+        # Entry expires when lookup would not serve it anymore
+        expire_at = time_now + self.max_time + self.stale_time + 1
+        self.backend.set(base, rates, time_now, expire_at)
+        self._sweep_if_due()
 
-        with self.lock:
-            self.data[base] = res
-    
     def rates(self, base):
+        return self.lookup(base)[0]
+
+    def age(self, base):
+        """
+        Returns:
+            (int): seconds since rates were saved, None if there are none
+        """
+        entry = self.backend.get(base)
+        if entry is None:
+            return None
+        return int(time.time()) - entry[1]
+
+    def lookup(self, base):
+        """
+        Args:
+            param1 (obj): self
+            param2 (str): key of rates
+
+        Returns:
+            (obj): rates, None if there are no rates or they expired
+            (bool): True if rates are stale and should be refreshed
+        """
         time_now = int(time.time())
-        
+
+        entry = self.backend.get(base)
+        if entry is not None:
+            rates, last_updated = entry
+            time_since_update = time_now - last_updated
+            if self.max_time + self.stale_time < time_since_update:
+                self.backend.delete(base, last_updated)
+                entry = None
+
+        with self.lock:
+            if entry is None:
+                self.misses += 1
+                return None, False
+            self.hits += 1
+        return rates, self.max_time < time_since_update
+
+    def _sweep_if_due(self):
         with self.lock:
-            if base not in self.data:
+            if time.time() < self.next_sweep:
+                return
+            self.next_sweep = time.time() + self.sweep_interval
+        self.sweep()
+
+    def sweep(self):
+        """
+        Returns:
+            (int): number of removed expired entries
+        """
+        return self.backend.sweep()
+
+    def stats(self):
+        """
+        Returns:
+            (dict): hits, misses, evictions, entries and bytes in use
+        """
+        stats = self.backend.stats()
+        with self.lock:
+            stats.update(hits=self.hits, misses=self.misses)
+        return stats
+
+
+class LRUCache:
+    """Least recently used cache bounded by entries and bytes with TTL."""
+
+    def __init__(self, max_entries=128, max_bytes=None, max_time=None,
+                 sweep_interval=60):
+        """
+        Args:
+            param1 (obj): self
+            param2 (int): max number of entries
+            param3 (int): max total size of values in bytes, None for no limit
+            param4 (int): default seconds entry lives, None for no limit
+            param5 (int): seconds between removals of expired entries
+        """
+        self.lock = threading.Lock()
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_time = max_time
+        self.sweep_interval = sweep_interval
+        self.next_sweep = time.time() + sweep_interval
+        self.data = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        time_now = time.time()
+
+        with self.lock:
+            if key not in self.data:
+                self.misses += 1
                 return None
-            res = self.data[base]
-            time_since_update = time_now - res['last_updated']
-            is_expired = self.max_time < time_since_update
-            if is_expired:
-                del self.data[base]
+            value, size, expire_at = self.data[key]
+            if expire_at is not None and expire_at <= time_now:
+                self._delete(key)
+                self.misses += 1
                 return None
-            return res['rates']
+            self.data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, size=None, expire_at=None):
+        """
+        Args:
+            param1 (obj): self
+            param2 (hashable): key
+            param3 (obj): value
+            param4 (int): size of value in bytes, len(value) if None
+            param5 (float): unix time when entry expires
+        """
+        if size is None:
+            size = len(value)
+        if expire_at is None and self.max_time is not None:
+            expire_at = time.time() + self.max_time
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+
+        with self.lock:
+            if key in self.data:
+                self._delete(key)
+            self.data[key] = (value, size, expire_at)
+            self.bytes += size
+
+            # Expired entries go first, before live ones are evicted
+            if time.time() >= self.next_sweep or self._over_limits():
+                self._sweep()
+            while self._over_limits():
+                self._delete(next(iter(self.data)))
+                self.evictions += 1
+
+    def _over_limits(self):
+        return (len(self.data) > self.max_entries or
+                (self.max_bytes is not None and self.bytes > self.max_bytes))
+
+    def delete(self, key, check=None):
+        """
+        Args:
+            param1 (obj): self
+            param2 (hashable): key
+            param3 (function): delete only if it returns True for value
+        """
+        with self.lock:
+            if key not in self.data:
+                return
+            if check is None or check(self.data[key][0]):
+                self._delete(key)
+
+    def _delete(self, key):
+        _, size, _ = self.data.pop(key)
+        self.bytes -= size
+
+    def sweep(self):
+        """
+        Returns:
+            (int): number of removed expired entries
+        """
+        with self.lock:
+            return self._sweep()
+
+    def _sweep(self):
+        time_now = time.time()
+        self.next_sweep = time_now + self.sweep_interval
+        expired = [key for key, (_, _, expire_at) in self.data.items()
+                   if expire_at is not None and expire_at <= time_now]
+        for key in expired:
+            self._delete(key)
+        return len(expired)
+
+    def stats(self):
+        """
+        Returns:
+            (dict): hits, misses, evictions, entries and bytes in use
+        """
+        with self.lock:
+            return {'hits': self.hits, 'misses': self.misses,
+                    'evictions': self.evictions, 'entries': len(self.data),
+                    'bytes': self.bytes}
+
+    def __len__(self):
+        return len(self.data)
+
+
+def next_daily_update(hour=16, now=None):
+    """
+    Args:
+        param1 (int): UTC hour when new daily rates are published
+        param2 (float): unix time to count from, current time if None
+
+    Returns:
+        (float): unix time of next daily rates update
+    """
+    if now is None:
+        now = time.time()
+    update = datetime.fromtimestamp(now, timezone.utc).replace(
+        hour=hour, minute=0, second=0, microsecond=0)
+    if update.timestamp() <= now:
+        update += timedelta(days=1)
+    return update.timestamp()
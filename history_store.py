@@ -0,0 +1,218 @@
+import sqlite3
+import threading
+import decimal
+from datetime import date, timedelta
+
+
+def date_chunks(start, end, days):
+    """
+    Args:
+        param1 (str): first date of range
+        param2 (str): last date of range
+        param3 (int): max days of chunk
+
+    Returns:
+        (generator): (start, end) date strings of consecutive chunks
+    """
+    chunk_start = date.fromisoformat(start)
+    last = date.fromisoformat(end)
+    while chunk_start <= last:
+        chunk_end = min(last, chunk_start + timedelta(days=days - 1))
+        yield chunk_start.isoformat(), chunk_end.isoformat()
+        chunk_start = chunk_end + timedelta(days=1)
+
+
+class HistoryStore:
+    """Append-only local store of daily rates backed by SQLite.
+
+    Rates are kept against a single base currency, one row per date and
+    currency, together with the date ranges that were already fetched so
+    days without rates (weekends, holidays) are not requested again.
+    """
+
+    SCHEMA = (
+        'CREATE TABLE IF NOT EXISTS rates ('
+        ' date TEXT NOT NULL,'
+        ' currency TEXT NOT NULL,'
+        ' rate TEXT NOT NULL,'
+        ' PRIMARY KEY (date, currency)) WITHOUT ROWID',
+        'CREATE TABLE IF NOT EXISTS coverage ('
+        ' start_at TEXT PRIMARY KEY,'
+        ' end_at TEXT NOT NULL)',
+    )
+
+    def __init__(self, path='history.sqlite3'):
+        """
+        Args:
+            param1 (obj): self
+            param2 (str): database file, ':memory:' to keep it in memory
+        """
+        self.lock = threading.Lock()
+        self.path = path
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        with self.lock, self.conn:
+            for statement in self.SCHEMA:
+                self.conn.execute(statement)
+
+    @staticmethod
+    def _to_date(value):
+        if isinstance(value, date):
+            return value
+        return date.fromisoformat(value)
+
+    def _coverage(self):
+        rows = self.conn.execute(
+            'SELECT start_at, end_at FROM coverage ORDER BY start_at')
+        return [(self._to_date(s), self._to_date(e)) for s, e in rows]
+
+    def missing(self, start, end):
+        """
+        Args:
+            param1 (obj): self
+            param2 (str): first date of range
+            param3 (str): last date of range
+
+        Returns:
+            (list): (start, end) date string pairs not fetched yet
+        """
+        start, end = self._to_date(start), self._to_date(end)
+        with self.lock:
+            coverage = self._coverage()
+
+        missing = []
+        cursor = start
+        for cov_start, cov_end in coverage:
+            if cov_end < cursor:
+                continue
+            if cov_start > end:
+                break
+            if cov_start > cursor:
+                missing.append((cursor, cov_start - timedelta(days=1)))
+            cursor = max(cursor, cov_end + timedelta(days=1))
+            if cursor > end:
+                break
+        if cursor <= end:
+            missing.append((cursor, end))
+
+        return [(s.isoformat(), e.isoformat()) for s, e in missing]
+
+    def save(self, rates, start=None, end=None):
+        """Store rates and mark range from start to end as fetched.
+
+        Args:
+            param1 (obj): self
+            param2 (dict): rates by date then by currency
+            param3 (str): first date of fetched range
+            param4 (str): last date of fetched range, range is not marked
+                as fetched if start or end is None
+        """
+        rows = [
+            (day, cur, str(rate))
+            for day, day_rates in rates.items()
+            for cur, rate in day_rates.items()
+        ]
+        with self.lock, self.conn:
+            self.conn.executemany(
+                'INSERT OR REPLACE INTO rates VALUES (?, ?, ?)', rows)
+            if start is None or end is None or start > end:
+                return
+            self._add_coverage(self._to_date(start), self._to_date(end))
+
+    def _add_coverage(self, start, end):
+        merged = []
+        for cov_start, cov_end in self._coverage():
+            if cov_end + timedelta(days=1) < start:
+                merged.append((cov_start, cov_end))
+            elif end + timedelta(days=1) < cov_start:
+                merged.append((cov_start, cov_end))
+            else:
+                start, end = min(start, cov_start), max(end, cov_end)
+        merged.append((start, end))
+
+        self.conn.execute('DELETE FROM coverage')
+        self.conn.executemany(
+            'INSERT INTO coverage VALUES (?, ?)',
+            [(s.isoformat(), e.isoformat()) for s, e in merged])
+
+    def rows(self, start, end, currencies=None):
+        """
+        Args:
+            param1 (obj): self
+            param2 (str): first date of range
+            param3 (str): last date of range
+            param4 (list): currencies to select, all if None
+
+        Returns:
+            (list): (date, currency, rate) tuples sorted by date, rates
+                are strings
+        """
+        query = 'SELECT date, currency, rate FROM rates WHERE date BETWEEN ? AND ?'
+        params = [start, end]
+        if currencies is not None:
+            currencies = list(currencies)
+            query += ' AND currency IN ({})'.format(
+                ','.join('?' * len(currencies)))
+            params += currencies
+        query += ' ORDER BY date'
+
+        with self.lock:
+            return self.conn.execute(query, params).fetchall()
+
+    def version(self, start, end, currencies=None):
+        """Cheap stamp of stored rates, changes when rows are added.
+
+        Args:
+            param1 (obj): self
+            param2 (str): first date of range
+            param3 (str): last date of range
+            param4 (list): currencies to count, all if None
+
+        Returns:
+            (tuple): number of rows and latest date in range
+        """
+        query = ('SELECT count(*), max(date) FROM rates '
+                 'WHERE date BETWEEN ? AND ?')
+        params = [start, end]
+        if currencies is not None:
+            currencies = list(currencies)
+            query += ' AND currency IN ({})'.format(
+                ','.join('?' * len(currencies)))
+            params += currencies
+
+        with self.lock:
+            return tuple(self.conn.execute(query, params).fetchone())
+
+    def rates(self, start, end, currencies=None):
+        """
+        Args:
+            param1 (obj): self
+            param2 (str): first date of range
+            param3 (str): last date of range
+            param4 (list): currencies to select, all if None
+
+        Returns:
+            (dict): rates by date then by currency
+        """
+        res = {}
+        for day, cur, rate in self.rows(start, end, currencies):
+            res.setdefault(day, {})[cur] = decimal.Decimal(rate)
+        return res
+
+    def latest_rates(self):
+        """
+        Args:
+            param1 (obj): self
+
+        Returns:
+            (str): latest stored date, None if store is empty
+            (dict): rates of latest date by currency
+        """
+        with self.lock:
+            row = self.conn.execute('SELECT max(date) FROM rates').fetchone()
+        if row[0] is None:
+            return None, {}
+        return row[0], self.rates(row[0], row[0]).get(row[0], {})
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
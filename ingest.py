@@ -0,0 +1,145 @@
+import asyncio
+import logging
+import time
+from datetime import date
+
+import pytz
+from apscheduler.schedulers.background import BackgroundScheduler
+
+from cache import next_daily_update
+from history_store import date_chunks
+
+
+logger = logging.getLogger(__name__)
+
+
+class HistoryIngester:
+    """Keep rolling window of daily rates in history store of API.
+
+    Days of window which are not stored yet are fetched once in chunks,
+    then a daily job run after new rates are published fetches only days
+    added since its last run. Once window is filled, API answers history
+    inside it from store without requests to upstream. API ``_fetch_history``
+    can be a function or a coroutine function if scheduler is
+    AsyncIOScheduler.
+
+    Example:
+        ingester = HistoryIngester(api, years=10)
+        ingester.start()
+    """
+
+    JOB_ID = 'ingest_history'
+    JOB_NOW_ID = 'ingest_history_now'
+
+    def __init__(self, api, scheduler=None, years=10, chunk_days=366,
+                 hour=16, minute=5):
+        """
+        Args:
+            param1 (obj): self
+            param2 (ExchangeRatesAPI): api whose history store is filled
+            param3 (BaseScheduler): scheduler, new BackgroundScheduler
+                if None
+            param4 (int): years of rates kept in window
+            param5 (int): max days fetched with one request
+            param6 (int): UTC hour of daily job, after rates are published
+            param7 (int): minute of daily job
+        """
+        self.api = api
+        if scheduler is None:
+            scheduler = BackgroundScheduler(timezone=pytz.utc)
+        self.scheduler = scheduler
+        self.years = years
+        self.chunk_days = chunk_days
+        self.hour = hour
+        self.minute = minute
+
+    def window(self, today=None):
+        """
+        Returns:
+            (str): first day of window
+            (str): last day of window, today
+        """
+        if today is None:
+            today = date.today()
+        try:
+            start = today.replace(year=today.year - self.years)
+        except ValueError:
+            # 29 February of leap year
+            start = today.replace(year=today.year - self.years, day=28)
+        return start.isoformat(), today.isoformat()
+
+    def _chunks(self, start, end):
+        """Missing ranges of store split into ranges of chunk_days."""
+        for miss_start, miss_end in self.api.history_store.missing(start, end):
+            yield from date_chunks(miss_start, miss_end, self.chunk_days)
+
+    def ingest(self):
+        """Fetch missing days of window.
+
+        Returns:
+            (dict): response with error if fetching failed, else None
+        """
+        start, end = self.window()
+        for chunk_start, chunk_end in self._chunks(start, end):
+            error = self.api.flights.do(
+                ('history', chunk_start, chunk_end),
+                self.api._fetch_history, chunk_start, chunk_end)
+            if error is not None:
+                return self._failed(error)
+        self._ingested(end)
+        return None
+
+    async def ingest_async(self):
+        start, end = self.window()
+        for chunk_start, chunk_end in self._chunks(start, end):
+            error = await self.api.flights.do(
+                ('history', chunk_start, chunk_end),
+                self.api._fetch_history, chunk_start, chunk_end)
+            if error is not None:
+                return self._failed(error)
+        self._ingested(end)
+        return None
+
+    def _ingested(self, end):
+        # Days after last one have no rates until next run fetches them
+        self.api.history_ingested = end
+        self.api.open_history = (end, self.next_run())
+
+    def next_run(self, now=None):
+        """
+        Args:
+            param1 (obj): self
+            param2 (float): unix time to count from, current time if None
+
+        Returns:
+            (float): unix time of next daily job
+        """
+        if now is None:
+            now = time.time()
+        offset = self.minute * 60
+        return next_daily_update(self.hour, now - offset) + offset
+
+    def _failed(self, error):
+        # Days which failed stay missing in store, so they are fetched
+        # on request
+        logger.warning('History ingestion failed: %s', error.get('error'))
+        return error
+
+    def start(self):
+        """Schedule daily job and fill window as soon as possible."""
+        job = self.ingest
+        if asyncio.iscoroutinefunction(self.api._fetch_history):
+            job = self.ingest_async
+
+        self.scheduler.add_job(
+            job, 'cron', hour=self.hour, minute=self.minute,
+            id=self.JOB_ID, replace_existing=True, coalesce=True,
+            misfire_grace_time=3600)
+        self.scheduler.add_job(
+            job, id=self.JOB_NOW_ID, replace_existing=True,
+            misfire_grace_time=None)
+        if not self.scheduler.running:
+            self.scheduler.start()
+
+    def shutdown(self):
+        self.scheduler.shutdown(wait=False)
@@ -0,0 +1,332 @@
+import asyncio
+import bisect
+import functools
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+# Seconds, from cache hits to slow upstream requests and charts
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{{{}}}'.format(','.join(
+        '{}="{}"'.format(name, str(value).replace('\\', '\\\\')
+                         .replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in pairs))
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Value which only goes up, one per combination of labels."""
+
+    TYPE = 'counter'
+
+    def __init__(self, name, help, labels=()):
+        """
+        Args:
+            param1 (obj): self
+            param2 (str): metric name
+            param3 (str): description
+            param4 (tuple): label names
+        """
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.lock = threading.Lock()
+        self.values = {}
+
+    def inc(self, *labels, amount=1):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def get(self, *labels):
+        with self.lock:
+            return self.values.get(labels, 0)
+
+    def samples(self):
+        with self.lock:
+            return [(self.name, labels, (), value)
+                    for labels, value in sorted(self.values.items())]
+
+
+class Histogram:
+    """Distribution of observed values in cumulative buckets."""
+
+    TYPE = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        """
+        Args:
+            param1 (obj): self
+            param2 (str): metric name
+            param3 (str): description
+            param4 (tuple): label names
+            param5 (tuple): sorted upper bounds of buckets
+        """
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self.lock = threading.Lock()
+        # Labels: (counts by bucket with last for +Inf, sum)
+        self.values = {}
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            counts, total = self.values.get(
+                labels, ([0] * (len(self.buckets) + 1), 0))
+            counts[index] += 1
+            self.values[labels] = (counts, total + value)
+
+    def time(self, *labels):
+        """Observe seconds spent in with block."""
+        return _Timer(self, labels)
+
+    def count(self, *labels):
+        with self.lock:
+            if labels not in self.values:
+                return 0
+            return sum(self.values[labels][0])
+
+    def samples(self):
+        res = []
+        with self.lock:
+            items = sorted(
+                (labels, (list(counts), total))
+                for labels, (counts, total) in self.values.items())
+        for labels, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                res.append((self.name + '_bucket', labels,
+                            (('le', _format_value(bound)),), cumulative))
+            res.append((self.name + '_sum', labels, (), total))
+            res.append((self.name + '_count', labels, (), cumulative))
+        return res
+
+
+class _Timer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, *self.labels)
+
+
+class Gauge:
+    """Values read from function when metrics are collected."""
+
+    TYPE = 'gauge'
+
+    def __init__(self, name, help, labels, read):
+        """
+        Args:
+            param1 (obj): self
+            param2 (str): metric name
+            param3 (str): description
+            param4 (tuple): label names
+            param5 (function): returns dict of values by labels tuple
+        """
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.read = read
+
+    def samples(self):
+        return [(self.name, labels, (), value)
+                for labels, value in sorted(self.read().items())]
+
+
+class Registry:
+    """Metrics of process rendered in Prometheus text format."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.metrics = {}
+
+    def _add(self, metric):
+        with self.lock:
+            # Metric asked for twice is shared
+            existing = self.metrics.get(metric.name)
+            if existing is not None and type(existing) is type(metric):
+                return existing
+            self.metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, help, labels=()):
+        return self._add(Counter(name, help, labels))
+
+    def histogram(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._add(Histogram(name, help, labels, buckets))
+
+    def gauge(self, name, help, labels, read):
+        """Register gauge, replacing one with same name."""
+        gauge = Gauge(name, help, labels, read)
+        with self.lock:
+            self.metrics[name] = gauge
+        return gauge
+
+    def render(self):
+        """
+        Returns:
+            (str): all metrics in Prometheus text exposition format
+        """
+        with self.lock:
+            metrics = list(self.metrics.values())
+
+        lines = []
+        for metric in metrics:
+            lines.append('# HELP {} {}'.format(metric.name, metric.help))
+            lines.append('# TYPE {} {}'.format(metric.name, metric.TYPE))
+            for name, labels, extra, value in metric.samples():
+                lines.append('{}{} {}'.format(
+                    name, _format_labels(metric.labels, labels, extra),
+                    _format_value(value)))
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+HANDLER_SECONDS = REGISTRY.histogram(
+    'exchange_bot_handler_seconds', 'Time to handle command', ['command'])
+UPSTREAM_SECONDS = REGISTRY.histogram(
+    'exchange_bot_upstream_seconds', 'Time of request to rates API',
+    ['endpoint'])
+UPSTREAM_ERRORS = REGISTRY.counter(
+    'exchange_bot_upstream_errors_total',
+    'Failed requests to rates API, retries included', ['endpoint'])
+RENDER_SECONDS = REGISTRY.histogram(
+    'exchange_bot_chart_render_seconds', 'Time to render chart')
+PLOTTER_LOCK_SECONDS = REGISTRY.histogram(
+    'exchange_bot_plotter_lock_wait_seconds',
+    'Time waiting for figure of in-process plotter')
+
+
+def timed(command, callback):
+    """Wrap command handler to observe its latency.
+
+    Args:
+        param1 (str): command name
+        param2 (function): handler, function or coroutine function
+
+    Returns:
+        (function): handler of same kind
+    """
+    if asyncio.iscoroutinefunction(callback):
+        @functools.wraps(callback)
+        async def run_async(*args, **kwargs):
+            with HANDLER_SECONDS.time(command):
+                return await callback(*args, **kwargs)
+        return run_async
+
+    @functools.wraps(callback)
+    def run(*args, **kwargs):
+        with HANDLER_SECONDS.time(command):
+            return callback(*args, **kwargs)
+    return run
+
+
+# Caches exported by register_cache, by label
+CACHES = {}
+
+
+def _cache_stats(field):
+    return lambda: {(name,): cache.stats()[field]
+                    for name, cache in list(CACHES.items())}
+
+
+def _cache_hit_ratio():
+    res = {}
+    for name, cache in list(CACHES.items()):
+        stats = cache.stats()
+        lookups = stats['hits'] + stats['misses']
+        res[(name,)] = stats['hits'] / lookups if lookups else 0.0
+    return res
+
+
+def register_cache(name, cache):
+    """Export stats of cache as gauges labelled with its name.
+
+    Args:
+        param1 (str): label of cache
+        param2 (obj): Cache or LRUCache
+    """
+    CACHES[name] = cache
+    for field in ['hits', 'misses', 'evictions', 'entries', 'bytes']:
+        REGISTRY.gauge('exchange_bot_cache_{}'.format(field),
+                       'Cache {} by cache'.format(field), ['cache'],
+                       _cache_stats(field))
+    REGISTRY.gauge('exchange_bot_cache_hit_ratio',
+                   'Part of cache lookups which found value', ['cache'],
+                   _cache_hit_ratio)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry = REGISTRY
+
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = self.registry.render().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class MetricsServer:
+    """Serve /metrics for Prometheus in daemon thread.
+
+    Example:
+        server = MetricsServer(port=9100)
+        server.start()
+    """
+
+    def __init__(self, registry=REGISTRY, listen='127.0.0.1', port=9100):
+        """
+        Args:
+            param1 (obj): self
+            param2 (Registry): metrics to serve
+            param3 (str): address to listen on
+            param4 (int): port to listen on, 0 for any free port
+        """
+        handler = type('MetricsHandler', (_MetricsHandler,),
+                       {'registry': registry})
+        self.server = ThreadingHTTPServer((listen, port), handler)
+        self.port = self.server.server_address[1]
+        self.thread = threading.Thread(
+            target=self.server.serve_forever, daemon=True)
+
+    def start(self):
+        """
+        Returns:
+            (int): port server listens on
+        """
+        self.thread.start()
+        return self.port
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
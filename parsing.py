@@ -0,0 +1,158 @@
+import decimal
+import re
+
+
+NUMBER = r'[-+]?(?:\d+(?:\.\d*)?|\.\d+)(?:[eE][-+]?\d+)?'
+CODE = r'[A-Za-z]{3}'
+# Larger amounts can't be converted and rounded in decimal context
+MAX_AMOUNT = decimal.Decimal('1e15')
+POSITIVE = r'(?:\d+(?:\.\d*)?|\.\d+)'
+
+
+class CommandParser:
+    """Parse command arguments with grammars compiled once.
+
+    Arguments are only checked against grammar and normalized: amounts
+    become Decimal and currency codes upper case, whether currencies are
+    supported is left to API, which checks it once per request.
+
+    Example:
+        parser = CommandParser({'$': 'USD', 'zł': 'PLN'})
+        parser.exchange(['10zł', 'to', 'eur'])  # (Decimal('10'), 'PLN', 'EUR')
+    """
+
+    def __init__(self, symbols, max_history_targets=5):
+        """
+        Args:
+            param1 (obj): self
+            param2 (dict): currency code by symbol, e.g. {'$': 'USD'}
+            param3 (int): max targets of history
+        """
+        # Symbols are matched ignoring case like codes are
+        self.symbols = {s.lower(): code for s, code in symbols.items()}
+        self.max_history_targets = max_history_targets
+
+        # Longer symbols first so prefix of one symbol can't shadow other
+        symbol = '|'.join(re.escape(s) for s in
+                          sorted(self.symbols, key=len, reverse=True))
+        amount = (
+            r'(?:(?P<pre>{symbol})\s*(?P<pre_amount>{number})'
+            r'|(?P<amount>{number})\s*(?:(?P<post>{symbol})|\s(?P<code>{code})))'
+        ).format(symbol=symbol, number=NUMBER, code=CODE)
+        self.exchange_grammar = re.compile(
+            amount + r'\s+to\s+(?P<to>{code})'.format(code=CODE),
+            re.IGNORECASE)
+        # Inline queries are typed without command, so 'to' and target
+        # can be left out
+        self.inline_grammar = re.compile(
+            amount + r'(?:\s+(?:to\s+)?(?P<to>{code}))?'.format(code=CODE),
+            re.IGNORECASE)
+        self.history_grammar = re.compile(
+            r'(?P<base>{code})/(?P<targets>{code}(?:,{code})*)'
+            r'\s+for\s+(?P<days>\d+)\s+days'.format(code=CODE),
+            re.IGNORECASE | re.ASCII)
+        self.alert_grammar = re.compile(
+            r'(?P<base>{code})/(?P<target>{code})\s+(?P<threshold>{number})'
+            .format(code=CODE, number=POSITIVE),
+            re.IGNORECASE | re.ASCII)
+
+    def exchange(self, args):
+        """
+        Args:
+            param1 (obj): self
+            param2 (list): words of command, e.g. ['10$', 'to', 'EUR']
+
+        Returns:
+            (decimal.Decimal): amount
+            (str): from what currency
+            (str): to what currency, all None if args don't match grammar
+                or amount is larger than MAX_AMOUNT
+        """
+        match = self.exchange_grammar.fullmatch(' '.join(args))
+        if match is None:
+            return None, None, None
+
+        amount, cur_from = self._amount(match)
+        if amount is None:
+            return None, None, None
+        return amount, cur_from, match['to'].upper()
+
+    def inline(self, args):
+        """
+        Args:
+            param1 (obj): self
+            param2 (list): words of inline query, e.g. ['10$', 'eur']
+
+        Returns:
+            (decimal.Decimal): amount
+            (str): from what currency
+            (str): to what currency, None if not given, all None if args
+                don't match grammar or amount is larger than MAX_AMOUNT
+        """
+        match = self.inline_grammar.fullmatch(' '.join(args))
+        if match is None:
+            return None, None, None
+
+        amount, cur_from = self._amount(match)
+        if amount is None:
+            return None, None, None
+        cur_to = match['to'].upper() if match['to'] is not None else None
+        return amount, cur_from, cur_to
+
+    def _amount(self, match):
+        if match['pre'] is not None:
+            amount = match['pre_amount']
+            cur_from = self.symbols[match['pre'].lower()]
+        elif match['post'] is not None:
+            amount = match['amount']
+            cur_from = self.symbols[match['post'].lower()]
+        else:
+            amount, cur_from = match['amount'], match['code'].upper()
+
+        amount = decimal.Decimal(amount)
+        if abs(amount) > MAX_AMOUNT:
+            return None, None
+        return amount, cur_from
+
+    def history(self, args):
+        """
+        Args:
+            param1 (obj): self
+            param2 (list): words of command, e.g. ['USD/EUR', 'for', '7', 'days']
+
+        Returns:
+            (str): base currency
+            (list): target currencies
+            (int): number of days, all None if args don't match grammar
+                or there are too many targets
+        """
+        match = self.history_grammar.fullmatch(' '.join(args))
+        if match is None:
+            return None, None, None
+
+        targets = match['targets'].upper().split(',')
+        if len(targets) > self.max_history_targets:
+            return None, None, None
+        return match['base'].upper(), targets, int(match['days'])
+
+    def alert(self, args):
+        """
+        Args:
+            param1 (obj): self
+            param2 (list): words of command, e.g. ['USD/EUR', '0.95']
+
+        Returns:
+            (str): from what currency
+            (str): to what currency
+            (decimal.Decimal): rate to notify at, all None if args don't
+                match grammar, currencies are the same or rate is zero
+        """
+        match = self.alert_grammar.fullmatch(' '.join(args))
+        if match is None:
+            return None, None, None
+
+        cur_from, cur_to = match['base'].upper(), match['target'].upper()
+        threshold = decimal.Decimal(match['threshold'])
+        if cur_from == cur_to or not threshold:
+            return None, None, None
+        return cur_from, cur_to, threshold
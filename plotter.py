@@ -1,46 +1,194 @@
 import threading
 import io
+from concurrent.futures import ProcessPoolExecutor
 
-import matplotlib
+from cache import LRUCache, next_daily_update
+from metrics import PLOTTER_LOCK_SECONDS, RENDER_SECONDS
 
-matplotlib.use('Agg')
 
-import matplotlib.pyplot as plt
-import matplotlib.dates as mdates
+class PlotterBusy(Exception):
+    """Raised when render queue of Plotter is full."""
 
 
-class Plotter:
-    def __init__(self, max_time=10):
-        self.lock = threading.Lock()
-    
-    def _plot_by_dates(self, x, y, title):
-        fig, ax = plt.subplots()
+def _new_figure():
+    # matplotlib takes long to import, so it is loaded with first chart
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    fig = Figure()
+    FigureCanvasAgg(fig)
+    return fig
+
+
+def _plot_by_dates(fig, series, title):
+    """Draw chart on reusable figure and return it as PNG.
+
+    Args:
+        param1 (matplotlib.figure.Figure): figure with Agg canvas
+        param2 (list): (label, x, y) of every series, each one is drawn
+            on its own axes one under another
+        param3 (str): title of graph
+
+    Returns:
+        (bytes): image
+    """
+    import matplotlib.dates as mdates
+
+    fig.clear()
+    axes = fig.subplots(len(series), 1, sharex=True, squeeze=False)[:, 0]
+    for ax, (label, x, y) in zip(axes, series):
         ax.plot(x, y, 'k')
-        ax.xaxis.set_major_formatter(mdates.DateFormatter('%Y-%m-%d'))
         ax.grid()
-        ax.set(title=title)
-        fig.autofmt_xdate()
+        if label is not None:
+            ax.set_ylabel(label)
+    axes[-1].xaxis.set_major_formatter(mdates.DateFormatter('%Y-%m-%d'))
+    axes[0].set(title=title)
+    fig.autofmt_xdate()
+
+    with io.BytesIO() as buf:
+        fig.savefig(buf)
+        return buf.getvalue()
+
+
+# Figure of worker process, created once by _init_worker
+_worker_figure = None
 
-        return plt
 
-    def plot_rates(self, x, y, rates_label):
+def _init_worker():
+    global _worker_figure
+    _worker_figure = _new_figure()
+    # Warm up fonts and date converters before first real chart
+    _plot_by_dates(_worker_figure, [(None, [0, 1], [0, 1])], '')
+
+
+def _plot_in_worker(series, title):
+    return _plot_by_dates(_worker_figure, series, title)
+
+
+class Plotter:
+    def __init__(self, max_time=10, max_charts=256, max_bytes=32 * 2**20,
+                 workers=0, max_pending=None, max_points=500):
         """
         Args:
             param1 (obj): self
-            param2 (str): x axis values
-            param3 (str): y axis values
-            param4 (int): title of graph
+            param2 (int): unused
+            param3 (int): max number of cached charts
+            param4 (int): max total size of cached charts in bytes
+            param5 (int): number of render processes, 0 to render in
+                current process
+            param6 (int): max charts queued or rendering in processes,
+                4 per process if None
+            param7 (int): max points drawn per series, longer series are
+                downsampled, about width of chart in pixels
+        """
+        self.lock = threading.Lock()
+        self.charts = LRUCache(max_entries=max_charts, max_bytes=max_bytes)
+        self.max_points = max_points
+
+        self.pool = None
+        if workers > 0:
+            if max_pending is None:
+                max_pending = workers * 4
+            self.pending = threading.BoundedSemaphore(max_pending)
+            self.pool = ProcessPoolExecutor(
+                max_workers=workers, initializer=_init_worker)
+        self.figure = None
+
+    def _series(self, x, y):
+        """
+        Returns:
+            (list): (label, x, y) arrays of every series, downsampled
+        """
+        # NumPy is loaded with first chart like matplotlib
+        from series import to_array, lttb
+
+        x = to_array(x)
+        labelled = y.items() if isinstance(y, dict) else [(None, y)]
+        return [(label,) + lttb(x, to_array(values), self.max_points)
+                for label, values in labelled]
+
+    def _render(self, series, title):
+        with RENDER_SECONDS.time():
+            return self._render_figure(series, title)
+
+    def _render_figure(self, series, title):
+        if self.pool is None:
+            with PLOTTER_LOCK_SECONDS.time():
+                self.lock.acquire()
+            try:
+                if self.figure is None:
+                    self.figure = _new_figure()
+                return _plot_by_dates(self.figure, series, title)
+            finally:
+                self.lock.release()
+
+        if not self.pending.acquire(blocking=False):
+            raise PlotterBusy('Too many charts are rendering')
+        try:
+            future = self.pool.submit(_plot_in_worker, series, title)
+        except Exception:
+            self.pending.release()
+            raise
+        future.add_done_callback(lambda f: self.pending.release())
+        return future.result()
+
+    def plot_rates(self, x, y, rates_label, key=None):
+        """
+        Args:
+            param1 (obj): self
+            param2 (numpy.ndarray): x axis dates, any sequence of dates
+                or numbers works too
+            param3 (numpy.ndarray): y axis values, or dict of them by
+                label to plot several series
+            param4 (str): title of graph
+            param5 (tuple): cache key which identifies data of chart, see
+                plot_cached, chart is not cached if None
 
         Returns:
             (bytes): image
+
+        Raises:
+            PlotterBusy: render queue is full
         """
-        with self.lock:
-            plot = self._plot_by_dates(x, y, rates_label)
+        if key is not None:
+            return self.plot_cached(key, lambda: (x, y, rates_label))
+        return self._render(self._series(x, y), rates_label)
 
-            with io.BytesIO() as buf:
-                plot.savefig(buf)
-                plot.close()
+    def cached(self, key):
+        """
+        Returns:
+            (bytes): chart cached under key, None if missing
+        """
+        return self.charts.get(key)
+
+    def plot_cached(self, key, build):
+        """Plot chart cached under key, series are built only on miss.
+
+        Args:
+            param1 (obj): self
+            param2 (tuple): cache key which identifies data of chart, e.g.
+                pair, date range and version of stored rates
+            param3 (function): returns (x, y, title) arguments of
+                plot_rates, None if there is nothing to plot
+
+        Returns:
+            (bytes): image, None if there is nothing to plot
+
+        Raises:
+            PlotterBusy: render queue is full
+        """
+        image = self.cached(key)
+        if image is not None:
+            return image
 
-                buf.seek(0)
-                return buf.getvalue()
+        args = build()
+        if args is None:
+            return None
+        x, y, rates_label = args
+        image = self._render(self._series(x, y), rates_label)
+        self.charts.set(key, image, expire_at=next_daily_update())
+        return image
 
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
@@ -0,0 +1,58 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class RateLimiter:
+    """Token bucket per key, e.g. per chat.
+
+    Every key has a bucket of burst tokens refilled at rate tokens per
+    second, a call costing more than the bucket holds is refused. Only
+    max_keys recently used buckets are kept, forgotten keys start again
+    with a full bucket, which they would have refilled by then anyway.
+
+    Example:
+        limiter = RateLimiter(rate=0.5, burst=20)
+        if limiter.allow(chat_id, cost=5):
+            ...
+    """
+
+    def __init__(self, rate=0.5, burst=20, max_keys=10000):
+        """
+        Args:
+            param1 (obj): self
+            param2 (float): tokens added to bucket per second
+            param3 (float): max tokens in bucket
+            param4 (int): max number of kept buckets
+        """
+        self.lock = threading.Lock()
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        # Key: (tokens, monotonic time of last update)
+        self.buckets = OrderedDict()
+
+    def allow(self, key, cost=1):
+        """
+        Args:
+            param1 (obj): self
+            param2 (hashable): key of bucket
+            param3 (float): tokens taken if call is allowed, at most burst
+
+        Returns:
+            (bool): True if call is allowed
+        """
+        cost = min(cost, self.burst)
+        time_now = time.monotonic()
+
+        with self.lock:
+            tokens, updated = self.buckets.pop(key, (self.burst, time_now))
+            tokens = min(self.burst, tokens + (time_now - updated) * self.rate)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            self.buckets[key] = (tokens, time_now)
+
+            while len(self.buckets) > self.max_keys:
+                self.buckets.popitem(last=False)
+        return allowed
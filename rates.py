@@ -0,0 +1,131 @@
+import decimal
+import json
+from types import MappingProxyType
+
+
+class RateMatrix:
+    """Cross rates for every currency pair derived from one snapshot.
+
+    Upstream publishes the same daily table for every base, so a single
+    ``latest`` response is enough to answer any base/target pair as
+    ``rate(to) / rate(from)``. Tables of a base are computed once, on first
+    use, and are shared read-only by all callers.
+    """
+
+    DISPLAY_PLACES = 2
+
+    def __init__(self, snapshot):
+        """
+        Args:
+            param1 (obj): self
+            param2 (dict): ``latest`` response with 'base', 'date', 'rates'
+        """
+        self.base = snapshot['base']
+        self.date = snapshot.get('date')
+
+        rates = {}
+        for cur, rate in snapshot['rates'].items():
+            rates[cur] = self._to_decimal(rate)
+        rates.setdefault(self.base, decimal.Decimal(1))
+
+        self._rates = rates
+        self.currencies = list(rates)
+        self._tables = {}
+        self._responses = {}
+
+    @staticmethod
+    def _to_decimal(value):
+        if isinstance(value, decimal.Decimal):
+            return value
+        return decimal.Decimal(str(value))
+
+    def __contains__(self, currency):
+        return currency in self._rates
+
+    def rate(self, cur_from, cur_to):
+        """
+        Args:
+            param1 (obj): self
+            param2 (str): from what currency you convert
+            param3 (str): for what currency you convert
+
+        Returns:
+            (decimal.Decimal): cross rate of one cur_from in cur_to
+        """
+        if cur_from == cur_to:
+            return decimal.Decimal(1)
+        return self._rates[cur_to] / self._rates[cur_from]
+
+    def rates(self, base):
+        """
+        Args:
+            param1 (obj): self
+            param2 (str): base currency
+
+        Returns:
+            (MappingProxyType): full precision rates of every currency
+                against base
+        """
+        table = self._tables.get(base)
+        if table is None:
+            table = MappingProxyType(
+                {cur: self.rate(base, cur) for cur in self.currencies})
+            self._tables[base] = table
+        return table
+
+    def response(self, base):
+        """
+        Args:
+            param1 (obj): self
+            param2 (str): base currency
+
+        Returns:
+            (MappingProxyType): same shape as upstream ``latest`` response
+                for base with rates rounded for display
+        """
+        response = self._responses.get(base)
+        if response is None:
+            display = {cur: round(rate, self.DISPLAY_PLACES)
+                       for cur, rate in self.rates(base).items()}
+            response = MappingProxyType({
+                'base': base,
+                'date': self.date,
+                'rates': MappingProxyType(display),
+            })
+            self._responses[base] = response
+        return response
+
+    def build(self):
+        """Compute tables and responses of every base at once.
+
+        Returns:
+            (RateMatrix): self
+        """
+        for base in self.currencies:
+            self.response(base)
+        return self
+
+    def to_bytes(self):
+        """
+        Returns:
+            (bytes): compact snapshot to restore matrix with from_bytes
+        """
+        snapshot = {
+            'base': self.base,
+            'date': self.date,
+            'rates': {cur: str(rate) for cur, rate in self._rates.items()
+                      if cur != self.base},
+        }
+        return json.dumps(snapshot, separators=(',', ':')).encode()
+
+    @classmethod
+    def from_bytes(cls, data):
+        """
+        Args:
+            param1 (cls): RateMatrix
+            param2 (bytes): snapshot made by to_bytes
+
+        Returns:
+            (RateMatrix): matrix with exactly the same rates
+        """
+        return cls(json.loads(data))
@@ -0,0 +1,48 @@
+import pytz
+from apscheduler.schedulers.background import BackgroundScheduler
+
+
+class RatesRefresher:
+    """Refresh rates snapshot of API in background with APScheduler.
+
+    Snapshot is refreshed on interval before it becomes stale and at once
+    when API serves a stale snapshot, so users never wait for upstream.
+    Interval refresh is skipped if other process sharing the cache has
+    just refreshed the snapshot.
+    API method ``refresh`` can be a function or a coroutine function if
+    scheduler is AsyncIOScheduler.
+    """
+
+    JOB_ID = 'refresh_rates'
+    JOB_NOW_ID = 'refresh_rates_now'
+
+    def __init__(self, api, scheduler=None, ahead=0.1):
+        """
+        Args:
+            param1 (obj): self
+            param2 (ExchangeRatesAPI): api to refresh
+            param3 (BaseScheduler): scheduler, new BackgroundScheduler
+                if None
+            param4 (float): part of cache time to refresh ahead of it
+        """
+        self.api = api
+        if scheduler is None:
+            scheduler = BackgroundScheduler(timezone=pytz.utc)
+        self.scheduler = scheduler
+        self.interval = max(1, api.cache.max_time * (1 - ahead))
+
+    def start(self):
+        self.scheduler.add_job(
+            self.api.refresh, 'interval', seconds=self.interval,
+            kwargs={'max_age': self.interval / 2}, id=self.JOB_ID,
+            replace_existing=True, coalesce=True)
+        self.scheduler.start()
+
+    def refresh_soon(self):
+        """Refresh snapshot once as soon as scheduler is free."""
+        self.scheduler.add_job(
+            self.api.refresh, id=self.JOB_NOW_ID, replace_existing=True,
+            misfire_grace_time=None)
+
+    def shutdown(self):
+        self.scheduler.shutdown(wait=False)
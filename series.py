@@ -0,0 +1,104 @@
+import numpy as np
+
+
+def to_array(values):
+    """
+    Args:
+        param1 (iterable): numbers, dates or datetimes
+
+    Returns:
+        (numpy.ndarray): float64 or datetime64 array
+    """
+    values = np.asarray(values)
+    if values.dtype == object:
+        # datetime objects are not recognized by asarray
+        return values.astype('datetime64[us]')
+    if np.issubdtype(values.dtype, np.datetime64):
+        return values
+    return values.astype(np.float64)
+
+
+def _as_float(values):
+    if np.issubdtype(values.dtype, np.datetime64):
+        return values.astype('datetime64[us]').astype(np.int64).astype(np.float64)
+    return values
+
+
+def history_arrays(rows, base, targets, snapshot_base='EUR'):
+    """Turn stored rates of snapshot base into cross rates of base.
+
+    Days without rate of base or of any target are dropped.
+
+    Args:
+        param1 (list): (date, currency, rate) rows sorted by date, rates
+            against snapshot base as strings
+        param2 (str): base currency
+        param3 (list): target currencies
+        param4 (str): base currency of stored rates
+
+    Returns:
+        (numpy.ndarray): datetime64[D] dates
+        (dict): float64 array of rates by target
+    """
+    currencies = list(dict.fromkeys([base] + targets))
+    index = {cur: i for i, cur in enumerate(currencies)}
+    rows = [row for row in rows if row[1] in index]
+
+    if rows:
+        days, curs, rates = zip(*rows)
+    else:
+        days, curs, rates = (), (), ()
+    dates, day_index = np.unique(
+        np.array(days, dtype='datetime64[D]'), return_inverse=True)
+
+    table = np.full((len(dates), len(currencies)), np.nan)
+    table[day_index, [index[cur] for cur in curs]] = np.array(
+        rates, dtype=str).astype(np.float64)
+    if snapshot_base in index:
+        table[:, index[snapshot_base]] = 1
+
+    table = table / table[:, [index[base]]]
+    keep = ~np.isnan(table).any(axis=1)
+    return dates[keep], {cur: table[keep, index[cur]] for cur in targets}
+
+
+def lttb(x, y, threshold):
+    """Downsample series keeping its visual shape.
+
+    Largest-Triangle-Three-Buckets: first and last points are kept and
+    from every bucket between them the point making largest triangle
+    with previously chosen point and average of next bucket.
+
+    Args:
+        param1 (numpy.ndarray): x values, sorted
+        param2 (numpy.ndarray): y values
+        param3 (int): max number of points
+
+    Returns:
+        (numpy.ndarray): x values of chosen points
+        (numpy.ndarray): y values of chosen points
+    """
+    n = len(y)
+    if threshold >= n or threshold < 3:
+        return x, y
+
+    xs, ys = _as_float(x), y
+    every = (n - 2) / (threshold - 2)
+    edges = np.append(
+        (np.arange(threshold - 1) * every).astype(np.int64) + 1, n)
+
+    chosen = np.empty(threshold, dtype=np.int64)
+    chosen[0], chosen[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        avg_x = xs[end:edges[i + 2]].mean()
+        avg_y = ys[end:edges[i + 2]].mean()
+
+        area = np.abs(
+            (xs[a] - avg_x) * (ys[start:end] - ys[a])
+            - (xs[a] - xs[start:end]) * (avg_y - ys[a]))
+        a = start + int(area.argmax())
+        chosen[i + 1] = a
+
+    return x[chosen], y[chosen]
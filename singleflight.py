@@ -0,0 +1,92 @@
+import asyncio
+import threading
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Run only one call per key at a time, others wait for its result.
+
+    Example:
+        flights = SingleFlight()
+        data = flights.do(('latest', 'EUR'), fetch, 'EUR')
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = {}
+
+    def do(self, key, fn, *args):
+        """
+        Args:
+            param1 (obj): self
+            param2 (hashable): key of call
+            param3 (callable): function to call if no call for key is
+                in flight
+            param4 (*args): arguments of function
+
+        Returns:
+            (obj): result of function, shared by all waiting callers
+        """
+        with self.lock:
+            call = self.calls.get(key)
+            is_leader = call is None
+            if is_leader:
+                call = _Call()
+                self.calls[key] = call
+
+        if not is_leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args)
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call.done.set()
+        return call.result
+
+    def in_flight(self):
+        with self.lock:
+            return len(self.calls)
+
+
+class AsyncSingleFlight:
+    """SingleFlight for coroutines running on one event loop."""
+
+    def __init__(self):
+        self.calls = {}
+
+    async def do(self, key, fn, *args):
+        """
+        Args:
+            param1 (obj): self
+            param2 (hashable): key of call
+            param3 (callable): coroutine function to call if no call for
+                key is in flight
+            param4 (*args): arguments of function
+
+        Returns:
+            (obj): result of function, shared by all waiting callers
+        """
+        task = self.calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn(*args))
+            self.calls[key] = task
+            task.add_done_callback(lambda _: self.calls.pop(key, None))
+        # One cancelled caller must not cancel the call of others
+        return await asyncio.shield(task)
+
+    def in_flight(self):
+        return len(self.calls)
@@ -0,0 +1,202 @@
+import unittest
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from decimal import Decimal
+
+from alerts import Alert, AlertIndex, AlertService, AlertStore, Notifier
+from rates import RateMatrix
+
+
+def matrix(usd, gbp='0.86'):
+    return RateMatrix({'base': 'EUR', 'date': '2021-03-05',
+                       'rates': {'USD': usd, 'GBP': gbp}})
+
+
+class TestAlertIndex(unittest.TestCase):
+    def setUp(self):
+        self.index = AlertIndex()
+        for alert in [
+                Alert(1, 10, 'EUR', 'USD', Decimal('1.2'), True),
+                Alert(2, 10, 'EUR', 'USD', Decimal('1.3'), True),
+                Alert(3, 11, 'EUR', 'USD', Decimal('1.1'), False),
+                Alert(4, 11, 'EUR', 'USD', Decimal('1.2'), True),
+                Alert(5, 11, 'EUR', 'GBP', Decimal('0.9'), True)]:
+            self.index.add(alert)
+
+    def fire(self, rates):
+        fired = self.index.fire(lambda f, t: rates.get((f, t)))
+        return sorted(alert.id for alert, _ in fired)
+
+    def test_fire(self):
+        self.assertEqual(self.fire({('EUR', 'USD'): Decimal('1.15')}), [])
+        self.assertEqual(self.fire({('EUR', 'USD'): Decimal('1.2')}), [1, 4])
+        # Fired alerts fire only once
+        self.assertEqual(self.fire({('EUR', 'USD'): Decimal('1.25')}), [])
+        self.assertEqual(self.fire({('EUR', 'USD'): Decimal('1.0')}), [3])
+        self.assertEqual(len(self.index), 2)
+        self.assertEqual(self.fire({('EUR', 'USD'): Decimal('2'),
+                                    ('EUR', 'GBP'): Decimal('1')}), [2, 5])
+        self.assertEqual(self.index.pairs, {})
+        self.assertEqual(self.index.chats, {})
+
+    def test_remove(self):
+        self.assertEqual(self.index.remove(4).id, 4)
+        self.assertIsNone(self.index.remove(4))
+        self.assertEqual([a.id for a in self.index.chat_alerts(11)], [3, 5])
+        self.assertEqual(self.fire({('EUR', 'USD'): Decimal('1.2')}), [1])
+
+    def test_many(self):
+        index = AlertIndex()
+        for i in range(100000):
+            index.add(Alert(i, i, 'EUR', 'USD',
+                            Decimal(random.randint(1, 10000)) / 1000,
+                            bool(i % 2)))
+
+        started = time.perf_counter()
+        fired = index.fire(lambda f, t: Decimal('5'))
+        self.assertLess(time.perf_counter() - started, 1)
+        self.assertEqual(len(fired) + len(index), 100000)
+        self.assertTrue(all(a.threshold <= 5 for a, _ in fired if a.above))
+        self.assertTrue(all(a.threshold > 5 for a in index.alerts.values()
+                            if a.above))
+
+
+class TestAlertService(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'alerts.sqlite3')
+        self.service = AlertService(self.path, max_per_chat=2)
+        self.sent = []
+        self.service.start(lambda chat_id, text: self.sent.append(
+            (chat_id, text)))
+
+    def tearDown(self):
+        self.service.close()
+        self.tmp.cleanup()
+
+    def test_check(self):
+        alert = self.service.subscribe(
+            1, 'EUR', 'USD', Decimal('1.2'), Decimal('1.19'))
+        self.assertTrue(alert.above)
+        self.service.subscribe(1, 'EUR', 'GBP', Decimal('0.8'), Decimal('0.86'))
+        self.assertIsNone(self.service.subscribe(
+            1, 'EUR', 'USD', Decimal('1.3'), Decimal('1.19')))
+
+        self.assertEqual(self.service._check(matrix('1.19')), [])
+        fired = self.service._check(matrix('1.21', '0.79'))
+        self.assertEqual(len(fired), 2)
+        self.service.notifier.queue.join()
+        # One message per chat
+        self.assertEqual(len(self.sent), 1)
+        self.assertEqual(self.sent[0], (1, 'Alert 1: EUR/USD is 1.2100, crossed 1.2\n'
+                                           'Alert 2: EUR/GBP is 0.7900, crossed 0.8'))
+        self.assertEqual(self.service.chat_alerts(1), [])
+
+    def test_persisted(self):
+        alert = self.service.subscribe(
+            1, 'EUR', 'USD', Decimal('1.2'), Decimal('1.19'))
+        self.service.subscribe(2, 'EUR', 'USD', Decimal('1.1'), Decimal('1.19'))
+        self.assertFalse(self.service.unsubscribe(2, alert.id))
+        self.assertTrue(self.service.unsubscribe(1, alert.id))
+
+        service = AlertService(self.path)
+        self.assertEqual(len(service.index), 1)
+        self.assertEqual(service.chat_alerts(2)[0].threshold, Decimal('1.1'))
+        service.close()
+
+    def test_not_started(self):
+        service = AlertService(':memory:')
+        service.subscribe(1, 'EUR', 'USD', Decimal('1.2'), Decimal('1.19'))
+        service.check(matrix('1.3'))
+        self.assertEqual(len(service.chat_alerts(1)), 1)
+        service.close()
+
+    def test_checked_in_thread(self):
+        self.service.subscribe(1, 'EUR', 'USD', Decimal('1.2'), Decimal('1.19'))
+        self.service.check(matrix('1.21'))
+        for _ in range(100):
+            if self.sent:
+                break
+            time.sleep(0.01)
+        self.assertEqual(self.sent, [(1, 'Alert 1: EUR/USD is 1.2100, '
+                                         'crossed 1.2')])
+
+    def test_claim_failed(self):
+        self.service.subscribe(1, 'EUR', 'USD', Decimal('1.2'), Decimal('1.19'))
+        claim = self.service.store.claim
+
+        def locked(alert_ids):
+            raise sqlite3.OperationalError('database is locked')
+        self.service.store.claim = locked
+        with self.assertRaises(sqlite3.OperationalError):
+            self.service._check(matrix('1.21'))
+
+        # Not lost, fired with next snapshot
+        self.service.store.claim = claim
+        self.assertEqual(len(self.service._check(matrix('1.21'))), 1)
+
+    def test_shared(self):
+        other = AlertService(self.path, max_per_chat=2)
+        other_sent = []
+        other.start(lambda chat_id, text: other_sent.append((chat_id, text)))
+        self.addCleanup(other.close)
+
+        alert = self.service.subscribe(
+            1, 'EUR', 'USD', Decimal('1.2'), Decimal('1.19'))
+        self.assertEqual(other.chat_alerts(1), [alert])
+        other.subscribe(1, 'EUR', 'GBP', Decimal('0.8'), Decimal('0.86'))
+        # Limit counts alerts created by both
+        self.assertIsNone(self.service.subscribe(
+            1, 'EUR', 'USD', Decimal('1.3'), Decimal('1.19')))
+
+        # Both fire, only one notifies
+        fired = (self.service._check(matrix('1.21', '0.79')) +
+                 other._check(matrix('1.21', '0.79')))
+        self.assertEqual(sorted(alert.id for alert, _ in fired), [1, 2])
+        self.service.notifier.queue.join()
+        other.notifier.queue.join()
+        self.assertEqual(len(self.sent) + len(other_sent), 1)
+
+        alert = other.subscribe(1, 'EUR', 'USD', Decimal('1.3'), Decimal('1.2'))
+        self.assertTrue(self.service.unsubscribe(1, alert.id))
+        self.assertEqual(other._check(matrix('1.4')), [])
+        self.assertEqual(other.chat_alerts(1), [])
+
+
+class TestNotifier(unittest.TestCase):
+    def test_rate(self):
+        sent = []
+        notifier = Notifier(lambda chat_id, text: sent.append(time.monotonic()),
+                            rate=50)
+        notifier.start()
+        for i in range(100):
+            notifier.submit(i, 'text')
+        notifier.queue.join()
+        notifier.stop()
+        self.assertEqual(len(sent), 100)
+        # First 50 go at once, the rest at 50 per second
+        self.assertGreater(sent[-1] - sent[0], 0.8)
+
+    def test_full(self):
+        notifier = Notifier(lambda chat_id, text: None, max_size=1)
+        self.assertTrue(notifier.submit(1, 'text'))
+        self.assertFalse(notifier.submit(1, 'text'))
+        self.assertEqual(notifier.dropped, 1)
+
+
+class TestAlertStore(unittest.TestCase):
+    def test_ids_not_reused(self):
+        store = AlertStore(':memory:')
+        alert = store.add(1, 'EUR', 'USD', Decimal('1.2'), True, 20)
+        self.assertEqual(store.claim([alert.id]), {alert.id})
+        self.assertEqual(store.claim([alert.id]), set())
+        self.assertGreater(
+            store.add(1, 'EUR', 'USD', Decimal('1.2'), True, 20).id, alert.id)
+        store.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,8 +1,13 @@
 import unittest
-from datetime import datetime
+import time
+from collections.abc import Mapping
+from datetime import datetime, timedelta
 import decimal
 
-from api import ExchangeRatesAPI
+from api import ExchangeRatesAPI, HistoryUnavailable
+from cache import next_daily_update
+from metrics import UPSTREAM_ERRORS
+from benchmarks.fake_upstream import FakeUpstream
 
 
 class TestAPI(unittest.TestCase):
@@ -42,8 +47,9 @@ class TestAPI(unittest.TestCase):
         self.assertNotEqual(one_target, '')
 
         multi_targets = self.api._validate_targets(targets=targets)
-        self.assertIsInstance(one_target, str)
-        self.assertNotEqual(one_target, '')
+        self.assertEqual(multi_targets, 'EUR,CAD')
+        self.assertIsNone(self.api._validate_targets(targets=['EUR', 'XXX']))
+        self.assertIsNone(self.api._validate_targets(target='XXX'))
         
         self.assertIsNone(self.api._validate_targets())
     
@@ -64,12 +70,12 @@ class TestAPI(unittest.TestCase):
     def test_latest(self):
         # Based on base currency
         latest1 = self.api.latest()
-        self.assertIsInstance(latest1, dict)
+        self.assertIsInstance(latest1, Mapping)
         self.assertNotIn('error', latest1)
 
         # Based on custom base currency
         latest2 = self.api.latest('EUR')
-        self.assertIsInstance(latest2, dict)
+        self.assertIsInstance(latest2, Mapping)
         self.assertNotIn('error', latest2)
 
         # None existing custom base currency
@@ -112,8 +118,8 @@ class TestAPI(unittest.TestCase):
         base = 'USD'
         target = 'EUR'
         money = '10'
-        rate = self.api.latest(base=base)['rates'][target]
-        expect = decimal.Decimal(money) * rate
+        rate = self.api._snapshot().rate(base, target)
+        expect = round(decimal.Decimal(money) * rate, 2)
         expect = str(expect) + ' ' + target
 
         self.assertEqual(self.api.exchange('10', base, target), expect)
@@ -122,5 +128,198 @@ class TestAPI(unittest.TestCase):
         self.assertIsNone(self.api.exchange('10', base, 'XXX'))
         self.assertIsNone(self.api.exchange('A', base, target))
 
+
+class TestLazyStart(unittest.TestCase):
+    def setUp(self):
+        self.upstream = FakeUpstream(latency=0.2)
+        self.url = self.upstream.start()
+
+    def tearDown(self):
+        self.upstream.stop()
+
+    def test_bundled_currencies(self):
+        api = ExchangeRatesAPI(base_url=self.url, history_path=':memory:',
+                               lazy=True)
+        self.assertIn('USD', api.currencies)
+        self.assertIn('EUR', api.currencies)
+        self.assertEqual(api.latest('USD')['base'], 'USD')
+
+    def test_upstream_down(self):
+        api = ExchangeRatesAPI(base_url='http://127.0.0.1:1', retries=0,
+                               history_path=':memory:')
+        self.assertIn('USD', api.currencies)
+        self.assertIn('error', api.latest('USD'))
+
+    def test_stored_currencies(self):
+        api = ExchangeRatesAPI(base_url=self.url, history_path=':memory:')
+        api.history_store.save({'2099-01-01': {'USD': decimal.Decimal(1)}})
+        self.assertEqual(sorted(api._stored_currencies()), ['EUR', 'USD'])
+
+
+class TestRetries(unittest.TestCase):
+    def setUp(self):
+        self.upstream = FakeUpstream()
+        self.url = self.upstream.start()
+
+    def tearDown(self):
+        self.upstream.stop()
+
+    def api(self, url, **kwargs):
+        return ExchangeRatesAPI(base_url=url, history_path=':memory:',
+                                lazy=True, backoff=0.01, **kwargs)
+
+    def test_dead_port(self):
+        errors = UPSTREAM_ERRORS.get('latest')
+        latest = self.api('http://127.0.0.1:1').latest('USD')
+        self.assertIn('error', latest)
+        self.assertEqual(UPSTREAM_ERRORS.get('latest'), errors + 3)
+
+    def test_unavailable_then_ok(self):
+        self.upstream.failures = 2
+        requests = self.upstream.requests
+        errors = UPSTREAM_ERRORS.get('latest')
+        self.assertEqual(self.api(self.url).latest('USD')['base'], 'USD')
+        self.assertEqual(self.upstream.requests, requests + 3)
+        self.assertEqual(UPSTREAM_ERRORS.get('latest'), errors + 2)
+
+        self.upstream.failures = 3
+        self.assertIn('error', self.api(self.url).latest('USD'))
+
+    def test_timeout(self):
+        self.upstream.latency = 0.5
+        errors = UPSTREAM_ERRORS.get('latest')
+        api = self.api(self.url, timeout=(1, 0.1), retries=1)
+        self.assertIn('error', api.latest('USD'))
+        self.assertEqual(UPSTREAM_ERRORS.get('latest'), errors + 2)
+
+
+class TestOpenDay(unittest.TestCase):
+    def setUp(self):
+        self.upstream = FakeUpstream()
+        self.api = ExchangeRatesAPI(base_url=self.upstream.start(),
+                                    history_path=':memory:')
+
+    def tearDown(self):
+        self.upstream.stop()
+
+    def test_fetched_until_update(self):
+        end = datetime.now()
+        start = end - timedelta(days=30)
+        requests = self.upstream.requests
+        for _ in range(5):
+            self.assertNotIn('error', self.api.history(start, end, 'USD', 'EUR'))
+        self.assertEqual(self.upstream.requests, requests + 1)
+        self.assertEqual(self.api._missing_history(
+            start.date().isoformat(), end.date().isoformat()), [])
+
+        # Today is fetched again after rates are published
+        today, fetched_until = self.api.open_history
+        self.assertEqual(fetched_until, next_daily_update())
+        self.api.open_history = (today, time.time() - 1)
+        self.api.history(start, end, 'USD', 'EUR')
+        self.assertEqual(self.upstream.requests, requests + 2)
+
+
+class TestCachedChart(unittest.TestCase):
+    def setUp(self):
+        self.upstream = FakeUpstream(latency=0.2)
+        self.api = ExchangeRatesAPI(base_url=self.upstream.start(),
+                                    history_path=':memory:')
+
+    def tearDown(self):
+        self.upstream.stop()
+
+    def test_no_request(self):
+        image = self.api.plot_history('USD', 'EUR', 30)
+        requests = self.upstream.requests
+        started = time.perf_counter()
+        for _ in range(5):
+            self.assertIs(self.api.plot_history('USD', 'EUR', 30), image)
+        self.assertLess(time.perf_counter() - started, 0.2)
+        self.assertEqual(self.upstream.requests, requests)
+
+
+class TestStaleRefresh(unittest.TestCase):
+    def setUp(self):
+        self.upstream = FakeUpstream(latency=0.2)
+        self.api = ExchangeRatesAPI(base_url=self.upstream.start(),
+                                    history_path=':memory:', stale_time=60,
+                                    retries=0)
+        # Every snapshot is stale at once
+        self.api.cache.max_time = -1
+
+    def tearDown(self):
+        self.api.refresher.shutdown()
+        self.upstream.stop()
+
+    def wait_refreshed(self, requests):
+        for _ in range(100):
+            if self.upstream.requests >= requests:
+                break
+            time.sleep(0.02)
+        # Request is counted before latency of upstream
+        time.sleep(self.upstream.latency + 0.1)
+
+    def test_stale_served(self):
+        stale = self.api._snapshot()
+        requests = self.upstream.requests
+
+        started = time.perf_counter()
+        self.assertIs(self.api._snapshot(), stale)
+        self.assertLess(time.perf_counter() - started, 0.1)
+
+        self.wait_refreshed(requests + 1)
+        self.assertEqual(self.upstream.requests, requests + 1)
+        fresh = self.api.cache.rates(self.api.SNAPSHOT_BASE)
+        self.assertIsNot(fresh, stale)
+
+        # Failed refresh keeps cached snapshot
+        self.upstream.failures = 1
+        self.assertIs(self.api._snapshot(), fresh)
+        self.wait_refreshed(requests + 2)
+        self.assertEqual(self.upstream.requests, requests + 2)
+        self.assertIs(self.api.cache.rates(self.api.SNAPSHOT_BASE), fresh)
+
+
+class TestIterHistory(unittest.TestCase):
+    def setUp(self):
+        self.upstream = FakeUpstream()
+        self.api = ExchangeRatesAPI(base_url=self.upstream.start(),
+                                    history_path=':memory:')
+        self.api.HISTORY_CHUNK_DAYS = 100
+
+    def tearDown(self):
+        self.upstream.stop()
+
+    def test_same_as_history(self):
+        start, end = datetime(2020, 1, 30), datetime(2021, 1, 30)
+        rows = self.api.iter_history(start, end, 'USD', targets=['EUR', 'GBP'])
+        self.assertNotIsInstance(rows, dict)
+
+        requests = self.upstream.requests
+        rows = list(rows)
+        # One request per chunk of range
+        self.assertEqual(self.upstream.requests - requests, 4)
+        days = [day for day, _ in rows]
+        self.assertEqual(days, sorted(days))
+
+        res = self.api.history(start, end, 'USD', targets=['EUR', 'GBP'])
+        self.assertEqual(dict(rows), res['rates'])
+        self.assertEqual(self.upstream.requests - requests, 4)
+
+    def test_invalid(self):
+        start, end = datetime(2020, 1, 30), datetime(2021, 1, 30)
+        self.assertIn('error', self.api.iter_history(start, end, 'USD', 'XXX'))
+        self.assertIn('error', self.api.iter_history(end, start, 'USD', 'EUR'))
+
+    def test_unavailable(self):
+        self.api.BASE_URL = 'http://127.0.0.1:1'
+        self.api.retries = 0
+        rows = self.api.iter_history(
+            datetime(2020, 1, 30), datetime(2021, 1, 30), 'USD', 'EUR')
+        with self.assertRaises(HistoryUnavailable):
+            next(rows)
+
+
 if __name__ == '__main__':
     unittest.main()
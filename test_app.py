@@ -0,0 +1,279 @@
+import unittest
+import asyncio
+import threading
+import time
+from decimal import Decimal
+from concurrent.futures import ThreadPoolExecutor
+
+from alerts import AlertService
+from api import ExchangeRatesAPI
+from app import App, AsyncApp, _start_loop
+from ratelimit import RateLimiter
+from benchmarks.fake_upstream import FakeUpstream
+from benchmarks.fakes import command, inline_query
+
+
+class TestApp(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.upstream = FakeUpstream()
+        url = cls.upstream.start()
+        cls.app = App(api=ExchangeRatesAPI(base_url=url, history_path=':memory:'),
+                      alerts=AlertService(':memory:'))
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.upstream.stop()
+
+    def reply(self, handler, text):
+        update, context = command(text)
+        handler(update, context)
+        self.assertEqual(len(update.message.replies), 1)
+        return update.message.replies[0]
+
+    def test_latest(self):
+        res = self.reply(self.app.latest, '/list EUR')
+        self.assertTrue(res.startswith('List of all available rates for EUR:\n'))
+        self.assertIn('USD: 1.19\n', res)
+        self.assertTrue(res.endswith('/latest?base=EUR'))
+
+        self.assertEqual(self.reply(self.app.latest, '/list XXX'),
+                         App.LATEST_USAGE)
+
+    def test_latest_rendered_once(self):
+        res1 = self.reply(self.app.latest, '/list GBP')
+        res2 = self.reply(self.app.latest, '/list GBP')
+        self.assertIs(res1, res2)
+
+        self.app.api.refresh()
+        res3 = self.reply(self.app.latest, '/list GBP')
+        self.assertIsNot(res1, res3)
+        self.assertEqual(res1, res3)
+
+    def test_exchange(self):
+        self.assertEqual(self.reply(self.app.exchange, '/exchange 10 EUR to USD'),
+                         '11.93 USD')
+        self.assertEqual(self.reply(self.app.exchange, '/exchange 10€ to USD'),
+                         '11.93 USD')
+        self.assertEqual(self.reply(self.app.exchange, '/exchange 10 EUR USD'),
+                         App.EXCHANGE_USAGE)
+
+    def test_exchange_too_large(self):
+        self.assertEqual(self.reply(self.app.exchange, '/exchange 1e30 USD to EUR'),
+                         App.EXCHANGE_USAGE)
+        # Amounts which got past parser can't be converted either
+        self.assertIsNone(self.app.api.exchange('1e30', 'USD', 'EUR'))
+        self.assertEqual(self.app.api.exchange_many([('1e30', 'USD', 'EUR'),
+                                                     ('1', 'EUR', 'USD')]),
+                         [None, '1.19 USD'])
+
+        res = self.reply(self.app.batch, '/batch 1e30 USD to EUR, 10 EUR to USD')
+        self.assertEqual(res, '1e30 USD to EUR: invalid\n'
+                              '10 EUR to USD = 11.93 USD')
+
+    def test_batch(self):
+        res = self.reply(self.app.batch, '/batch 10 EUR to USD, 10€ to XXX, 1 GBP to GBP')
+        self.assertEqual(res, '10 EUR to USD = 11.93 USD\n'
+                              '10€ to XXX: invalid\n'
+                              '1 GBP to GBP = 1.00 GBP')
+
+        self.assertEqual(self.reply(self.app.batch, '/batch'), App.BATCH_USAGE)
+        too_many = ', '.join(['1 EUR to USD'] * (App.MAX_BATCH + 1))
+        self.assertEqual(self.reply(self.app.batch, '/batch ' + too_many),
+                         App.BATCH_USAGE)
+
+    def test_alerts(self):
+        res = self.reply(self.app.alert, '/alert eur/usd 1.3')
+        self.assertRegex(res, r'^Alert (\d+): EUR/USD above 1.3, now 1.19')
+        alert_id = res.split()[1][:-1]
+        self.assertEqual(self.reply(self.app.list_alerts, '/alerts'),
+                         f'{alert_id}: EUR/USD above 1.3')
+
+        self.assertEqual(self.reply(self.app.alert, '/alert EUR/XXX 1.3'),
+                         App.ALERT_USAGE)
+        self.assertEqual(self.reply(self.app.alert, '/alert EUR/USD 0'),
+                         App.ALERT_USAGE)
+        self.assertEqual(self.reply(self.app.alert, '/alert USD/usd 2'),
+                         App.ALERT_USAGE)
+        self.assertEqual(self.reply(self.app.unalert, '/unalert x'),
+                         App.UNALERT_USAGE)
+
+        self.assertEqual(self.reply(self.app.unalert, f'/unalert {alert_id}'),
+                         f'Alert {alert_id} cancelled')
+        self.assertEqual(self.reply(self.app.unalert, f'/unalert {alert_id}'),
+                         App.UNALERT_USAGE)
+        self.assertEqual(self.reply(self.app.list_alerts, '/alerts'),
+                         App.NO_ALERTS)
+
+    def test_alerts_fired_on_refresh(self):
+        sent = []
+        alerts = AlertService(':memory:')
+        alerts.start(lambda chat_id, text: sent.append((chat_id, text)))
+        self.app.api.snapshot_listeners.append(alerts.check)
+        self.addCleanup(self.app.api.snapshot_listeners.remove, alerts.check)
+
+        # Subscribed when rate was 1, fires at 1.1 or more
+        alert = alerts.subscribe(5, 'EUR', 'USD', Decimal('1.1'), Decimal('1'))
+        self.app.api.refresh()
+        # Checked in thread of alerts, refresh does not wait for it
+        for _ in range(100):
+            if sent:
+                break
+            time.sleep(0.01)
+        self.assertEqual(sent, [(5, f'Alert {alert.id}: EUR/USD is 1.1933, '
+                                    'crossed 1.1')])
+
+    def test_export(self):
+        name, data = self.reply(self.app.export, '/export USD/EUR,GBP for 30 days')
+        self.assertEqual(name, 'USD-EUR-GBP-30d.csv')
+        lines = data.decode().splitlines()
+        self.assertEqual(lines[0], 'date,EUR,GBP')
+        self.assertGreater(len(lines), 15)
+        day, eur, gbp = lines[1].split(',')
+        self.assertEqual(len(day), 10)
+        self.assertGreater(float(eur), 0)
+
+        self.assertEqual(self.reply(self.app.export, '/export USD/XXX for 30 days'),
+                         App.EXPORT_USAGE)
+        days = App.MAX_EXPORT_DAYS + 1
+        self.assertEqual(self.reply(self.app.export, f'/export USD/EUR for {days} days'),
+                         App.EXPORT_USAGE)
+
+    def answer(self, text):
+        update, context = inline_query(text)
+        self.app.inline(update, context)
+        self.assertEqual(len(update.inline_query.answers), 1)
+        return update.inline_query.answers[0]
+
+    def test_inline(self):
+        results, cache_time = self.answer('10 EUR to USD')
+        self.assertEqual(cache_time, 300)
+        self.assertEqual([r.title for r in results], ['10 EUR = 11.93 USD'])
+        self.assertEqual(results[0].input_message_content.message_text,
+                         '10 EUR = 11.93 USD')
+
+        results, _ = self.answer('10€ usd')
+        self.assertEqual([r.title for r in results], ['10 EUR = 11.93 USD'])
+
+        # Common targets of amount without target
+        results, _ = self.answer('10 EUR')
+        self.assertEqual(len(results), len(App.CURRENCY_MAP) - 1)
+        self.assertIn('10 EUR = 11.93 USD', [r.title for r in results])
+
+        results, _ = self.answer('')
+        self.assertEqual(len(results), len(App.INLINE_COMMON))
+
+        self.assertEqual(self.answer('10')[0], [])
+        self.assertEqual(self.answer('1e30 USD EUR')[0], [])
+        self.assertEqual(self.answer('1e30 USD')[0], [])
+        self.assertEqual(self.answer('10 EUR to XXX')[0], [])
+
+    def test_inline_cached(self):
+        results1, _ = self.answer('5 GBP')
+        results2, _ = self.answer('5 gbp')
+        self.assertIs(results1, results2)
+
+        self.app.api.refresh()
+        results3, _ = self.answer('5 GBP')
+        self.assertIsNot(results1, results3)
+        self.assertEqual([r.title for r in results1],
+                         [r.title for r in results3])
+
+    def test_inline_equal_amounts(self):
+        for query, title in [('1e1 EUR USD', '10 EUR = 11.93 USD'),
+                             ('10 EUR USD', '10 EUR = 11.93 USD'),
+                             ('10.00 EUR USD', '10.00 EUR = 11.93 USD')]:
+            results, _ = self.answer(query)
+            self.assertEqual([r.title for r in results], [title])
+
+    def test_history(self):
+        res = self.reply(self.app.history, '/history USD/EUR for 7 days')
+        self.assertTrue(res.startswith(b'\x89PNG'))
+
+        res = self.reply(self.app.history, '/history USD/EUR,GBP,JPY for 30 days')
+        self.assertTrue(res.startswith(b'\x89PNG'))
+
+        self.assertEqual(self.reply(self.app.history, '/history USD for 7 days'),
+                         App.HISTORY_USAGE)
+        self.assertEqual(self.reply(self.app.history, '/history USD/EUR,XXX for 7 days'),
+                         App.HISTORY_USAGE)
+        targets = ','.join(['EUR'] * (App.MAX_HISTORY_TARGETS + 1))
+        self.assertEqual(self.reply(self.app.history, f'/history USD/{targets} for 7 days'),
+                         App.HISTORY_USAGE)
+        for days in [0, App.MAX_HISTORY_DAYS + 1, 99999999]:
+            self.assertEqual(
+                self.reply(self.app.history, f'/history USD/EUR for {days} days'),
+                App.HISTORY_USAGE)
+
+
+class SlowChartAPI:
+    """Counts charts and draws every one of them for a while."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.charts = 0
+
+    def plot_history(self, cur_from, cur_to, days):
+        with self.lock:
+            self.charts += 1
+        time.sleep(0.2)
+        return b'\x89PNG'
+
+
+class TestAppLimits(unittest.TestCase):
+    def test_rate_limit(self):
+        app = App(api=SlowChartAPI(), limiter=RateLimiter(rate=0, burst=6))
+
+        update, context = command('/history USD/EUR for 7 days', chat_id=1)
+        app.history(update, context)
+        app.history(update, context)
+        self.assertEqual(update.message.replies, [b'\x89PNG', App.RATE_LIMITED])
+
+        update, context = command('/history USD/EUR for 7 days', chat_id=2)
+        app.history(update, context)
+        self.assertEqual(update.message.replies, [b'\x89PNG'])
+
+    def test_dedup(self):
+        api = SlowChartAPI()
+        app = App(api=api)
+        updates = [command('/history USD/EUR for 7 days') for _ in range(4)]
+        with ThreadPoolExecutor(4) as executor:
+            list(executor.map(lambda u: app.history(*u), updates))
+
+        self.assertEqual(api.charts, 1)
+        for update, _ in updates:
+            self.assertEqual(update.message.replies, [b'\x89PNG'])
+
+
+class TestAsyncHandler(unittest.TestCase):
+    def setUp(self):
+        self.loop = _start_loop()
+        self.addCleanup(self.loop.call_soon_threadsafe, self.loop.stop)
+        self.app = AsyncApp(SlowChartAPI(), self.loop)
+
+    def test_wait(self):
+        finished = []
+
+        async def handle(update, context):
+            await asyncio.sleep(0.1)
+            finished.append(update)
+
+        self.app.handler(handle, wait=True)(1, None)
+        self.assertEqual(finished, [1])
+
+        self.app.handler(handle)(2, None)
+        self.assertEqual(finished, [1])
+        time.sleep(0.2)
+        self.assertEqual(finished, [1, 2])
+
+    def test_failure_logged(self):
+        async def handle(update, context):
+            raise RuntimeError('failed')
+
+        with self.assertLogs(level='ERROR') as logs:
+            self.app.handler(handle, wait=True)(1, None)
+        self.assertIn('RuntimeError: failed', logs.output[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+import unittest
+import asyncio
+from datetime import datetime
+
+from async_api import AsyncExchangeRatesAPI
+from metrics import UPSTREAM_ERRORS
+from rates import RateMatrix
+from benchmarks.fake_upstream import FakeUpstream
+
+
+class TestAsyncAPI(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.upstream = FakeUpstream()
+        cls.url = cls.upstream.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.upstream.stop()
+
+    def run_api(self, call):
+        async def run():
+            api = await AsyncExchangeRatesAPI.create(
+                base_url=self.url, history_path=':memory:')
+            return api, await call(api)
+        return asyncio.run(run())
+
+    def test_create(self):
+        api, _ = self.run_api(lambda api: asyncio.sleep(0))
+        self.assertIn('USD', api.currencies)
+        self.assertEqual(api.BASE_URL, self.url)
+
+    def test_create_upstream_down(self):
+        async def run():
+            return await AsyncExchangeRatesAPI.create(
+                base_url='http://127.0.0.1:1', retries=0,
+                history_path=':memory:')
+        self.assertIn('USD', asyncio.run(run()).currencies)
+
+    def test_latest(self):
+        _, latest = self.run_api(lambda api: api.latest('USD'))
+        self.assertEqual(latest['base'], 'USD')
+        self.assertEqual(latest['rates']['USD'], 1)
+
+        _, latest = self.run_api(lambda api: api.latest('XXX'))
+        self.assertIn('error', latest)
+
+    def test_exchange(self):
+        _, res = self.run_api(lambda api: api.exchange('10', 'EUR', 'USD'))
+        self.assertEqual(res, '11.93 USD')
+
+    def test_exchange_many(self):
+        items = [('10', 'EUR', 'USD'), ('1', 'EUR', 'XXX'), ('20', 'EUR', 'USD')]
+        _, res = self.run_api(lambda api: api.exchange_many(items))
+        self.assertEqual(res, ['11.93 USD', None, '23.87 USD'])
+
+    def test_history(self):
+        start, end = datetime(2021, 3, 1), datetime(2021, 3, 7)
+        _, res = self.run_api(
+            lambda api: api.history(start, end, base='USD', target='EUR'))
+        self.assertEqual(len(res['rates']), 5)
+
+        _, res = self.run_api(
+            lambda api: api.history(end, start, base='USD', target='EUR'))
+        self.assertIn('error', res)
+
+    def test_iter_history(self):
+        start, end = datetime(2020, 1, 30), datetime(2021, 1, 30)
+
+        async def collect(api):
+            api.HISTORY_CHUNK_DAYS = 100
+            return [row async for row in api.iter_history(
+                start, end, 'USD', 'EUR')]
+        api, rows = self.run_api(collect)
+        res = self.run_api(lambda api: api.history(start, end, 'USD', 'EUR'))[1]
+        self.assertEqual(dict(rows), res['rates'])
+        self.assertIn('error', api.iter_history(start, end, 'USD', 'XXX'))
+
+
+class TestAsyncRetries(unittest.TestCase):
+    def setUp(self):
+        self.upstream = FakeUpstream()
+        self.url = self.upstream.start()
+
+    def tearDown(self):
+        self.upstream.stop()
+
+    def refresh(self, url, **kwargs):
+        async def run():
+            api = AsyncExchangeRatesAPI(base_url=url, history_path=':memory:',
+                                        backoff=0.01, **kwargs)
+            return await api.refresh()
+        return asyncio.run(run())
+
+    def test_dead_port(self):
+        errors = UPSTREAM_ERRORS.get('latest')
+        self.assertIn('error', self.refresh('http://127.0.0.1:1'))
+        self.assertEqual(UPSTREAM_ERRORS.get('latest'), errors + 3)
+
+    def test_unavailable_then_ok(self):
+        self.upstream.failures = 2
+        requests = self.upstream.requests
+        errors = UPSTREAM_ERRORS.get('latest')
+        self.assertIsInstance(self.refresh(self.url), RateMatrix)
+        self.assertEqual(self.upstream.requests, requests + 3)
+        self.assertEqual(UPSTREAM_ERRORS.get('latest'), errors + 2)
+
+        self.upstream.failures = 3
+        self.assertIn('error', self.refresh(self.url))
+
+    def test_timeout(self):
+        self.upstream.latency = 0.5
+        errors = UPSTREAM_ERRORS.get('latest')
+        self.assertIn('error', self.refresh(self.url, timeout=(0.05, 0.05),
+                                            retries=1))
+        self.assertEqual(UPSTREAM_ERRORS.get('latest'), errors + 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,190 @@
+import unittest
+import decimal
+import os
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from cache import (Cache, LRUCache, MemoryBackend, SQLiteBackend,
+                   next_daily_update, sizeof)
+from rates import RateMatrix
+
+
+class TestCache(unittest.TestCase):
+    def test_rates(self):
+        cache = Cache()
+        self.assertIsNone(cache.rates('EUR'))
+        cache.save_rates({'USD': 1}, 'EUR')
+        self.assertEqual(cache.rates('EUR'), {'USD': 1})
+        self.assertEqual(cache.lookup('EUR'), ({'USD': 1}, False))
+
+    def test_expired(self):
+        cache = Cache(max_time=-1)
+        cache.save_rates({'USD': 1}, 'EUR')
+        self.assertEqual(cache.lookup('EUR'), (None, False))
+        self.assertIsNone(cache.backend.get('EUR'))
+
+    def test_stale(self):
+        cache = Cache(max_time=-1, stale_time=60)
+        cache.save_rates({'USD': 1}, 'EUR')
+        self.assertEqual(cache.lookup('EUR'), ({'USD': 1}, True))
+        self.assertEqual(cache.rates('EUR'), {'USD': 1})
+
+    def test_age(self):
+        cache = Cache()
+        self.assertIsNone(cache.age('EUR'))
+        cache.save_rates({'USD': 1}, 'EUR')
+        self.assertEqual(cache.age('EUR'), 0)
+
+    def test_stats(self):
+        cache = Cache()
+        cache.rates('EUR')
+        cache.save_rates({'USD': 1}, 'EUR')
+        cache.rates('EUR')
+        stats = cache.stats()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 1))
+        self.assertEqual(stats['entries'], 1)
+        self.assertEqual(stats['bytes'], sizeof({'USD': 1}))
+
+    def test_bounded(self):
+        cache = Cache(backend=MemoryBackend(max_entries=2))
+        for base in ['EUR', 'USD', 'GBP']:
+            cache.save_rates({'USD': 1}, base)
+        self.assertIsNone(cache.rates('EUR'))
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+    def test_sweep(self):
+        cache = Cache(max_time=-1)
+        cache.save_rates({'USD': 1}, 'EUR')
+        self.assertEqual(cache.sweep(), 1)
+        self.assertEqual(cache.stats()['entries'], 0)
+
+    def test_sizeof(self):
+        self.assertGreater(sizeof({'USD': [1, 2, 3]}), sizeof({'USD': []}))
+        shared = ['x' * 1000]
+        self.assertLess(sizeof([shared, shared]), 2 * sizeof(shared))
+
+
+class TestSQLiteBackend(unittest.TestCase):
+    snapshot = {
+        'base': 'EUR',
+        'date': '2021-03-05',
+        'rates': {'USD': decimal.Decimal('1.1933'),
+                  'GBP': decimal.Decimal('0.86180')},
+    }
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'cache.sqlite3')
+        self.backends = []
+
+    def tearDown(self):
+        for backend in self.backends:
+            backend.close()
+        self.tmp.cleanup()
+
+    def cache(self, **kwargs):
+        backend = SQLiteBackend(
+            self.path, RateMatrix.to_bytes, RateMatrix.from_bytes)
+        self.backends.append(backend)
+        return Cache(backend=backend, **kwargs)
+
+    def test_shared(self):
+        cache1, cache2 = self.cache(), self.cache()
+        self.assertIsNone(cache2.rates('EUR'))
+
+        cache1.save_rates(RateMatrix(self.snapshot), 'EUR')
+        matrix = cache2.rates('EUR')
+        self.assertEqual(matrix.rate('EUR', 'GBP'), decimal.Decimal('0.86180'))
+        self.assertEqual(matrix.date, '2021-03-05')
+        # Unchanged snapshot is decoded once
+        self.assertIs(cache2.rates('EUR'), matrix)
+
+        cache1.save_rates(RateMatrix({'base': 'EUR', 'rates': {'USD': 1}}), 'EUR')
+        self.assertIsNot(cache2.rates('EUR'), matrix)
+
+    def test_shared_sweep(self):
+        cache = self.cache(max_time=-1)
+        cache.save_rates(RateMatrix(self.snapshot), 'EUR')
+        self.assertEqual(cache.stats()['entries'], 1)
+        self.assertEqual(cache.sweep(), 1)
+        self.assertEqual(cache.stats()['entries'], 0)
+
+    def test_shared_expired(self):
+        cache1, cache2 = self.cache(max_time=-1), self.cache(max_time=-1)
+        cache1.save_rates(RateMatrix(self.snapshot), 'EUR')
+        self.assertEqual(cache2.lookup('EUR'), (None, False))
+        self.assertIsNone(cache1.backend.get('EUR'))
+
+
+class TestLRUCache(unittest.TestCase):
+    def test_get_set(self):
+        cache = LRUCache()
+        self.assertIsNone(cache.get('a'))
+        cache.set('a', b'123')
+        self.assertEqual(cache.get('a'), b'123')
+        self.assertEqual(cache.hits, 1)
+        self.assertEqual(cache.misses, 1)
+        self.assertEqual(cache.bytes, 3)
+
+    def test_max_entries(self):
+        cache = LRUCache(max_entries=2)
+        cache.set('a', b'1')
+        cache.set('b', b'2')
+        cache.get('a')
+        cache.set('c', b'3')
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), b'1')
+
+    def test_max_bytes(self):
+        cache = LRUCache(max_bytes=10)
+        cache.set('a', b'12345')
+        cache.set('b', b'12345')
+        cache.set('c', b'123')
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.bytes, 8)
+
+        cache.set('d', b'12345678901')
+        self.assertIsNone(cache.get('d'))
+        self.assertEqual(cache.evictions, 1)
+
+    def test_expired_evicted_first(self):
+        cache = LRUCache(max_entries=2)
+        cache.set('a', b'1')
+        cache.set('b', b'2', expire_at=time.time() - 1)
+        cache.set('c', b'3')
+        self.assertEqual(cache.get('a'), b'1')
+        self.assertEqual(cache.evictions, 0)
+
+    def test_sweep(self):
+        cache = LRUCache(sweep_interval=0)
+        cache.set('a', b'1', expire_at=time.time() - 1)
+        cache.set('b', b'2')
+        self.assertEqual(len(cache), 1)
+        self.assertEqual(cache.sweep(), 0)
+        self.assertEqual(cache.stats(), {'hits': 0, 'misses': 0, 'evictions': 0,
+                                         'entries': 1, 'bytes': 1})
+
+    def test_expire(self):
+        cache = LRUCache()
+        cache.set('a', b'1', expire_at=time.time() - 1)
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(len(cache), 0)
+
+        cache = LRUCache(max_time=-1)
+        cache.set('a', b'1')
+        self.assertIsNone(cache.get('a'))
+
+    def test_next_daily_update(self):
+        now = datetime(2021, 3, 5, 10, tzinfo=timezone.utc).timestamp()
+        update = datetime(2021, 3, 5, 16, tzinfo=timezone.utc).timestamp()
+        self.assertEqual(next_daily_update(now=now), update)
+
+        now = datetime(2021, 3, 5, 17, tzinfo=timezone.utc).timestamp()
+        update = datetime(2021, 3, 6, 16, tzinfo=timezone.utc).timestamp()
+        self.assertEqual(next_daily_update(now=now), update)
+
+
+if __name__ == '__main__':
+    unittest.main()
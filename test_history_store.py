@@ -0,0 +1,87 @@
+import unittest
+import decimal
+import os
+import tempfile
+
+from history_store import HistoryStore
+
+
+class TestHistoryStore(unittest.TestCase):
+    rates = {
+        '2021-03-01': {'USD': decimal.Decimal('1.2066'), 'GBP': decimal.Decimal('0.8664')},
+        '2021-03-02': {'USD': decimal.Decimal('1.2053'), 'GBP': decimal.Decimal('0.8656')},
+        '2021-03-05': {'USD': decimal.Decimal('1.1933'), 'GBP': decimal.Decimal('0.8618')},
+    }
+
+    def setUp(self):
+        self.store = HistoryStore(':memory:')
+
+    def tearDown(self):
+        self.store.close()
+
+    def test_missing_empty(self):
+        self.assertEqual(
+            self.store.missing('2021-03-01', '2021-03-07'),
+            [('2021-03-01', '2021-03-07')])
+
+    def test_missing_after_save(self):
+        self.store.save(self.rates, '2021-03-01', '2021-03-07')
+        self.assertEqual(self.store.missing('2021-03-02', '2021-03-06'), [])
+        self.assertEqual(
+            self.store.missing('2021-02-20', '2021-03-10'),
+            [('2021-02-20', '2021-02-28'), ('2021-03-08', '2021-03-10')])
+
+    def test_coverage_merge(self):
+        self.store.save({}, '2021-03-01', '2021-03-03')
+        self.store.save({}, '2021-03-10', '2021-03-12')
+        self.assertEqual(
+            self.store.missing('2021-03-01', '2021-03-12'),
+            [('2021-03-04', '2021-03-09')])
+
+        self.store.save({}, '2021-03-04', '2021-03-09')
+        self.assertEqual(self.store.missing('2021-03-01', '2021-03-12'), [])
+
+    def test_save_without_range(self):
+        self.store.save(self.rates)
+        self.assertEqual(len(self.store.rates('2021-03-01', '2021-03-07')), 3)
+        self.assertEqual(
+            self.store.missing('2021-03-01', '2021-03-07'),
+            [('2021-03-01', '2021-03-07')])
+
+    def test_rates(self):
+        self.store.save(self.rates, '2021-03-01', '2021-03-07')
+
+        res = self.store.rates('2021-03-02', '2021-03-07')
+        self.assertEqual(list(res), ['2021-03-02', '2021-03-05'])
+        self.assertEqual(res['2021-03-05']['USD'], decimal.Decimal('1.1933'))
+
+        res = self.store.rates('2021-03-01', '2021-03-07', ['GBP'])
+        self.assertEqual(set(res['2021-03-01']), {'GBP'})
+
+    def test_rows(self):
+        self.store.save(self.rates)
+        rows = self.store.rows('2021-03-02', '2021-03-07', ['USD'])
+        self.assertEqual(rows, [('2021-03-02', 'USD', '1.2053'),
+                                ('2021-03-05', 'USD', '1.1933')])
+
+    def test_latest_rates(self):
+        self.assertEqual(self.store.latest_rates(), (None, {}))
+        self.store.save(self.rates)
+        self.assertEqual(self.store.latest_rates(),
+                         ('2021-03-05', self.rates['2021-03-05']))
+
+    def test_persistence(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'history.sqlite3')
+            store = HistoryStore(path)
+            store.save(self.rates, '2021-03-01', '2021-03-07')
+            store.close()
+
+            store = HistoryStore(path)
+            self.assertEqual(store.missing('2021-03-01', '2021-03-07'), [])
+            self.assertEqual(store.rates('2021-03-01', '2021-03-07'), self.rates)
+            store.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,136 @@
+import unittest
+import asyncio
+import time
+from datetime import date, datetime, timedelta, timezone
+
+from api import ExchangeRatesAPI
+from async_api import AsyncExchangeRatesAPI
+from ingest import HistoryIngester
+from benchmarks.fake_upstream import FakeUpstream
+
+
+class TestHistoryIngester(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.upstream = FakeUpstream()
+        cls.url = cls.upstream.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.upstream.stop()
+
+    def setUp(self):
+        self.api = ExchangeRatesAPI(base_url=self.url, history_path=':memory:')
+
+    def test_window(self):
+        ingester = HistoryIngester(self.api, years=10)
+        self.assertEqual(ingester.window(date(2021, 3, 5)),
+                         ('2011-03-05', '2021-03-05'))
+
+    def test_ingest(self):
+        ingester = HistoryIngester(self.api, years=1, chunk_days=100)
+        requests = self.upstream.requests
+        self.assertIsNone(ingester.ingest())
+        self.assertEqual(self.upstream.requests - requests, 4)
+        self.assertEqual(self.api.history_ingested, ingester.window()[1])
+
+        # Only days since last run are fetched again
+        requests = self.upstream.requests
+        ingester.ingest()
+        self.assertEqual(self.upstream.requests - requests, 1)
+
+    def test_next_run(self):
+        ingester = HistoryIngester(self.api)
+        day = datetime(2021, 3, 5, tzinfo=timezone.utc)
+        self.assertEqual(ingester.next_run(day.replace(hour=16, minute=3).timestamp()),
+                         day.replace(hour=16, minute=5).timestamp())
+        self.assertEqual(ingester.next_run(day.replace(hour=16, minute=5).timestamp()),
+                         (day + timedelta(days=1, hours=16, minutes=5)).timestamp())
+
+    def test_covered_until_next_run(self):
+        ingester = HistoryIngester(self.api, years=1)
+        ingester.ingest()
+        self.assertEqual(self.api.open_history,
+                         (ingester.window()[1], ingester.next_run()))
+
+        # After midnight new day is not fetched before next run
+        requests = self.upstream.requests
+        start, end = ingester.window(date.today() + timedelta(days=1))
+        self.assertEqual(self.api._missing_history(start, end), [])
+        for _ in range(3):
+            self.api.plot_history('USD', 'EUR', 30)
+        self.assertEqual(self.upstream.requests, requests)
+
+    def test_offline_history(self):
+        HistoryIngester(self.api, years=1).ingest()
+
+        requests = self.upstream.requests
+        end = datetime.now()
+        res = self.api.history(end - timedelta(days=90), end, 'USD', 'EUR')
+        self.assertGreater(len(res['rates']), 50)
+        self.assertTrue(self.api.plot_history('USD', 'EUR', 300).startswith(b'\x89PNG'))
+        self.assertEqual(self.upstream.requests, requests)
+
+        # Days before window are still fetched on request
+        res = self.api.history(end - timedelta(days=800), end, 'USD', 'EUR')
+        self.assertGreater(len(res['rates']), 500)
+        self.assertEqual(self.upstream.requests, requests + 1)
+
+    def test_chart_cached_before_series(self):
+        HistoryIngester(self.api, years=1).ingest()
+        image = self.api.plot_history('USD', 'EUR,GBP', 300)
+
+        read = []
+        plot_args = self.api._plot_args
+        self.api._plot_args = lambda **args: read.append(args) or plot_args(**args)
+        self.assertIs(self.api.plot_history('USD', 'EUR,GBP', 300), image)
+        self.assertEqual(read, [])
+
+        # New rates in range make a new chart, upstream has none on weekends
+        day = date.today() - timedelta(days=(date.today().weekday() + 2) % 7)
+        day = day.isoformat()
+        self.api.history_store.save({day: {'USD': '2', 'GBP': '1'}}, day, day)
+        self.assertIsNot(self.api.plot_history('USD', 'EUR,GBP', 300), image)
+        self.assertEqual(len(read), 1)
+
+    def test_missing_days_fetched(self):
+        # Ingested days which are not in store, e.g. run of daily job
+        # failed, are still fetched on request
+        self.api.history_ingested = date.today().isoformat()
+        requests = self.upstream.requests
+        res = self.api.history(datetime.now() - timedelta(days=30),
+                               datetime.now(), 'USD', 'EUR')
+        self.assertNotIn('error', res)
+        self.assertEqual(self.upstream.requests, requests + 1)
+        self.assertTrue(self.api.plot_history('USD', 'EUR', 30).startswith(b'\x89PNG'))
+
+    def test_failed(self):
+        self.api.BASE_URL = 'http://127.0.0.1:1'
+        self.api.retries = 0
+        self.assertIn('error', HistoryIngester(self.api, years=1).ingest())
+        self.assertIsNone(self.api.history_ingested)
+
+    def test_scheduled(self):
+        ingester = HistoryIngester(self.api, years=1)
+        ingester.start()
+        try:
+            for _ in range(100):
+                if self.api.history_ingested is not None:
+                    break
+                time.sleep(0.05)
+            self.assertEqual(self.api.history_ingested, ingester.window()[1])
+        finally:
+            ingester.shutdown()
+
+    def test_ingest_async(self):
+        async def run():
+            api = await AsyncExchangeRatesAPI.create(
+                base_url=self.url, history_path=':memory:')
+            await HistoryIngester(api, years=1).ingest_async()
+            return api
+        api = asyncio.run(run())
+        self.assertIsNotNone(api.history_ingested)
+
+
+if __name__ == '__main__':
+    unittest.main()
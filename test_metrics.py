@@ -0,0 +1,89 @@
+import unittest
+import asyncio
+import urllib.request
+import urllib.error
+
+from cache import LRUCache
+from metrics import (Registry, MetricsServer, HANDLER_SECONDS, CACHES,
+                     register_cache, timed, REGISTRY)
+
+
+class TestRegistry(unittest.TestCase):
+    def setUp(self):
+        self.registry = Registry()
+
+    def test_counter(self):
+        errors = self.registry.counter('errors_total', 'Errors', ['endpoint'])
+        errors.inc('latest')
+        errors.inc('latest', amount=2)
+        self.assertEqual(errors.get('latest'), 3)
+        self.assertIs(self.registry.counter('errors_total', 'Errors'), errors)
+        self.assertIn('errors_total{endpoint="latest"} 3\n',
+                      self.registry.render())
+
+    def test_histogram(self):
+        latency = self.registry.histogram(
+            'latency_seconds', 'Latency', buckets=(0.1, 1))
+        latency.observe(0.05)
+        latency.observe(0.5)
+        latency.observe(5)
+        with latency.time():
+            pass
+        self.assertEqual(latency.count(), 4)
+
+        text = self.registry.render()
+        self.assertIn('# TYPE latency_seconds histogram', text)
+        self.assertIn('latency_seconds_bucket{le="0.1"} 2\n', text)
+        self.assertIn('latency_seconds_bucket{le="1"} 3\n', text)
+        self.assertIn('latency_seconds_bucket{le="+Inf"} 4\n', text)
+        self.assertIn('latency_seconds_count 4\n', text)
+
+    def test_gauge(self):
+        self.registry.gauge('size', 'Size', ['cache'], lambda: {('a',): 2})
+        self.assertIn('size{cache="a"} 2\n', self.registry.render())
+
+
+class TestInstrumentation(unittest.TestCase):
+    def test_timed(self):
+        handler = timed('test_sync', lambda update, context: 'done')
+        self.assertEqual(handler(None, None), 'done')
+        self.assertEqual(HANDLER_SECONDS.count('test_sync'), 1)
+
+        async def coroutine(update, context):
+            return 'done'
+        handler = timed('test_async', coroutine)
+        self.assertTrue(asyncio.iscoroutinefunction(handler))
+        self.assertEqual(asyncio.run(handler(None, None)), 'done')
+        self.assertEqual(HANDLER_SECONDS.count('test_async'), 1)
+
+    def test_register_cache(self):
+        cache = LRUCache()
+        cache.set('a', b'123')
+        cache.get('a')
+        cache.get('b')
+        register_cache('test', cache)
+        try:
+            text = REGISTRY.render()
+            self.assertIn('exchange_bot_cache_bytes{cache="test"} 3\n', text)
+            self.assertIn('exchange_bot_cache_hit_ratio{cache="test"} 0.5\n', text)
+        finally:
+            del CACHES['test']
+
+    def test_server(self):
+        registry = Registry()
+        registry.counter('requests_total', 'Requests').inc()
+        server = MetricsServer(registry, port=0)
+        port = server.start()
+        try:
+            url = 'http://127.0.0.1:{}/metrics'.format(port)
+            with urllib.request.urlopen(url) as resp:
+                self.assertIn(b'requests_total 1\n', resp.read())
+
+            with self.assertRaises(urllib.error.HTTPError):
+                urllib.request.urlopen(url[:-len('metrics')])
+        finally:
+            server.stop()
+
+
+if __name__ == '__main__':
+    unittest.main()
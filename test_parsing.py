@@ -0,0 +1,73 @@
+import unittest
+import decimal
+
+from parsing import CommandParser
+
+
+class TestCommandParser(unittest.TestCase):
+    parser = CommandParser({'$': 'USD', '€': 'EUR', 'zł': 'PLN', 'z': 'XXX'},
+                           max_history_targets=2)
+
+    def test_exchange_codes(self):
+        self.assertEqual(self.parser.exchange(['10', 'eur', 'TO', 'usd']),
+                         (decimal.Decimal('10'), 'EUR', 'USD'))
+        self.assertEqual(self.parser.exchange(['1.5e2', 'GBP', 'to', 'JPY']),
+                         (decimal.Decimal('150'), 'GBP', 'JPY'))
+
+    def test_exchange_symbols(self):
+        self.assertEqual(self.parser.exchange(['10$', 'to', 'EUR']),
+                         (decimal.Decimal('10'), 'USD', 'EUR'))
+        self.assertEqual(self.parser.exchange(['€2.5', 'to', 'USD']),
+                         (decimal.Decimal('2.5'), 'EUR', 'USD'))
+        # Longest symbol wins
+        self.assertEqual(self.parser.exchange(['10zł', 'to', 'EUR'])[1], 'PLN')
+        self.assertEqual(self.parser.exchange(['10ZŁ', 'to', 'EUR'])[1], 'PLN')
+
+    def test_exchange_too_large(self):
+        self.assertEqual(self.parser.exchange(['1e30', 'USD', 'to', 'EUR']),
+                         (None, None, None))
+        self.assertEqual(self.parser.exchange(['1e15', 'USD', 'to', 'EUR']),
+                         (decimal.Decimal('1e15'), 'USD', 'EUR'))
+
+    def test_exchange_invalid(self):
+        for args in [[], ['10', 'EUR', 'USD'], ['ten', 'EUR', 'to', 'USD'],
+                     ['10£', 'to', 'USD'], ['10', 'EURO', 'to', 'USD'],
+                     ['10$', 'to', 'EUR', 'now']]:
+            self.assertEqual(self.parser.exchange(args), (None, None, None))
+
+    def test_inline(self):
+        self.assertEqual(self.parser.inline(['100', 'usd', 'eur']),
+                         (decimal.Decimal('100'), 'USD', 'EUR'))
+        self.assertEqual(self.parser.inline(['100$', 'to', 'EUR']),
+                         (decimal.Decimal('100'), 'USD', 'EUR'))
+        self.assertEqual(self.parser.inline(['zł5']),
+                         (decimal.Decimal('5'), 'PLN', None))
+        for args in [[], ['100'], ['USD'], ['100', 'USD', 'to'],
+                     ['100', 'USD', 'EUR', 'GBP']]:
+            self.assertEqual(self.parser.inline(args), (None, None, None))
+
+    def test_alert(self):
+        self.assertEqual(self.parser.alert(['usd/eur', '0.95']),
+                         ('USD', 'EUR', decimal.Decimal('0.95')))
+        for args in [[], ['USD/EUR'], ['USD', '0.95'], ['USD/EUR', '-1'],
+                     ['USD/EUR', '0'], ['USD/EUR,GBP', '1'], ['usd/USD', '2']]:
+            self.assertEqual(self.parser.alert(args), (None, None, None))
+
+    def test_history(self):
+        self.assertEqual(self.parser.history(['usd/eur', 'for', '7', 'days']),
+                         ('USD', ['EUR'], 7))
+        self.assertEqual(
+            self.parser.history(['USD/EUR,GBP', 'FOR', '30', 'DAYS']),
+            ('USD', ['EUR', 'GBP'], 30))
+
+    def test_history_invalid(self):
+        for args in [['USD', 'for', '7', 'days'],
+                     ['USD/EUR,GBP,JPY', 'for', '7', 'days'],
+                     ['USD/EUR', 'for', 'seven', 'days'],
+                     ['USD/EUR', 'for', '٣', 'days'],
+                     ['USD/EUR,', 'for', '7', 'days']]:
+            self.assertEqual(self.parser.history(args), (None, None, None))
+
+
+if __name__ == '__main__':
+    unittest.main()
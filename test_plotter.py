@@ -1,7 +1,9 @@
 import unittest
 from datetime import datetime, timedelta
 
-from plotter import Plotter
+import numpy as np
+
+from plotter import Plotter, PlotterBusy
 
 
 plotter = Plotter()
@@ -31,6 +33,91 @@ class TestPlot(unittest.TestCase):
 
         self.assertGreater(len(img2), len(img1))
         self.assertGreater(len(img2), len(img3))
+
+    def test_chart_cache(self):
+        date = [datetime.strptime(r, '%Y-%m-%d') for r in self.rates]
+        rate = [self.rates[r]['EUR'] for r in self.rates]
+        key = ('USD', 'EUR', '2021-02-26', '2021-03-05')
+
+        hits = plotter.charts.hits
+        img1 = plotter.plot_rates(date, rate, 'USD to EUR rates', key=key)
+        img2 = plotter.plot_rates(date, rate, 'USD to EUR rates', key=key)
+        self.assertIs(img1, img2)
+        self.assertEqual(plotter.charts.hits, hits + 1)
+
+        # Key identifies data, other data needs other key
+        img3 = plotter.plot_rates(date[:4], rate[:4], 'USD to EUR rates',
+                                  key=key + ('short',))
+        self.assertIsNot(img1, img3)
+        self.assertNotEqual(img1, img3)
+        self.assertIs(plotter.cached(key), img1)
+
+    def test_plot_cached(self):
+        date = [datetime.strptime(r, '%Y-%m-%d') for r in self.rates]
+        rate = [self.rates[r]['EUR'] for r in self.rates]
+        key = ('USD', 'EUR', '2021-02-26', '2021-03-05', 5)
+        built = []
+
+        def build():
+            built.append(key)
+            return date, rate, 'USD to EUR rates'
+
+        self.assertIsNone(plotter.cached(key))
+        img1 = plotter.plot_cached(key, build)
+        self.assertIs(plotter.plot_cached(key, build), img1)
+        self.assertIs(plotter.cached(key), img1)
+        self.assertEqual(len(built), 1)
+        self.assertIsNone(plotter.plot_cached(key + (1,), lambda: None))
+
+    def test_several_series(self):
+        date = [datetime.strptime(r, '%Y-%m-%d') for r in self.rates]
+        rate = [self.rates[r]['EUR'] for r in self.rates]
+
+        img1 = plotter.plot_rates(date, rate, '')
+        img2 = plotter.plot_rates(date, {'EUR': rate, 'GBP': rate[::-1]}, '')
+        self.assertTrue(img2.startswith(b'\x89PNG'))
+        self.assertNotEqual(img1, img2)
+
+        key = ('USD', 'EUR, GBP', '2021-02-26', '2021-03-05')
+        img3 = plotter.plot_rates(date, {'EUR': rate, 'GBP': rate}, '',
+                                  key=key + (1,))
+        img4 = plotter.plot_rates(date, {'EUR': rate, 'GBP': rate[::-1]}, '',
+                                  key=key + (2,))
+        self.assertNotEqual(img3, img4)
+        self.assertIs(plotter.plot_rates(date, {}, '', key=key + (2,)), img4)
+
+    def test_downsampling(self):
+        date = np.arange('2011-01-01', '2021-01-01', dtype='datetime64[D]')
+        rate = np.linspace(0.8, 0.9, len(date))
+
+        small = Plotter(max_points=100)
+        series = small._series(date, {'EUR': rate, 'GBP': rate[::-1]})
+        self.assertEqual([len(x) for _, x, _ in series], [100, 100])
+        self.assertTrue(
+            small.plot_rates(date, rate, 'USD to EUR rates').startswith(b'\x89PNG'))
+
+    def test_render_pool(self):
+        date = [datetime.strptime(r, '%Y-%m-%d') for r in self.rates]
+        rate = [self.rates[r]['EUR'] for r in self.rates]
+
+        pool_plotter = Plotter(workers=2)
+        try:
+            img1 = pool_plotter.plot_rates(date, rate, '')
+            img2 = plotter.plot_rates(date, rate, '')
+            self.assertTrue(img1.startswith(b'\x89PNG'))
+            self.assertEqual(len(img1), len(img2))
+        finally:
+            pool_plotter.close()
+
+    def test_render_pool_busy(self):
+        pool_plotter = Plotter(workers=1, max_pending=1)
+        try:
+            pool_plotter.pending.acquire()
+            with self.assertRaises(PlotterBusy):
+                pool_plotter.plot_rates([0, 1], [0, 1], '')
+        finally:
+            pool_plotter.pending.release()
+            pool_plotter.close()
         
 
 if __name__ == '__main__':
@@ -0,0 +1,35 @@
+import unittest
+
+from ratelimit import RateLimiter
+
+
+class TestRateLimiter(unittest.TestCase):
+    def test_burst(self):
+        limiter = RateLimiter(rate=0, burst=3)
+        self.assertTrue(limiter.allow(1))
+        self.assertTrue(limiter.allow(1, cost=2))
+        self.assertFalse(limiter.allow(1))
+        # Buckets are per key
+        self.assertTrue(limiter.allow(2))
+
+    def test_refill(self):
+        limiter = RateLimiter(rate=1e9, burst=3)
+        for _ in range(10):
+            self.assertTrue(limiter.allow(1, cost=3))
+
+    def test_cost_over_burst(self):
+        limiter = RateLimiter(rate=0, burst=3)
+        self.assertTrue(limiter.allow(1, cost=10))
+        self.assertFalse(limiter.allow(1))
+
+    def test_max_keys(self):
+        limiter = RateLimiter(rate=0, burst=1, max_keys=2)
+        for key in [1, 2, 3]:
+            limiter.allow(key)
+        self.assertEqual(list(limiter.buckets), [2, 3])
+        # Forgotten key starts with full bucket
+        self.assertTrue(limiter.allow(1))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import unittest
+import decimal
+
+from cache import sizeof
+from rates import RateMatrix
+
+
+class TestRateMatrix(unittest.TestCase):
+    snapshot = {
+        'base': 'EUR',
+        'date': '2021-03-05',
+        'rates': {
+            'USD': decimal.Decimal('1.1933'),
+            'GBP': decimal.Decimal('0.86180'),
+            'JPY': decimal.Decimal('129.21'),
+            'PLN': decimal.Decimal('4.5654'),
+        },
+    }
+
+    def setUp(self):
+        self.matrix = RateMatrix(self.snapshot)
+
+    def test_currencies(self):
+        self.assertIn('EUR', self.matrix.currencies)
+        self.assertIn('USD', self.matrix.currencies)
+        self.assertIn('PLN', self.matrix)
+        self.assertNotIn('XXX', self.matrix)
+
+    def test_base_rates(self):
+        self.assertEqual(self.matrix.rate('EUR', 'USD'), decimal.Decimal('1.1933'))
+        self.assertEqual(self.matrix.rate('EUR', 'EUR'), 1)
+        self.assertEqual(self.matrix.rate('GBP', 'GBP'), 1)
+
+    def test_cross_rates(self):
+        rate = self.matrix.rate('USD', 'JPY')
+        self.assertEqual(rate, decimal.Decimal('129.21') / decimal.Decimal('1.1933'))
+        self.assertIsInstance(rate, decimal.Decimal)
+
+        inverse = self.matrix.rate('JPY', 'USD')
+        self.assertAlmostEqual(rate * inverse, decimal.Decimal(1), places=20)
+
+    def test_response(self):
+        resp = self.matrix.response('PLN')
+        self.assertEqual(resp['base'], 'PLN')
+        self.assertEqual(resp['date'], '2021-03-05')
+        self.assertEqual(resp['rates']['PLN'], 1)
+        self.assertEqual(set(resp['rates']), set(self.matrix.currencies))
+
+    def test_shared_tables(self):
+        self.assertIs(self.matrix.rates('USD'), self.matrix.rates('USD'))
+        self.assertIs(self.matrix.response('USD'), self.matrix.response('USD'))
+        with self.assertRaises(TypeError):
+            self.matrix.rates('USD')['EUR'] = 1
+        with self.assertRaises(TypeError):
+            self.matrix.response('USD')['rates']['EUR'] = 1
+
+    def test_display_rates(self):
+        rates = self.matrix.response('USD')['rates']
+        self.assertEqual(rates['JPY'], decimal.Decimal('108.28'))
+        self.assertEqual(
+            self.matrix.rates('USD')['JPY'],
+            decimal.Decimal('129.21') / decimal.Decimal('1.1933'))
+
+    def test_build(self):
+        matrix = RateMatrix(self.snapshot).build()
+        size = sizeof(matrix)
+        for base in matrix.currencies:
+            matrix.response(base)
+        self.assertEqual(sizeof(matrix), size)
+
+    def test_float_snapshot(self):
+        matrix = RateMatrix({'base': 'EUR', 'rates': {'USD': 1.1933}})
+        self.assertEqual(matrix.rate('EUR', 'USD'), decimal.Decimal('1.1933'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+import unittest
+
+import numpy as np
+
+from series import to_array, history_arrays, lttb
+
+
+class TestSeries(unittest.TestCase):
+    rows = [
+        ('2021-03-01', 'GBP', '0.8664'),
+        ('2021-03-01', 'USD', '1.2066'),
+        ('2021-03-02', 'GBP', '0.8656'),
+        ('2021-03-02', 'USD', '1.2053'),
+        ('2021-03-03', 'GBP', '0.8640'),
+        ('2021-03-05', 'GBP', '0.8618'),
+        ('2021-03-05', 'USD', '1.1933'),
+    ]
+
+    def test_history_arrays(self):
+        dates, series = history_arrays(self.rows, 'USD', ['GBP', 'EUR'])
+        self.assertEqual(dates.dtype, np.dtype('datetime64[D]'))
+        self.assertEqual(
+            list(dates.astype(str)), ['2021-03-01', '2021-03-02', '2021-03-05'])
+        self.assertEqual(series['GBP'].dtype, np.float64)
+        self.assertAlmostEqual(series['GBP'][2], 0.8618 / 1.1933)
+        self.assertAlmostEqual(series['EUR'][0], 1 / 1.2066)
+
+    def test_history_arrays_snapshot_base(self):
+        dates, series = history_arrays(self.rows, 'EUR', ['GBP'])
+        self.assertEqual(len(dates), 4)
+        self.assertEqual(series['GBP'][2], 0.864)
+
+        dates, series = history_arrays([], 'USD', ['GBP'])
+        self.assertEqual(len(dates), 0)
+
+    def test_to_array(self):
+        self.assertEqual(to_array([1, 2]).dtype, np.float64)
+        self.assertTrue(np.issubdtype(
+            to_array(np.array(['2021-03-01'], dtype='datetime64[D]')).dtype,
+            np.datetime64))
+
+    def test_lttb(self):
+        x = np.arange('2011-01-01', '2021-01-01', dtype='datetime64[D]')
+        y = np.sin(np.arange(len(x)) / 50)
+        y[1234] = 10
+
+        dx, dy = lttb(x, y, 100)
+        self.assertEqual(len(dx), 100)
+        self.assertEqual(dx[0], x[0])
+        self.assertEqual(dx[-1], x[-1])
+        self.assertTrue((np.diff(dx.astype(np.int64)) > 0).all())
+        # Spike is the most visible point and must survive
+        self.assertIn(10, dy)
+
+    def test_lttb_short(self):
+        x, y = np.arange(5.0), np.arange(5.0)
+        dx, dy = lttb(x, y, 100)
+        self.assertIs(dx, x)
+        self.assertIs(dy, y)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+import unittest
+import asyncio
+import threading
+import time
+
+from singleflight import SingleFlight, AsyncSingleFlight
+
+
+class TestSingleFlight(unittest.TestCase):
+    def test_coalesce(self):
+        flights = SingleFlight()
+        calls = []
+
+        def fetch(value):
+            calls.append(value)
+            time.sleep(0.1)
+            return value
+
+        results = []
+        threads = [
+            threading.Thread(
+                target=lambda: results.append(flights.do('key', fetch, 1)))
+            for _ in range(10)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(calls, [1])
+        self.assertEqual(results, [1] * 10)
+        self.assertEqual(flights.in_flight(), 0)
+
+    def test_error(self):
+        flights = SingleFlight()
+
+        def fail():
+            raise ValueError('failed')
+
+        with self.assertRaises(ValueError):
+            flights.do('key', fail)
+        self.assertEqual(flights.do('key', lambda: 2), 2)
+
+    def test_async_coalesce(self):
+        flights = AsyncSingleFlight()
+        calls = []
+
+        async def fetch(value):
+            calls.append(value)
+            await asyncio.sleep(0.05)
+            return value
+
+        async def run():
+            return await asyncio.gather(
+                *[flights.do('key', fetch, 1) for _ in range(10)])
+
+        self.assertEqual(asyncio.run(run()), [1] * 10)
+        self.assertEqual(calls, [1])
+        self.assertEqual(flights.in_flight(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
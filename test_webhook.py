@@ -0,0 +1,130 @@
+import unittest
+import threading
+import time
+
+import requests
+from telegram import Bot
+
+from api import ExchangeRatesAPI
+from app import App
+from webhook import Lane, WebhookServer
+from benchmarks.fake_telegram import FakeTelegram, command_update, inline_update
+from benchmarks.fake_upstream import FakeUpstream
+
+
+TOKEN = '123:TEST'
+
+
+class TestWebhook(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.upstream = FakeUpstream()
+        cls.telegram = FakeTelegram()
+        cls.bot = Bot(TOKEN, base_url=cls.telegram.start())
+        cls.app = App(api=ExchangeRatesAPI(
+            base_url=cls.upstream.start(), history_path=':memory:'))
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.telegram.stop()
+        cls.upstream.stop()
+
+    def start_server(self, routes, lanes, inline=None):
+        server = WebhookServer(self.bot, lanes, routes, inline=inline, port=0,
+                               url_path=TOKEN)
+        port = server.start()
+        self.addCleanup(server.stop)
+        return 'http://127.0.0.1:{}/{}'.format(port, TOKEN)
+
+    def wait_sent(self, count):
+        for _ in range(100):
+            sent = self.telegram.sent()
+            if len(sent) >= count:
+                return sent
+            time.sleep(0.05)
+        self.fail('Only {} of {} messages sent'.format(len(sent), count))
+
+    def test_commands(self):
+        url = self.start_server(
+            {'exchange': ('cheap', self.app.exchange)},
+            {'cheap': Lane('cheap', workers=2)})
+
+        sent = len(self.telegram.sent())
+        requests.post(url, json=command_update('/exchange 10 EUR to USD', 7))
+        requests.post(url, json=command_update('/unknown', 7))
+        requests.post(url, json=command_update('hello', 7))
+
+        reply = self.wait_sent(sent + 1)[sent]
+        self.assertEqual(reply['text'], '11.93 USD')
+        self.assertEqual(int(reply['chat_id']), 7)
+        time.sleep(0.1)
+        self.assertEqual(len(self.telegram.sent()), sent + 1)
+
+    def test_inline(self):
+        url = self.start_server(
+            {}, {'cheap': Lane('cheap', workers=2)},
+            inline=('cheap', self.app.inline))
+
+        requests.post(url, json=inline_update('10 EUR USD'))
+        for _ in range(100):
+            answers = self.telegram.sent('answerInlineQuery')
+            if answers:
+                break
+            time.sleep(0.05)
+        self.assertEqual(len(answers), 1)
+        self.assertIn('11.93 USD', str(answers[0]['results']))
+        self.assertEqual(int(answers[0]['cache_time']), 300)
+
+    def test_load_shedding(self):
+        release = threading.Event()
+
+        def slow(update, context):
+            release.wait()
+            update.message.reply_text('done')
+
+        lane = Lane('expensive', workers=1, max_size=1)
+        url = self.start_server({'history': ('expensive', slow)},
+                                {'expensive': lane})
+
+        update = command_update('/history USD/EUR for 7 days')
+        sent = len(self.telegram.sent())
+        requests.post(url, json=update)
+        # Let worker take first command before queue is filled
+        while lane.queue.qsize():
+            time.sleep(0.01)
+        requests.post(url, json=update)
+        requests.post(url, json=update)
+
+        # One command runs, one waits in queue, one is shed
+        shed = self.wait_sent(sent + 1)[sent]
+        self.assertEqual(shed['text'], WebhookServer.SHED_REPLY)
+        self.assertEqual(lane.shed, 1)
+
+        release.set()
+        replies = self.wait_sent(sent + 3)[sent + 1:]
+        self.assertEqual([r['text'] for r in replies], ['done', 'done'])
+
+    def test_bind_failure(self):
+        url = self.start_server({}, {'cheap': Lane('cheap', workers=1)})
+        port = int(url.split(':')[2].split('/')[0])
+        server = WebhookServer(self.bot, {'cheap': Lane('cheap', workers=1)},
+                               {}, port=port, url_path=TOKEN)
+        with self.assertRaises(OSError):
+            server.start()
+
+    def test_shed_replies_bounded(self):
+        # Nothing is started, so queues only fill up
+        lane = Lane('expensive', workers=1, max_size=1)
+        server = WebhookServer(self.bot, {'expensive': lane},
+                               {'history': ('expensive', lambda u, c: None)})
+        server.shed_lane = Lane('shed', workers=1, max_size=2)
+
+        for _ in range(10):
+            server.dispatch(command_update('/history USD/EUR for 7 days'))
+        self.assertEqual(lane.shed, 9)
+        self.assertEqual(server.shed_lane.queue.qsize(), 2)
+        self.assertEqual(server.shed_lane.shed, 7)
+
+
+if __name__ == '__main__':
+    unittest.main()
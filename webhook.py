@@ -0,0 +1,216 @@
+import asyncio
+import json
+import logging
+import queue
+import threading
+
+import tornado.httpserver
+import tornado.ioloop
+import tornado.netutil
+import tornado.web
+from telegram import Update
+
+
+logger = logging.getLogger(__name__)
+
+
+class CommandContext:
+    """Context of command handler, like CallbackContext of dispatcher."""
+
+    def __init__(self, args, bot):
+        self.args = args
+        self.bot = bot
+
+
+class Lane:
+    """Bounded queue of commands served by its own pool of threads."""
+
+    def __init__(self, name, workers=4, max_size=100):
+        """
+        Args:
+            param1 (obj): self
+            param2 (str): name of lane for logs
+            param3 (int): number of worker threads
+            param4 (int): max commands waiting in queue
+        """
+        self.name = name
+        self.queue = queue.Queue(max_size)
+        self.shed = 0
+        self.threads = [
+            threading.Thread(target=self._work, daemon=True,
+                             name='{}-{}'.format(name, i))
+            for i in range(workers)
+        ]
+
+    def start(self):
+        for thread in self.threads:
+            thread.start()
+
+    def submit(self, callback, update, context):
+        """
+        Returns:
+            (bool): False if queue is full and command is dropped
+        """
+        try:
+            self.queue.put_nowait((callback, update, context))
+            return True
+        except queue.Full:
+            self.shed += 1
+            return False
+
+    def _work(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            callback, update, context = item
+            try:
+                callback(update, context)
+            except Exception:
+                logger.exception('Command failed in lane %s', self.name)
+
+    def stop(self):
+        for _ in self.threads:
+            self.queue.put(None)
+        for thread in self.threads:
+            thread.join()
+
+
+class _UpdateHandler(tornado.web.RequestHandler):
+    def initialize(self, server):
+        self.server = server
+
+    def post(self):
+        try:
+            data = json.loads(self.request.body)
+        except ValueError:
+            self.set_status(400)
+            return
+        self.server.dispatch(data)
+
+
+class WebhookServer:
+    """Receive Telegram updates by webhook and route commands to lanes.
+
+    Cheap and expensive commands get separate lanes so slow charts can't
+    hold up conversions. When a lane is full the command is answered with
+    SHED_REPLY right away instead of waiting in queue.
+
+    Example:
+        server = WebhookServer(bot, {
+            'cheap': Lane('cheap', workers=8),
+            'expensive': Lane('expensive', workers=2),
+        }, {
+            'list': ('cheap', app.latest),
+            'history': ('expensive', app.history),
+        }, url_path=token)
+        server.start()
+    """
+
+    SHED_REPLY = 'Bot is overloaded right now, please try again later'
+    # Shed replies waiting to be sent, more are dropped
+    MAX_SHED = 100
+
+    def __init__(self, bot, lanes, routes, inline=None, listen='127.0.0.1',
+                 port=8443, url_path=''):
+        """
+        Args:
+            param1 (obj): self
+            param2 (telegram.Bot): bot to reply with
+            param3 (dict): Lane by name
+            param4 (dict): (lane name, handler) by command without slash
+            param5 (tuple): (lane name, handler) of inline queries, they
+                are ignored if None
+            param6 (str): address to listen on
+            param7 (int): port to listen on, 0 for any free port
+            param8 (str): URL path of webhook, usually bot token
+        """
+        self.bot = bot
+        self.lanes = lanes
+        self.routes = routes
+        self.inline = inline
+        self.listen = listen
+        self.port = port
+        self.url_path = url_path
+        # Shed replies must not wait in the lanes which are full
+        self.shed_lane = Lane('shed', workers=1, max_size=self.MAX_SHED)
+        self._loop = None
+        self._thread = None
+
+    def dispatch(self, data):
+        """
+        Args:
+            param1 (obj): self
+            param2 (dict): update as sent by Telegram
+        """
+        update = Update.de_json(data, self.bot)
+        if update is not None and update.inline_query is not None:
+            self._dispatch_inline(update)
+            return
+
+        message = update.effective_message if update else None
+        if message is None or not message.text:
+            return
+
+        words = message.text.split()
+        if not words[0].startswith('/'):
+            return
+        command = words[0][1:].split('@')[0].lower()
+        if command not in self.routes:
+            return
+
+        lane, callback = self.routes[command]
+        context = CommandContext(words[1:], self.bot)
+        if not self.lanes[lane].submit(callback, update, context):
+            self.shed_lane.submit(self._shed, update, context)
+
+    def _shed(self, update, context):
+        update.effective_message.reply_text(self.SHED_REPLY)
+
+    def _dispatch_inline(self, update):
+        if self.inline is None:
+            return
+        lane, callback = self.inline
+        # Inline query of full lane is dropped, client asks again as user
+        # keeps typing
+        self.lanes[lane].submit(callback, update, CommandContext([], self.bot))
+
+    def start(self):
+        """
+        Returns:
+            (int): port server listens on
+        """
+        # Bound here so failure to bind is raised to caller
+        sockets = tornado.netutil.bind_sockets(self.port, self.listen)
+        self.port = sockets[0].getsockname()[1]
+
+        for lane in self.lanes.values():
+            lane.start()
+        self.shed_lane.start()
+
+        started = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, args=(sockets, started), daemon=True)
+        self._thread.start()
+        started.wait()
+        return self.port
+
+    def _run(self, sockets, started):
+        asyncio.set_event_loop(asyncio.new_event_loop())
+        app = tornado.web.Application([
+            (r'/{}'.format(self.url_path), _UpdateHandler, {'server': self}),
+        ])
+        server = tornado.httpserver.HTTPServer(app)
+        server.add_sockets(sockets)
+
+        self._loop = tornado.ioloop.IOLoop.current()
+        started.set()
+        self._loop.start()
+        server.stop()
+
+    def stop(self):
+        self._loop.add_callback(self._loop.stop)
+        self._thread.join()
+        for lane in self.lanes.values():
+            lane.stop()
+        self.shed_lane.stop()